@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of ExtractTrips.py and SpatialAggregation.py on synthetic data
+
+This script generates seeded synthetic input files and measures the throughput of each stage of both scripts:
+
+	1. parse: Parsing of the positions (ExtractTrips.parse_positions)
+	2. segmentation: Trip detection on arrays of vessel paths (ExtractTrips.segment_trips)
+	3. rdp: Simplification of the trips (ExtractTrips.RDP)
+	4. kinematics: Interevent time, distance and angle of the trips (Kinematics.kinematics and ExtractTrips.trip_columns)
+	5. write: Writing of the trips in a csv file (OutputWriter.BatchWriter)
+	6. aggregation: Spatial aggregation of polygon-tagged trips (SpatialAggregation.aggregate_trips)
+
+The input files are read by blocks of complete vessel paths (or trips), each stage is timed on the output of the
+previous ones. The stages of ExtractTrips.py and SpatialAggregation.py run in two separate processes for each size,
+the peak resident set size is measured once per process (script), not per stage.
+
+The synthetic vessel paths are sorted by vessel ID and time. The interevent times follow an exponential distribution
+with occasional long gaps, the vessels move at random speed and heading and their distance to the coast oscillates
+around a mean distance. The polygon-tagged trips (input of SpatialAggregation.py) are random cuts of the same paths
+with the speed of the positions and the cell of a regular grid as Polygon ID.
+
+The algorithm has 1 parameter:
+
+	1. wdoutput: Path of the json report
+
+and the following options:
+
+	--sizes: Numbers of positions (default 100000 1000000, up to 1e8 or more)
+	--pings: Number of positions per vessel (default 1000)
+	--gap: Mean interevent time (in seconds, default 300)
+	--gap-long: Mean long interevent time (in seconds, default 14400)
+	--p-long: Probability of a long interevent time (default 0.01)
+	--coast: Mean distance to the coast (in meters, default 5000)
+	--cell: Cell size of the polygon grid (in meters, default 10000)
+	--seed: Seed of the random generator (default 0)
+	--thd, --tht, --epsilon: Parameters of ExtractTrips.py (default 4000, 3600 and 300)
+	--block-size: Number of positions per block (default 1000000)
+	--data: Directory of the generated files, kept and reused by later runs (temporary directory if not given)
+
+The report is a json file listing for each size and stage the number of rows processed, the time (in seconds) and the
+number of rows per second, and for each size and script the peak resident set size (in MB). Requires numpy.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import multiprocessing
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import ExtractTrips
+import SpatialAggregation
+import Kinematics
+import OutputWriter
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark of ExtractTrips.py and SpatialAggregation.py")
+    parser.add_argument("wdoutput", help="Path of the json report")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1e5, 1e6], help="Numbers of positions")
+    parser.add_argument("--pings", type=int, default=1000, help="Number of positions per vessel")
+    parser.add_argument("--gap", type=float, default=300, help="Mean interevent time (in seconds)")
+    parser.add_argument("--gap-long", type=float, default=14400, help="Mean long interevent time (in seconds)")
+    parser.add_argument("--p-long", type=float, default=0.01, help="Probability of a long interevent time")
+    parser.add_argument("--coast", type=float, default=5000, help="Mean distance to the coast (in meters)")
+    parser.add_argument("--cell", type=float, default=10000, help="Cell size of the polygon grid (in meters)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator")
+    parser.add_argument("--thd", type=float, default=4000, help="Distance threshold (in meters)")
+    parser.add_argument("--tht", type=float, default=3600, help="Time threshold (in seconds)")
+    parser.add_argument("--epsilon", type=float, default=300, help="Maximum distance of the simplified path")
+    parser.add_argument("--block-size", type=int, default=1000000, help="Number of positions per block")
+    parser.add_argument("--data", default=None, help="Directory of the generated files")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("The benchmark requires numpy")
+
+    print(" ")
+    print("Parameters:" + " " + args.wdoutput + " " + " ".join(str(int(size)) for size in args.sizes))
+    print(" ")
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Stages of ExtractTrips.py and SpatialAggregation.py
+STAGES = ['parse', 'segmentation', 'rdp', 'kinematics', 'write', 'aggregation']
+
+#Synthetic path of a vessel
+#Input: rng (numpy random generator), n (number of positions) and the parameters gap, gap_long, p_long and coast
+#       (see the options)
+#Output: T, X, Y, L (arrays of Unix time, cartesian coordinates and distance to the coast) and Sp (array of speed)
+def vessel_path(rng, n, gap, gap_long, p_long, coast):
+
+    #Interevent times with occasional long gaps
+    Dt = rng.exponential(gap, n)
+    gaps = rng.random(n) < p_long
+    Dt[gaps] = rng.exponential(gap_long, int(gaps.sum()))
+    Dt = np.maximum(1, np.round(Dt)).astype(np.int64)
+    Dt[0] = 0
+    T = 1500000000 + rng.integers(0, 86400) + np.cumsum(Dt)
+
+    #Random speed (in meters per second) and heading
+    Sp = rng.gamma(4.0, 1.25, n)
+    Sp[0] = 0.0
+    heading = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0, 0.1, n))
+    step = Sp * np.minimum(Dt, 4 * gap)
+    X = rng.uniform(0, 1e6) + np.cumsum(step * np.cos(heading))
+    Y = rng.uniform(0, 1e6) + np.cumsum(step * np.sin(heading))
+
+    #Distance to the coast oscillating between 0 and twice the mean distance
+    L = coast * (1 + np.sin(rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0, 0.05, n))))
+
+    return T, np.round(X, 1), np.round(Y, 1), np.round(L, 1), np.round(Sp, 3)
+
+#Write rows given as columns of values in a csv file
+def write_rows(output_file, columns):
+    columns = [list(map(str, column)) for column in columns]
+    output_file.write(''.join([';'.join(row) + '\n' for row in zip(*columns)]))
+
+#Generate the vessel paths (input of ExtractTrips.py) and the polygon-tagged trips (input of SpatialAggregation.py)
+#Input: wdpaths, wdtrips (paths of the generated files), size (number of positions), seed and params (dictionary of
+#       the options pings, gap, gap_long, p_long, coast and cell)
+def generate(wdpaths, wdtrips, size, seed, params):
+
+    rng = np.random.default_rng(seed)
+    nvessels = max(1, size // params['pings'])
+
+    with open(wdpaths, 'w') as paths_file, open(wdtrips, 'w') as trips_file:
+
+        paths_file.write('ID;Time;X;Y;DistLand\n')
+        trips_file.write('ID_trip;Time;X;Y;DistLand;Speed;Simplified;ID_polygon\n')
+
+        for v in range(nvessels):
+
+            #The last vessel has the remaining positions
+            n = params['pings'] if v < nvessels - 1 else size - v * params['pings']
+            T, X, Y, L, Sp = vessel_path(rng, n, params['gap'], params['gap_long'], params['p_long'], params['coast'])
+            ID = 'V%08d' % v
+            write_rows(paths_file, [[ID] * n, T.tolist(), X.tolist(), Y.tolist(), L.tolist()])
+
+            #Random cuts of the path in trips of at least three positions
+            trip = np.zeros(n, dtype=np.int64)
+            cuts = np.cumsum(rng.integers(3, 200, n // 3 + 1))
+            trip[cuts[cuts < n - 2]] = 1
+            trip = np.cumsum(trip) + 1
+            S = (rng.random(n) < 0.3).astype(np.int64)
+            P = [str(c) + '_' + str(r) for c, r in zip(np.floor(X / params['cell']).astype(np.int64).tolist(),
+                                                       np.floor(Y / params['cell']).astype(np.int64).tolist())]
+            write_rows(trips_file, [[ID + '_' + str(k) for k in trip.tolist()], T.tolist(), X.tolist(), Y.tolist(),
+                                    L.tolist(), Sp.tolist(), S.tolist(), P])
+
+#Blocks of lines of a csv file (without column names) split at ID boundaries
+#Input: wdinput (path of the file) and block_size (minimum number of lines per block)
+def line_blocks(wdinput, block_size):
+
+    block = []
+    ID = None
+    with open(wdinput) as input_file:
+        next(input_file)                                       #Skip column names
+        for line in input_file:
+            if len(block) >= block_size:
+                ID_next = line[:line.index(';')]
+                if ID is None:
+                    ID = block[-1][:block[-1].index(';')]
+                if ID_next != ID:
+                    yield block
+                    block = []
+                    ID = None
+            block.append(line)
+    if block:
+        yield block
+
+#Peak resident set size of the process (in MB, None if not available)
+def peak_rss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / 1024.0 ** 2 if sys.platform == 'darwin' else rss / 1024.0, 1)
+
+#Time the stages of ExtractTrips.py
+#Input: wdpaths (path of the vessel paths), wdoutput (path of the trips file), thd, tht, epsilon and block_size
+#Output: a dictionary giving for each stage the number of rows and the time (in seconds), and the peak RSS
+def run_extraction(wdpaths, wdoutput, thd, tht, epsilon, block_size):
+
+    stats = {stage: [0, 0.0] for stage in STAGES[:5]}
+    writer = OutputWriter.open_writer(wdoutput, ExtractTrips.COLUMNS, ExtractTrips.TYPES, None, ExtractTrips.FLOATS)
+
+    for lines in line_blocks(wdpaths, block_size):
+
+        #Parsing
+        start = time.perf_counter()
+        positions = list(ExtractTrips.parse_positions(lines))
+        stats['parse'][1] += time.perf_counter() - start
+        stats['parse'][0] += len(positions)
+
+        IDs, T, X, Y, L = zip(*positions)
+        IDs = np.array(IDs, dtype=object)
+        V = np.zeros(len(IDs), dtype=np.int64)
+        V[1:] = np.cumsum(IDs[1:] != IDs[:-1])
+        T, X, Y, L = np.array(T, dtype=np.int64), np.array(X), np.array(Y), np.array(L)
+
+        #Trip detection
+        start = time.perf_counter()
+        starts, ends, IDtrips = ExtractTrips.segment_trips(V, T, L, thd, tht)
+        stats['segmentation'][1] += time.perf_counter() - start
+        stats['segmentation'][0] += len(T)
+
+        trips = list(zip(starts.tolist(), ends.tolist(), IDtrips.tolist()))
+        ntrips = int((ends - starts).sum())
+
+        #Simplification
+        start = time.perf_counter()
+        S = [ExtractTrips.RDP(X[s:e], Y[s:e], epsilon) for s, e, k in trips]
+        stats['rdp'][1] += time.perf_counter() - start
+        stats['rdp'][0] += ntrips
+
+        #Interevent time, distance and angle
+        start = time.perf_counter()
+        kinematics = Kinematics.kinematics(T, X, Y, starts, ends)
+        columns = [ExtractTrips.trip_columns(IDs[s], k, T[s:e].tolist(), X[s:e].tolist(), Y[s:e].tolist(),
+                                             L[s:e].tolist(), Si, None, Kinematics.kinematics_lists(*kinematics, s, e))
+                   for (s, e, k), Si in zip(trips, S)]
+        stats['kinematics'][1] += time.perf_counter() - start
+        stats['kinematics'][0] += ntrips
+
+        #Writing
+        start = time.perf_counter()
+        ExtractTrips.write_trips(columns, writer)
+        stats['write'][1] += time.perf_counter() - start
+        stats['write'][0] += ntrips
+
+    start = time.perf_counter()
+    writer.close()
+    stats['write'][1] += time.perf_counter() - start
+
+    return stats, peak_rss()
+
+#Time the spatial aggregation
+#Input: wdtrips (path of the polygon-tagged trips) and block_size
+#Output: see run_extraction
+def run_aggregation(wdtrips, block_size):
+
+    stats = {'aggregation': [0, 0.0]}
+
+    for lines in line_blocks(wdtrips, block_size):
+        positions = list(SpatialAggregation.parse_positions(lines))
+        start = time.perf_counter()
+        for trip in SpatialAggregation.aggregate_trips(positions):
+            pass
+        stats['aggregation'][1] += time.perf_counter() - start
+        stats['aggregation'][0] += len(positions)
+
+    return stats, peak_rss()
+
+#Run a function in a new process
+def run_process(function, *args):
+    with multiprocessing.Pool(1) as pool:
+        return pool.apply(function, args)
+
+#Benchmark of one size
+#Input: size (number of positions), wddata (directory of the generated files), reuse (reuse the generated files if
+#       they exist), seed, params (see generate), thd, tht, epsilon and block_size
+#Output: a list of results (one per stage) and a list of peak resident set sizes (one per script)
+def benchmark(size, wddata, reuse, seed, params, thd, tht, epsilon, block_size):
+
+    #Generated files named after the generator parameters
+    key = hashlib.sha1(json.dumps([size, seed, params], sort_keys=True).encode()).hexdigest()[:12]
+    wdpaths = os.path.join(wddata, 'paths_' + str(size) + '_' + key + '.csv')
+    wdtrips = os.path.join(wddata, 'trips_' + str(size) + '_' + key + '.csv')
+    if not (reuse and os.path.exists(wdpaths) and os.path.exists(wdtrips)):
+        generate(wdpaths, wdtrips, size, seed, params)
+
+    wdoutput = os.path.join(wddata, 'output_' + str(size) + '_' + key + '.csv')
+    stats, rss = run_process(run_extraction, wdpaths, wdoutput, thd, tht, epsilon, block_size)
+    os.remove(wdoutput)
+    stats2, rss2 = run_process(run_aggregation, wdtrips, block_size)
+
+    results = []
+    for stage in STAGES:
+        rows, seconds = stats[stage] if stage in stats else stats2[stage]
+        results.append({'size': size, 'stage': stage, 'rows': rows, 'seconds': round(seconds, 6),
+                        'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None})
+
+    memory = [{'size': size, 'script': 'ExtractTrips.py', 'peak_rss_mb': rss},
+              {'size': size, 'script': 'SpatialAggregation.py', 'peak_rss_mb': rss2}]
+
+    return results, memory
+
+# ****************************** MAIN *************************************************************************************************
+# *************************************************************************************************************************************
+
+if __name__ == "__main__":
+
+    params = {'pings': args.pings, 'gap': args.gap, 'gap_long': args.gap_long, 'p_long': args.p_long,
+              'coast': args.coast, 'cell': args.cell}
+
+    #Directory of the generated files
+    if args.data is not None:
+        os.makedirs(args.data, exist_ok=True)
+        wddata = args.data
+    else:
+        wddata = tempfile.mkdtemp(prefix='benchmark')
+
+    results = []
+    memory = []
+    try:
+        for size in args.sizes:
+            size_results, size_memory = benchmark(int(size), wddata, args.data is not None, args.seed, params, args.thd,
+                                                  args.tht, args.epsilon, args.block_size)
+            for result in size_results:
+                print(str(result['size']) + " " + result['stage'] + ": " + str(result['rows_per_second']) + " rows/s")
+            for peak in size_memory:
+                print(str(peak['size']) + " " + peak['script'] + ": peak RSS " + str(peak['peak_rss_mb']) + " MB")
+            results.extend(size_results)
+            memory.extend(size_memory)
+    finally:
+        if args.data is None:
+            shutil.rmtree(wddata)
+
+    #Report
+    report = {'python': platform.python_version(), 'platform': platform.platform(), 'seed': args.seed,
+              'params': params, 'thd': args.thd, 'tht': args.tht, 'epsilon': args.epsilon,
+              'block_size': args.block_size, 'results': results, 'memory': memory}
+    with open(args.wdoutput, 'w') as report_file:
+        json.dump(report, report_file, indent=1, sort_keys=True)
+
+    #End
+    print("End of the process")
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+Distance to the coast from a precomputed raster
+
+ExtractTrips.py can derive the DistLand column of the positions (distance from the nearest land in meters) from a
+raster of the distance to the coast instead of reading it from the input file (--coast option). The raster is built
+once from a polygon layer of the land (GeoJSON or csv file of WKT, see PolygonIndex.py) in the same cartesian
+coordinates as the positions:
+
+	1. The centers of the cells inside of a land polygon are land cells (distance 0)
+	2. The distance of every cell to the nearest land cell is computed with an exact Euclidean distance transform
+	   (two passes of the lower envelope of parabolas, Felzenszwalb and Huttenlocher, vectorized over the rows),
+	   minus half a cell to measure it from the edge of the land cell rather than from its center
+
+The raster is a binary file of float32 distances (in meters, row by row from the south-west corner) memory-mapped
+when read, its grid (origin, cell size, number of columns and rows) is stored in a json file next to it (.json). The
+positions are sampled by batches with a bilinear interpolation between the centers of the 4 nearest cells, the
+accuracy is about one cell (land features smaller than a cell may be missed). The positions outside of the raster get
+the value of the nearest edge of the raster.
+
+The raster is built with the command:
+
+	python CoastRaster.py land.geojson coast.raster --cell 500 --margin 200000
+
+with the following options:
+
+	--cell: Cell size (in meters, default 1000)
+	--margin: Distance (in meters) between the bounding box of the land polygons and the edges of the raster
+	          (default 100000)
+	--extent: Extent of the raster (xmin ymin xmax ymax in meters) in place of the bounding box and the margin
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import sys
+import json
+import argparse
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import PolygonIndex
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+VERSION = 1                  #Version of the raster format
+BANDSIZE = 1000000           #Number of cells tested at once against the land polygons
+BATCHSIZE = 100000           #Number of positions sampled at once
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Build a raster of the distance to the coast")
+    parser.add_argument("wdland", help="Path of the land polygon layer (GeoJSON or csv file of WKT)")
+    parser.add_argument("wdraster", help="Path of the raster")
+    parser.add_argument("--cell", type=float, default=1000.0, help="Cell size (in meters)")
+    parser.add_argument("--margin", type=float, default=100000.0, help="Margin around the land polygons (in meters)")
+    parser.add_argument("--extent", type=float, nargs=4, default=None, help="Extent of the raster (xmin ymin xmax ymax)")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("Building the raster requires numpy")
+
+    if args.cell <= 0:
+        sys.exit("The cell size must be positive")
+
+    print(" ")
+    print("Parameters:" + " " + args.wdland + " " + args.wdraster + " " + str(args.cell))
+    print(" ")
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Squared distance transform of every row of a 2D array (lower envelope of the parabolas rooted at every cell)
+#Input: f (2D array of squared distances in cells, 0 for the sources)
+#Output: a 2D array d with d[r, q] = min over p of (q - p)^2 + f[r, p]
+def squared_transform(f):
+
+    nrows, n = f.shape
+    rows = np.arange(nrows)
+
+    #Parabolas of the lower envelope (v) and boundaries between them (z), k is the last parabola of every row
+    v = np.zeros((nrows, n), dtype=np.int64)
+    z = np.empty((nrows, n + 1))
+    z[:, 0] = -np.inf
+    z[:, 1] = np.inf
+    k = np.zeros(nrows, dtype=np.int64)
+
+    for q in range(1, n):
+
+        #Intersection with the last parabola, the parabolas hidden by the new one are removed
+        fq = f[:, q] + q * q
+        s = np.empty(nrows)
+        active = rows
+        while len(active) > 0:
+            vk = v[active, k[active]]
+            sk = (fq[active] - (f[active, vk] + vk * vk)) / (2 * (q - vk))
+            hidden = sk <= z[active, k[active]]
+            s[active[~hidden]] = sk[~hidden]
+            active = active[hidden]
+            k[active] -= 1
+
+        k += 1
+        v[rows, k] = q
+        z[rows, k] = s
+        z[rows, k + 1] = np.inf
+
+    #Lower envelope at every cell
+    d = np.empty(f.shape)
+    k[:] = 0
+    for q in range(n):
+        beyond = z[rows, k + 1] < q
+        while beyond.any():
+            k[beyond] += 1
+            beyond = z[rows, k + 1] < q
+        vk = v[rows, k]
+        d[:, q] = (q - vk) ** 2 + f[rows, vk]
+
+    return d
+
+#Euclidean distance (in cells) of every cell to the nearest land cell
+#Input: land (2D boolean array)
+def distance_transform(land):
+    big = float((land.shape[0] + land.shape[1]) ** 2)                #Larger than any squared distance in the raster
+    f = np.where(land, 0.0, big)
+    f = squared_transform(np.ascontiguousarray(f.T)).T               #Along the columns
+    f = squared_transform(np.ascontiguousarray(f))                   #Along the rows
+    return np.sqrt(f)
+
+#Land cells of a grid (cell centers inside of a land polygon)
+#Input: index (PolygonIndex of the land polygons) and grid (xmin, ymin, cell size, number of columns and rows)
+#Output: a 2D boolean array (row 0 is the southern row)
+def land_cells(index, grid):
+
+    xmin, ymin, cell, ncols, nrows = grid
+    land = np.zeros((nrows, ncols), dtype=bool)
+    X = xmin + (np.arange(ncols) + 0.5) * cell
+    step = max(1, BANDSIZE // ncols)
+
+    for start in range(0, nrows, step):
+        band = np.arange(start, min(nrows, start + step))
+        Y = ymin + (band + 0.5) * cell
+        land[band] = (index.assign(np.tile(X, len(band)), np.repeat(Y, ncols)) >= 0).reshape(len(band), ncols)
+
+    return land
+
+#Build the raster of the distance to the coast of a land polygon layer
+#Input: wdland (path of the polygon layer), wdraster (path of the raster), cell (cell size in meters), margin (in
+#       meters) and extent (xmin, ymin, xmax, ymax, bounding box of the polygons plus the margin if None)
+def build_raster(wdland, wdraster, cell=1000.0, margin=100000.0, extent=None):
+
+    if np is None:
+        raise ImportError("Building the raster requires numpy")
+
+    index = PolygonIndex.PolygonIndex.build(*PolygonIndex.load_polygons(wdland))
+
+    #Grid
+    if extent is None:
+        bboxes = index.bboxes
+        extent = [bboxes[:, 0].min() - margin, bboxes[:, 1].min() - margin, bboxes[:, 2].max() + margin,
+                  bboxes[:, 3].max() + margin]
+    xmin, ymin, xmax, ymax = [float(value) for value in extent]
+    ncols = max(2, int(np.ceil((xmax - xmin) / cell)))
+    nrows = max(2, int(np.ceil((ymax - ymin) / cell)))
+    grid = (xmin, ymin, cell, ncols, nrows)
+
+    #Distances
+    land = land_cells(index, grid)
+    if not land.any():
+        raise ValueError("No land cell in the raster (cell size too large or extent outside of the land polygons)")
+    distances = np.maximum(distance_transform(land) - 0.5, 0) * cell     #From the edge of the nearest land cell
+
+    #Raster and grid
+    raster = np.memmap(wdraster, dtype='<f4', mode='w+', shape=(nrows, ncols))
+    raster[:] = distances
+    raster.flush()
+    del raster
+    with open(wdraster + '.json', 'w') as grid_file:
+        json.dump({'version': VERSION, 'xmin': xmin, 'ymin': ymin, 'cell': cell, 'ncols': ncols, 'nrows': nrows},
+                  grid_file)
+
+class CoastRaster:
+
+    #Input: raster (2D array of the distances in meters, row 0 is the southern row) and grid (xmin, ymin, cell size)
+    def __init__(self, raster, xmin, ymin, cell):
+        self.raster = raster
+        self.xmin = xmin
+        self.ymin = ymin
+        self.cell = cell
+
+    #Distance to the coast of positions (bilinear interpolation between the cell centers)
+    #Input: X, Y (arrays of cartesian coordinates)
+    #Output: an array of distances (in meters)
+    def sample(self, X, Y):
+
+        nrows, ncols = self.raster.shape
+        fx = np.clip((np.asarray(X, dtype=float) - self.xmin) / self.cell - 0.5, 0, ncols - 1)
+        fy = np.clip((np.asarray(Y, dtype=float) - self.ymin) / self.cell - 0.5, 0, nrows - 1)
+        c = np.minimum(fx.astype(np.int64), ncols - 2)
+        r = np.minimum(fy.astype(np.int64), nrows - 2)
+        wx = fx - c
+        wy = fy - r
+
+        raster = self.raster
+        bottom = raster[r, c] * (1 - wx) + raster[r, c + 1] * wx
+        top = raster[r + 1, c] * (1 - wx) + raster[r + 1, c + 1] * wx
+        return bottom * (1 - wy) + top * wy
+
+#Memory-map the raster of the distance to the coast
+def open_raster(wdraster):
+    if np is None:
+        raise ImportError("The distance to the coast requires numpy")
+    with open(wdraster + '.json') as grid_file:
+        grid = json.load(grid_file)
+    if grid.get('version') != VERSION:
+        raise ValueError("Unsupported raster version, rebuild the raster with CoastRaster.py")
+    if os.path.getsize(wdraster) != 4 * grid['ncols'] * grid['nrows']:
+        raise ValueError("The size of the raster does not match its grid")
+    raster = np.memmap(wdraster, dtype='<f4', mode='r', shape=(grid['nrows'], grid['ncols']))
+    return CoastRaster(raster, grid['xmin'], grid['ymin'], grid['cell'])
+
+#Distance to the coast of positions by batches, in place of the 5th value (DistLand)
+#Input: positions (iterable of positions (Vessel ID, Unix Time, X, Y[, DistLand])), coast (CoastRaster) and
+#       batch_size (number of positions sampled at once)
+def assign_land(positions, coast, batch_size=BATCHSIZE):
+
+    batch = []
+    for position in positions:
+        batch.append(position)
+        if len(batch) >= batch_size:
+            yield from land_batch(batch, coast)
+            batch = []
+
+    if batch:
+        yield from land_batch(batch, coast)
+
+#Positions of a batch with the distance to the coast
+def land_batch(batch, coast):
+    lands = coast.sample([p[2] for p in batch], [p[3] for p in batch]).tolist()
+    for p, land in zip(batch, lands):
+        yield p[:4] + (land,)
+
+# ****************************** MAIN *************************************************************************************************
+# *************************************************************************************************************************************
+
+if __name__ == "__main__":
+
+    build_raster(args.wdland, args.wdraster, args.cell, args.margin, args.extent)
+
+    #End
+    print("End of the process")
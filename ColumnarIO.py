@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parquet and Arrow input and output
+
+ExtractTrips.py and SpatialAggregation.py read and write Parquet (.parquet, .pq) and Arrow IPC (.arrow, .feather)
+files in place of semicolon csv files when pyarrow is installed. The columns are identified by their position and
+follow the same 5, 8 and 10 columns schemas as the csv files.
+
+The data is moved column by column, without string conversion. A range of IDs (first column) can be selected when
+reading, the Parquet row groups whose statistics are outside of the range are skipped without being read.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+PARQUET = ('.parquet', '.pq')        #Extensions of the Parquet files
+ARROW = ('.arrow', '.feather')       #Extensions of the Arrow IPC files
+ROWGROUPSIZE = 1000000               #Number of rows buffered before writing a row group (or a record batch)
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Test if a path is a Parquet or Arrow file (based on its extension)
+def is_columnar(path):
+    return os.path.splitext(path)[1].lower() in PARQUET + ARROW
+
+#Raise an error if pyarrow is not installed
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet and Arrow files require pyarrow")
+
+#Cast an ID given as a string (command line) to the type of the ID column
+def cast_id(value, id_type):
+    if value is None:
+        return None
+    return pa.scalar(value).cast(id_type).as_py()
+
+#Filter the rows of a record batch by range of IDs
+def filter_ids(batch, id_min, id_max):
+    mask = None
+    if id_min is not None:
+        mask = pc.greater_equal(batch.column(0), id_min)
+    if id_max is not None:
+        test = pc.less_equal(batch.column(0), id_max)
+        mask = test if mask is None else pc.and_(mask, test)
+    return batch if mask is None else batch.filter(mask)
+
+#Read a Parquet or Arrow file by record batches
+#Input: wdinput (path of the input file), id_min and id_max (range of IDs to read, strings cast to the type of the ID
+#       column, None for no bound)
+#Output: a generator of pyarrow record batches
+def read_batches(wdinput, id_min=None, id_max=None):
+
+    require_pyarrow()
+
+    #Parquet file read by row groups
+    if os.path.splitext(wdinput)[1].lower() in PARQUET:
+
+        parquet_file = pq.ParquetFile(wdinput)
+        id_type = parquet_file.schema_arrow.field(0).type
+        id_min = cast_id(id_min, id_type)
+        id_max = cast_id(id_max, id_type)
+
+        for k in range(parquet_file.metadata.num_row_groups):
+
+            #Skip the row group if its IDs are outside of the range
+            stats = parquet_file.metadata.row_group(k).column(0).statistics
+            if stats is not None and stats.has_min_max:
+                if (id_min is not None and stats.max < id_min) or (id_max is not None and stats.min > id_max):
+                    continue
+
+            for batch in parquet_file.iter_batches(row_groups=[k]):
+                yield filter_ids(batch, id_min, id_max)
+
+    #Arrow IPC file read by record batches
+    else:
+
+        with pa.memory_map(wdinput) as source:
+            reader = pa.ipc.open_file(source)
+            id_type = reader.schema.field(0).type
+            id_min = cast_id(id_min, id_type)
+            id_max = cast_id(id_max, id_type)
+            for k in range(reader.num_record_batches):
+                yield filter_ids(reader.get_batch(k), id_min, id_max)
+
+#Rows of a Parquet or Arrow file as tuples of values
+def read_rows(wdinput, id_min=None, id_max=None):
+    for batch in read_batches(wdinput, id_min, id_max):
+        for row in zip(*[column.to_pylist() for column in batch.columns]):
+            yield row
+
+class ColumnarWriter:
+
+    #Input: wdoutput (path of the output file), columns (list of column names) and
+    #       types (list of pyarrow type names of the columns, None to infer the type from the first rows)
+    def __init__(self, wdoutput, columns, types):
+        require_pyarrow()
+        self.wdoutput = wdoutput
+        self.columns = columns
+        self.types = types
+        self.parquet = os.path.splitext(wdoutput)[1].lower() in PARQUET
+        self.buffer = [[] for column in columns]
+        self.size = 0
+        self.writer = None
+        self.sink = None
+        self.schema = None
+
+    #Write rows given as columns of values (lists of the same length)
+    def write(self, *values):
+        for buffer, column in zip(self.buffer, values):
+            buffer.extend(column)
+        self.size += len(values[0])
+        if self.size >= ROWGROUPSIZE:
+            self.flush()
+
+    #Write the rows of a part written by another ColumnarWriter
+    def append_part(self, wdpart):
+        self.flush()
+        if os.path.splitext(wdpart)[1].lower() in PARQUET:
+            table = pq.read_table(wdpart)
+        else:
+            with pa.memory_map(wdpart) as source:
+                table = pa.ipc.open_file(source).read_all()
+        if table.num_rows > 0:
+            self.write_table(table)
+
+    #Write the buffered rows as a row group
+    def flush(self):
+        if self.size == 0:
+            return
+        arrays = []
+        for buffer, typ in zip(self.buffer, self.types):
+            arrays.append(pa.array(buffer) if typ is None else pa.array(buffer, type=pa.type_for_alias(typ)))
+        self.write_table(pa.Table.from_arrays(arrays, names=self.columns))
+        self.buffer = [[] for column in self.columns]
+        self.size = 0
+
+    #Write a table, the schema of the file is the schema of the first table
+    def write_table(self, table):
+        if self.writer is None:
+            self.schema = table.schema
+            if self.parquet:
+                self.writer = pq.ParquetWriter(self.wdoutput, table.schema)
+            else:
+                self.sink = pa.OSFile(self.wdoutput, 'wb')
+                self.writer = pa.ipc.new_file(self.sink, table.schema)
+        else:
+            table = table.cast(self.schema)
+        self.writer.write_table(table)
+
+    #Flush and close the output file
+    def close(self):
+        self.flush()
+
+        #Empty output
+        if self.writer is None:
+            fields = [pa.field(name, pa.string() if typ is None else pa.type_for_alias(typ))
+                      for name, typ in zip(self.columns, self.types)]
+            self.write_table(pa.schema(fields).empty_table())
+
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+External sort of unsorted spatio-temporal positions
+
+ExtractTrips.py and SpatialAggregation.py require input files SORTED by ID (Vessel ID or Trip ID, first column) and by
+time (Unix Time, second column). This module sorts the positions with a bounded amount of memory:
+
+	1. The lines are spilled to on-disk partitions keyed by a hash of the ID, so that all the positions of an ID
+	   are in the same partition.
+	2. Each partition is loaded and sorted by ID and time in memory. A partition too large for the memory budget
+	   (a single very long path for example) is sorted by runs merged from disk instead.
+
+The IDs are grouped but not ordered across partitions, which is all the algorithms need. Positions with the same ID
+and time keep their input order. The temporary files are removed at the end, even if the process fails. The lines are
+read and written in UTF-8 (see InputFiles.py).
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import math
+import zlib
+import heapq
+import tempfile
+
+import InputFiles
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+OVERHEAD = 4                 #Approximate ratio between the memory used by a line once loaded and its size on disk
+NPARTITIONS = 256            #Number of partitions if the input size is unknown
+MAXPARTITIONS = 1024         #Maximum number of partitions (open files)
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Sort key of a line: ID and Unix Time
+def sort_key(line):
+    attr = line.split(';', 2)
+    return (attr[0], int(attr[1]))
+
+#Sort the lines of a file too large for the memory budget by runs merged from disk
+#Input: wdpart (path of the file), memory (memory budget in bytes) and tmpdir (directory of the runs)
+#Output: a generator of sorted lines
+def merge_sort(wdpart, memory, tmpdir):
+
+    #Sorted runs
+    wdruns = []
+    with open(wdpart, encoding=InputFiles.ENCODING) as part_file:
+        run = []
+        size = 0
+        for line in part_file:
+            run.append(line)
+            size += len(line) * OVERHEAD
+            if size >= memory:
+                wdruns.append(write_run(sorted(run, key=sort_key), tmpdir))
+                run = []
+                size = 0
+        if run:
+            wdruns.append(write_run(sorted(run, key=sort_key), tmpdir))
+
+    #Merge the runs
+    run_files = [open(wdrun, encoding=InputFiles.ENCODING) for wdrun in wdruns]
+    try:
+        for line in heapq.merge(*run_files, key=sort_key):
+            yield line
+    finally:
+        for run_file, wdrun in zip(run_files, wdruns):
+            run_file.close()
+            os.remove(wdrun)
+
+#Write a sorted run in a temporary file and return its path
+def write_run(run, tmpdir):
+    fd, wdrun = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+    with os.fdopen(fd, 'w', encoding=InputFiles.ENCODING) as run_file:
+        run_file.writelines(run)
+    return wdrun
+
+#Sort lines by ID and time with hash partitioning on disk
+#Input: input_file (iterable of lines without column names), memory (memory budget in MB),
+#       tmpdir (directory of the temporary files, system default if None) and size (input size in bytes if known)
+#Output: a generator of the lines grouped by ID and sorted by time
+def sort_lines(input_file, memory=1024, tmpdir=None, size=None):
+
+    if memory < 1:
+        raise ValueError("The memory budget of the sort must be at least 1 MB")
+    memory = memory * 1024 * 1024
+
+    #Load the lines until the memory budget is reached
+    lines = []
+    loaded = 0
+    for line in input_file:
+        if not line.endswith('\n'):
+            line += '\n'
+        lines.append(line)
+        loaded += len(line) * OVERHEAD
+        if loaded >= memory:
+            break
+
+    #IF the whole input fits in memory
+    #THEN sort it directly
+    else:
+        lines.sort(key=sort_key)
+        for line in lines:
+            yield line
+        return
+
+    #Number of partitions
+    if size:
+        npartitions = min(MAXPARTITIONS, max(2, math.ceil(2 * size * OVERHEAD / memory)))
+    else:
+        npartitions = NPARTITIONS
+
+    with tempfile.TemporaryDirectory(prefix="vessel-sort-", dir=tmpdir) as wdtmp:
+
+        #Spill the lines to the partitions
+        wdparts = [os.path.join(wdtmp, str(k) + ".part") for k in range(npartitions)]
+        part_files = [open(wdpart, 'w', encoding=InputFiles.ENCODING) for wdpart in wdparts]
+        for line in lines:
+            part_files[zlib.crc32(line.split(';', 1)[0].encode()) % npartitions].write(line)
+        lines = []
+        for line in input_file:
+            if not line.endswith('\n'):
+                line += '\n'
+            part_files[zlib.crc32(line.split(';', 1)[0].encode()) % npartitions].write(line)
+        for part_file in part_files:
+            part_file.close()
+
+        #Sort the partitions one by one
+        for wdpart in wdparts:
+            if os.path.getsize(wdpart) * OVERHEAD < memory:
+                with open(wdpart, encoding=InputFiles.ENCODING) as part_file:
+                    lines = sorted(part_file, key=sort_key)
+                for line in lines:
+                    yield line
+                lines = []
+            else:
+                for line in merge_sort(wdpart, memory, wdtmp):
+                    yield line
+            os.remove(wdpart)
+
+#Sort a csv file with column names by ID and time into another file
+def sort_file(wdinput, wdsorted, memory=1024, tmpdir=None):
+    with open(wdinput, encoding=InputFiles.ENCODING) as input_file, \
+         open(wdsorted, 'w', encoding=InputFiles.ENCODING) as sorted_file:
+        sorted_file.write(next(input_file))
+        sorted_file.writelines(sort_lines(input_file, memory, tmpdir, os.path.getsize(wdinput)))
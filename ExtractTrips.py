@@ -12,22 +12,78 @@ and separated by inverevent times lower than tht seconds."
 The algorithm takes as input a 5 columns csv file with column names (the value separator is a semicolon ";").
 Each row of the file represents a spatio-temporal position of a vessel's path. 
 
-It is important to note that the table must be SORTED by ID and by time.
+It is important to note that the table must be SORTED by ID and by time (or see the --unsorted option).
  
 	1. Vessel ID
 	2. Unix Time
 	3. X cartesian coordinate (in meters)
 	4. Y cartesian coordinate (in meters)
-	5. DistLand: Distance from the nearest land (in meters)
+	5. DistLand: Distance from the nearest land (in meters), optional with the --coast option
  
 The algorithm has 5 parameters:
 
-	1. wdinput:  Path of the input file
+	1. wdinput:  Path of the input file ("-" for the standard input, gzip, bzip2 and xz files are decompressed on the fly,
+	             see InputFiles.py)
 	2. wdoutput: Path of the output file
 	3. thd: Distance threshold (in meters)
 	4. tht: Time threshold (in seconds)
 	5. epsilon: Maximum distance (in km) between the simplified path and the original one (Ramer–Douglas–Peucker algorithm)
 
+and the following options:
+
+	--engine: Trip segmentation engine, "loop" (default) processes the positions one by one, "numpy" loads blocks of 
+	          complete vessel paths into arrays and detects the trips with boolean masks (requires numpy)
+	          or "chunked" reads chunks of a fixed number of positions within the memory budget (--memory) and carries
+	          only the trip still open at the end of a chunk over to the next one, a trip longer than half a chunk is 
+	          spilled on disk until it ends (see TripSpill.py) and written by pieces (requires numpy)
+	--block-size: Minimum number of positions loaded in a block by the numpy engine (default 1000000)
+	--workers: Number of processes (default 1). The input file is split in parts at vessel ID boundaries, processed 
+	           in parallel and merged in order, the output is identical to a single-process run (uncompressed input 
+	           file only)
+	--unsorted: The input file is not sorted, it is sorted by vessel ID and time with hash partitioning on disk first
+	--memory: Memory budget of the sort and of the chunked engine (in MB, default 1024, shared by the processes)
+	--tmpdir: Directory of the temporary files of the sort and of the spilled trips (system default if not given)
+	--precision: Number of decimals of X, Y, Delta_d and Theta in the output file (shortest representation by default)
+	--id-min, --id-max: Range of vessel IDs read from a Parquet or Arrow input file, the row groups outside of the 
+	                    range are skipped
+	--state: Checkpoint of an incremental run (see TripState.py). The trip of a vessel is not closed at its last 
+	         position in the input file but saved in the checkpoint with the vessel state and resumed by the next run
+	         (loop engine, single process), successive files give the same trips as the concatenated data
+	--final: Last incremental run, the open trips of the checkpoint are closed and the checkpoint is removed
+	--stats: Path of a json file of run statistics (see Instrumentation.py): time spent parsing, in the trip state 
+	         machine, in the Ramer–Douglas–Peucker algorithm, computing the angles and writing, and numbers of 
+	         positions, vessels, trips, trips dropped (two positions or less) and maximum recursion depth of the 
+	         Ramer–Douglas–Peucker algorithm
+	--progress: Interval (in seconds) between two progress lines (positions per second and estimated time remaining) 
+	            printed on the standard error (single process runs)
+	--profile: Path of a cProfile dump of the run (read with pstats)
+	--simplifier: Simplification of the trips (Simplified column), "rdp" (default) the Ramer–Douglas–Peucker algorithm,
+	              "window" an opening window algorithm running online with a bounded window (the memory of a trip is
+	              only bounded by the chunked engine, which simplifies the spilled trips piece by piece, the loop and
+	              numpy engines keep every trip in memory until it ends) or "visvalingam" the Visvalingam–Whyatt
+	              algorithm (see Simplification.py) or "significance" the Ramer–Douglas–Peucker algorithm run down to
+	              the last position, the significance of every position (largest epsilon at which it is kept) is
+	              written in an 11th column Significance and the positions whose significance is epsilon or higher are
+	              flagged (same Simplified column as "rdp", csv, Parquet and Arrow output files)
+	--coast: Path of a raster of the distance to the coast (see CoastRaster.py), the DistLand of the positions is 
+	         sampled from the raster in place of the 5th column (requires numpy)
+	--overlap: Read and parse the input file in a reader thread and write the csv output file in a writer thread,
+	           connected to the computation by bounded queues of the given depth (default 8 batches, see Overlap.py),
+	           csv input file and single process
+	--index: Write a sidecar index of the csv output file (byte offsets and minimum and maximum Unix Time of every
+	         trip, see OutputIndex.py) queried by vessel, trip and time without scanning the output file
+	--cache: Directory of a cache of the trips of the vessels (see ResultCache.py), keyed by a hash of the positions 
+	         of the vessel and of the parameters. The trips of the unchanged vessels are read from the cache, the 
+	         other vessels are computed by batches of block size positions, the output is the same (single process, 
+	         not incremental)
+	--cache-size: Size limit of the cache (in MB, default 1024), the least recently used entries are removed
+
+Parquet (.parquet, .pq) and Arrow (.arrow, .feather) files can be used as input and output files in place of csv 
+files (requires pyarrow), the columns are the same. Parquet and Arrow input files are read column by column by the 
+numpy engine and row by row by the loop and chunked engines.
+The trips can also be written in binary trip records (.bin, see TripRecords.py) read by SpatialAggregation.py and 
+Pipeline.py without parsing.
+
 The algorithm returns a 10 columns csv file with column names (the value separator is a semicolon ";"). 
 
 	1. Vessel ID
@@ -42,6 +98,12 @@ The algorithm returns a 10 columns csv file with column names (the value separat
                 Negative for left and positive for right.
 	10. Simplified: 1 if the position is on the simplified trip (Ramer–Douglas–Peucker algorithm)
                       0 otherwise                
+	11. Significance: Largest epsilon (in meters) at which the position is on the simplified trip, "inf" for the first 
+	                  and last positions (significance simplifier only)
+
+The script can also be imported as a module: extract_trips(positions, thd, tht, epsilon) is a generator of the trips 
+(tuples of output columns) of an iterable of positions (Vessel ID, Unix Time, X, Y, DistLand), yielded as soon as they 
+are complete.
 
 Author: Maxime Lenormand (2016)
 """
@@ -49,21 +111,134 @@ Author: Maxime Lenormand (2016)
 # ****************************** IMPORTS **********************************************************************************************
 # *************************************************************************************************************************************
 
+import os
 import sys
 import math
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+import CoastRaster
+import ColumnarIO
+import ExternalSort
+import InputFiles
+import Instrumentation
+import Kinematics
+import OutputWriter
+import Overlap
+import ResultCache
+import Simplification
+import TripRecords
+import TripSpill
+import TripState
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # ****************************** PARAMETRES *******************************************************************************************
 # *************************************************************************************************************************************
 
-wdinput = sys.argv[1]
-wdoutput = sys.argv[2]
-thd = float(sys.argv[3])
-tht = float(sys.argv[4]) 
-epsilon = float(sys.argv[5])
+MAXSEGMENT = 1 << 16         #Maximum number of distances computed at once by the Ramer–Douglas–Peucker algorithm
+POSITION_BYTES = 2048        #Approximate memory used by a position of a chunk (chunked engine, in bytes)
+MINCHUNK = 1000              #Minimum number of positions of a chunk (chunked engine)
+
+if __name__ == "__main__":
+    
+    parser = argparse.ArgumentParser(description="Extract trips from spatio-temporal vessel paths")
+    parser.add_argument("wdinput", help="Path of the input file (\"-\" for the standard input)")
+    parser.add_argument("wdoutput", help="Path of the output file")
+    parser.add_argument("thd", type=float, help="Distance threshold (in meters)")
+    parser.add_argument("tht", type=float, help="Time threshold (in seconds)")
+    parser.add_argument("epsilon", type=float, help="Maximum distance between the simplified path and the original one")
+    parser.add_argument("--engine", choices=["loop", "numpy", "chunked"], default="loop", help="Trip segmentation engine")
+    parser.add_argument("--block-size", type=int, default=1000000, help="Minimum number of positions per block (numpy engine)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes")
+    parser.add_argument("--unsorted", action="store_true", help="Sort the input file by vessel ID and time first")
+    parser.add_argument("--memory", type=int, default=1024, help="Memory budget of the sort and of the chunked engine (in MB)")
+    parser.add_argument("--tmpdir", default=None, help="Directory of the temporary files of the sort")
+    parser.add_argument("--precision", type=int, default=None, help="Number of decimals of X, Y, Delta_d and Theta")
+    parser.add_argument("--id-min", default=None, help="Smallest vessel ID read from a Parquet or Arrow input file")
+    parser.add_argument("--id-max", default=None, help="Largest vessel ID read from a Parquet or Arrow input file")
+    parser.add_argument("--state", default=None, help="Checkpoint of the open trips of an incremental run")
+    parser.add_argument("--final", action="store_true", help="Close the open trips of the checkpoint (last incremental run)")
+    parser.add_argument("--stats", default=None, help="Path of the json statistics of the run")
+    parser.add_argument("--progress", type=float, default=None, help="Interval between two progress lines (in seconds)")
+    parser.add_argument("--profile", default=None, help="Path of the cProfile statistics of the run")
+    parser.add_argument("--coast", default=None, help="Path of the raster of the distance to the coast (DistLand)")
+    parser.add_argument("--simplifier", choices=["rdp", "window", "visvalingam", "significance"], default="rdp", 
+                        help="Simplification of the trips (window: bounded memory per trip with the chunked engine only)")
+    parser.add_argument("--index", action="store_true", help="Write the offset index of the output file")
+    parser.add_argument("--overlap", type=int, nargs="?", const=Overlap.DEPTH, default=None, 
+                        help="Overlap reading, computing and writing (depth of the queues)")
+    parser.add_argument("--cache", default=None, help="Directory of the cache of the trips of the vessels")
+    parser.add_argument("--cache-size", type=int, default=ResultCache.SIZE, help="Size limit of the cache (in MB)")
+    args = parser.parse_args()
+
+    wdinput = args.wdinput
+    wdoutput = args.wdoutput
+    thd = args.thd
+    tht = args.tht 
+    epsilon = args.epsilon
+    engine = args.engine
+    block_size = args.block_size
+    workers = args.workers
+    unsorted = args.unsorted
+    memory = args.memory
+    tmpdir = args.tmpdir
+    precision = args.precision
+    id_min = args.id_min
+    id_max = args.id_max
+    state = args.state
+    final = args.final
+    wdstats = args.stats
+    progress = args.progress
+    wdprofile = args.profile
+    wdcoast = args.coast
+    simplifier = args.simplifier
+    index = args.index
+    overlap = args.overlap
+    wdcache = args.cache
+    cache_size = args.cache_size
+
+    if engine != "loop" and np is None:
+        sys.exit("The " + engine + " engine requires numpy")
+
+    if memory < 1:
+        sys.exit("The memory budget (--memory) must be at least 1 MB")
+
+    if wdcoast is not None and np is None:
+        sys.exit("The distance to the coast (--coast) requires numpy")
+    
+    if ColumnarIO.is_columnar(wdinput) and (workers > 1 or unsorted):
+        sys.exit("Parquet and Arrow input files must be sorted and are processed by a single process")
+
+    if workers > 1 and not InputFiles.is_seekable(wdinput):
+        sys.exit("Multiple processes require an uncompressed input file")
 
-print(" ") 
-print("Parameters:" + " "+ wdinput + " " + wdoutput + " " + str(thd) + " " + str(tht) + " " + str(epsilon))
-print(" ") 
+    if state is not None and (engine != "loop" or workers > 1):
+        sys.exit("The incremental mode requires the loop engine and a single process")
+
+    if final and state is None:
+        sys.exit("The --final option requires a checkpoint (--state)")
+
+    if overlap is not None and (workers > 1 or overlap < 1):
+        sys.exit("The overlapped mode requires a single process and a positive queue depth")
+
+    if index and not OutputWriter.is_csv(wdoutput):
+        sys.exit("The index (--index) requires a csv output file")
+
+    if wdcache is not None and (workers > 1 or state is not None):
+        sys.exit("The cache (--cache) requires a single process and no incremental mode")
+
+    if simplifier == "significance" and TripRecords.is_records(wdoutput):
+        sys.exit("The significance (--simplifier significance) cannot be written in binary trip records")
+
+    print(" ") 
+    print("Parameters:" + " "+ wdinput + " " + wdoutput + " " + str(thd) + " " + str(tht) + " " + str(epsilon) + " " + engine + " " + str(workers))
+    print(" ")
 
 # ********************************************* LOAD FUNCTIONS ***********************************************************************
 # ************************************************************************************************************************************
@@ -79,255 +254,1061 @@ def distpointline(x0, y0, x1, y1, x2, y2):
     else:
         return abs((x2 - x1) * (y1 - y0) - (x1 - x0) * (y2 - y1)) / disteucl(x1, y1, x2, y2)
 
+#Farthest position from the segment [first, last] (first < last - 1)
+#Input: X, Y (arrays of cartesian coordinates if numpy is available, lists otherwise), first and last (indices)
+#Output: the index of the farthest position and its distance to the segment (first and 0 if all the positions are on 
+#        the segment without numpy)
+def farthest(X, Y, first, last):
+    if np is not None:
+        dmax = -1.0
+        for lo in range(first + 1, last, MAXSEGMENT):
+            hi = min(lo + MAXSEGMENT, last)
+            d = distpointline(X[lo:hi], Y[lo:hi], X[first], Y[first], X[last], Y[last])
+            dslice = np.max(d)
+            if dslice > dmax:
+                index = lo + int(np.argmax(d))
+                dmax = dslice
+    else:
+        dmax = 0.0
+        index = first
+        for i in range(first + 1, last):
+            d = distpointline(X[i], Y[i], X[first], Y[first], X[last], Y[last])
+            if d > dmax:
+                index = i
+                dmax = d
+    return index, dmax
+
 #Ramer–Douglas–Peucker algorithm 
 #Input: X, Y (two lists of cartesian coordinates in meters) and 
 #       epsilon (maximum distance (in meters) between the simplified trip and the original one)
 #Ouptu: S a list of length X giving for each position 1 if it is in the simplified trip and 0 otherwise    
-def RDP(X, Y, epsilon):
+#The segments [first, last] still to be simplified are stored on an explicit stack of index ranges over the coordinates, 
+#the distances to a segment are computed with numpy if available (by slices of MAXSEGMENT positions). The time and the 
+#maximum recursion depth are added to stats (see Instrumentation.py) if given. The flags can be written in results (an 
+#array of len(X) zeros, the memory-mapped flags of a spilled trip for example) in place of a new list
+def RDP(X, Y, epsilon, stats=None, results=None):
     
     n = len(X)
+    start = time.perf_counter() if stats is not None else None
+    depth_max = 0
     
     if epsilon > 0:
-    
-        dmax = 0.0
-        index = 0
         
-        for i in range(1, (n - 1)):
-            d = distpointline(X[i], Y[i], X[0], Y[0], X[-1], Y[-1])
-            if d > dmax:
-                index = i
-                dmax = d     
-        if dmax >= epsilon:
-            results = RDP(X[:index+1], Y[:index+1], epsilon)[:-1] + RDP(X[index:], Y[index:], epsilon)
-        else:
+        #Shared coordinate buffers
+        if np is not None:
+            X = np.asarray(X, dtype=float)
+            Y = np.asarray(Y, dtype=float)
+        
+        #Keep-mask
+        if results is None:
             results = [0] * n
-            results[0] = 1
-            results[-1] = 1
+        results[0] = 1
+        results[-1] = 1
+        
+        stack = [(0, n - 1, 1)]
+        while stack:
+            
+            first, last, depth = stack.pop()
+            if (last - first) < 2:
+                continue
+            depth_max = max(depth_max, depth)
+            
+            #Farthest position from the segment
+            index, dmax = farthest(X, Y, first, last)
+            
+            #IF the farthest position is farther than epsilon
+            #THEN keep it and simplify both sub-segments
+            if dmax >= epsilon:
+                results[index] = 1
+                stack.append((index, last, depth + 1))
+                stack.append((first, index, depth + 1))
     
-    else:
+    elif results is None:
         results = [1] * n        
+    else:
+        results[:] = 1
+    
+    if stats is not None:
+        stats.add_time('rdp', time.perf_counter() - start)
+        stats.maximum('rdp_max_depth', depth_max)
         
     return results
 
+#Significance of the positions of a trip (multi-resolution Ramer–Douglas–Peucker algorithm)
+#Input: X, Y (two lists of cartesian coordinates in meters), stats and results (an array of len(X) floats, see RDP)
+#Output: G a list of length X giving for each position the largest epsilon at which the Ramer–Douglas–Peucker algorithm 
+#        keeps it (infinity for the first and last positions)
+#The recursion is run down to the last position with the same farthest positions as RDP, the significance of a position 
+#is the smallest distance of the splits leading to it, so RDP(X, Y, epsilon) keeps exactly the positions whose 
+#significance is epsilon or higher
+def RDP_significance(X, Y, stats=None, results=None):
+    
+    n = len(X)
+    start = time.perf_counter() if stats is not None else None
+    depth_max = 0
+    
+    #Shared coordinate buffers
+    if np is not None:
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+    
+    if results is None:
+        results = [0.0] * n
+    results[0] = math.inf
+    results[-1] = math.inf
+    
+    stack = [(0, n - 1, 1, math.inf)]
+    while stack:
+        
+        first, last, depth, significance = stack.pop()
+        if (last - first) < 2:
+            continue
+        depth_max = max(depth_max, depth)
+        
+        #Farthest position from the segment, kept up to the distance of the split (and of the enclosing splits)
+        index, dmax = farthest(X, Y, first, last)
+        
+        #IF all the positions are on the segment (without numpy)
+        #THEN they are only kept if every position is kept
+        if index == first:
+            results[(first + 1):last] = [0.0] * (last - first - 1)
+            continue
+        
+        significance = min(significance, float(dmax))
+        results[index] = significance
+        stack.append((index, last, depth + 1, significance))
+        stack.append((first, index, depth + 1, significance))
+    
+    if stats is not None:
+        stats.add_time('rdp', time.perf_counter() - start)
+        stats.maximum('rdp_max_depth', depth_max)
+    
+    return results
 
-   
-# ****************************** MAIN *************************************************************************************************
-# *************************************************************************************************************************************
+#Simplified trip with the selected algorithm
+#Input: X, Y, epsilon, simplifier ("rdp", "window", "visvalingam" or "significance"), stats and results (see RDP and
+#       RDP_significance)
+#Output: S (see RDP), or the tuple (S, G) with the significance of the positions (see RDP_significance) if simplifier 
+#        is "significance", S being the positions whose significance is epsilon or higher
+def simplify(X, Y, epsilon, simplifier="rdp", stats=None, results=None):
+    
+    if simplifier == "rdp":
+        return RDP(X, Y, epsilon, stats, results)
+    
+    if simplifier == "significance":
+        G = RDP_significance(X, Y, stats, results)
+        return significant(G, epsilon), G
+    
+    start = time.perf_counter() if stats is not None else None
+    if simplifier == "window":
+        S = Simplification.opening_window(X, Y, epsilon)
+    else:
+        S = Simplification.visvalingam(X, Y, epsilon)
+    if results is not None:
+        results[:] = S
+        S = results
+    if stats is not None:
+        stats.add_time('simplification', time.perf_counter() - start)
+    
+    return S
 
-#Input file                                        
-input_file = open(wdinput)                                 #Open file 
-next(input_file)                                           #Skip column names
-
-input_file2 = open(wdinput)                                #Open the file again to detect the next vessel ID
-next(input_file2)                                          #Skip column names
-next(input_file2)                                          #Skip first position
-
-#Output file
-output_file = open(wdoutput,'w')
-output_file.write('Vessel ID')                                   
-output_file.write(';')
-output_file.write('Trip ID')
-output_file.write(';')
-output_file.write('Unix Time')
-output_file.write(';')
-output_file.write('X')
-output_file.write(';')
-output_file.write('Y')
-output_file.write(';')
-output_file.write('DistLand')
-output_file.write(';')
-output_file.write('Delta_t')
-output_file.write(';')
-output_file.write('Delta_d')
-output_file.write(';')
-output_file.write('Theta')
-output_file.write(';')
-output_file.write('Simplified')
-output_file.write('\n')
-
-#Firstline of the vessel path 
-firstline = True
-
-#Looping through the file line by line
-for line in input_file:
-    
-    #Vessel's position attributes
-    attr = line.rstrip('\n\r').split(';')                         #Split line
-    ID = attr[0]                                                  #Vessel ID
-    time = int(attr[1])                                           #Unix Time
-    x = float(attr[2].replace(',', '.'))                          #X cartesian coordinate
-    y = float(attr[3].replace(',', '.'))                          #Y cartesian coordinatecoordinate
-    land = float(attr[4].replace(',', '.'))                       #Distance to Land
-    
-    test_t = True
-    test_d = True
-    
-    #Next Vessel ID
-    try:
-        attr = next(input_file2).rstrip('\n\r').split(';')
-        ID_next = attr[0]                                         #Vessel ID                                   
-    except(StopIteration):
-        ID_next = ID + "last"                                     #Fake ID if last line
-    
-    #IF first vessel's position 
-    #THEN initialize variables    
-    if firstline:
+#Flags of the positions whose significance (list or array, see RDP_significance) is epsilon or higher
+def significant(G, epsilon):
+    if hasattr(G, 'dtype'):
+        return (G >= epsilon).astype(np.int8)
+    return [1 if g >= epsilon else 0 for g in G]
+
+#Output column names, types (Parquet and Arrow output) and float columns (fixed precision)
+COLUMNS = ['Vessel ID', 'Trip ID', 'Unix Time', 'X', 'Y', 'DistLand', 'Delta_t', 'Delta_d', 'Theta', 'Simplified']
+TYPES = [None, 'int64', 'int64', 'float64', 'float64', 'float64', 'int64', 'float64', 'float64', 'int8']
+FLOATS = ['X', 'Y', 'Delta_d', 'Theta']
+INDEX = ['Vessel ID', 'Trip ID']             #Columns identifying a trip in the output index (see OutputIndex.py)
+SIGNIFICANCE = 'Significance'                #Column following Simplified with the significance simplifier
+
+#Output column names and types of a simplifier (see simplify)
+def output_columns(simplifier="rdp"):
+    if simplifier == "significance":
+        return COLUMNS + [SIGNIFICANCE], TYPES + ['float64']
+    return COLUMNS, TYPES
+
+#Vessel's position attributes of the lines of a csv file
+def parse_positions(lines):
+    for line in lines:
+        attr = line.rstrip('\n\r').split(';')                         #Split line
+        ID = attr[0]                                                  #Vessel ID
+        time = int(attr[1])                                           #Unix Time
+        x = float(attr[2].replace(',', '.'))                          #X cartesian coordinate
+        y = float(attr[3].replace(',', '.'))                          #Y cartesian coordinatecoordinate
+        land = float(attr[4].replace(',', '.')) if len(attr) > 4 else None   #Distance to Land
+        yield ID, time, x, y, land
+
+#Columns of a trip
+#Input: ID (vessel ID), IDtrip (trip ID), T, X, Y, L (lists of time, cartesian coordinates and distance to land), 
+#       S (list of Ramer–Douglas–Peucker flags, or tuple of the flags and the significance of the positions, see 
+#       simplify), stats (see Instrumentation.py, None if not measured) and kinematics (lists Delta_t, Delta_d and 
+#       Theta already computed by block, computed from T, X, Y if None)
+#Output: a tuple of the 10 output columns of the trip (lists of the same length), 11 with the significance
+def trip_columns(ID, IDtrip, T, X, Y, L, S, stats=None, kinematics=None):
+    
+    n = len(T)
+    start = time.perf_counter() if stats is not None else None
+    
+    #Interevent time, distance and angle (0 for the first and last positions, see Kinematics.py)
+    if kinematics is None:
+        Dt, Dd, Theta = Kinematics.trip_kinematics(T, X, Y)
+    else:
+        Dt, Dd, Theta = kinematics
+    
+    if stats is not None:
+        stats.add_time('angles', time.perf_counter() - start)
+        stats.count('trips')
+    
+    if isinstance(S, tuple):
+        return ([ID] * n, [IDtrip] * n, T, X, Y, L, Dt, Dd, Theta) + S
+    return [ID] * n, [IDtrip] * n, T, X, Y, L, Dt, Dd, Theta, S
+
+#Write trips in the output file
+#Input: trips (iterable of trip columns, see trip_columns), writer (BatchWriter of the output file) and stats (see 
+#       Instrumentation.py, the time spent producing the trips is the time of the state machine)
+def write_trips(trips, writer, stats=None):
+    if stats is None:
+        for trip in trips:
+            writer.write(*trip)
+    else:
+        for trip in stats.exclusive(trips, 'state_machine'):
+            with stats.timer('writing'):
+                writer.write(*trip)
+
+#Distance test of every position, time and distance tests of every position but the first one of each vessel path
+#Input: V, T, L (three arrays of vessel index, Unix time and distance to land of vessel paths sorted by vessel and time), 
+#       thd (distance threshold in meters) and tht (time threshold in seconds)
+#Output: two boolean arrays
+def segment_tests(V, T, L, thd, tht):
+    test_d = L > thd
+    test = np.zeros(len(T), dtype=bool)
+    test[1:] = ((T[1:] - T[:-1]) < tht) & test_d[1:] & (V[1:] == V[:-1])
+    return test_d, test
+
+#Trip segmentation of a block of vessel paths with boolean masks
+#Input: V, T, L (three arrays of vessel index, Unix time and distance to land of vessel paths sorted by vessel and time), 
+#       thd (distance threshold in meters), tht (time threshold in seconds), stats (see Instrumentation.py) and
+#       complete (False if the last vessel path continues after the block, its open trip is not returned)
+#Output: three arrays giving for each trip with more than two positions the index of the first position, the index 
+#        following the last position and the trip ID within the vessel path
+def segment_trips(V, T, L, thd, tht, stats=None, complete=True):
+    
+    n = len(T)
+    test_d, test = segment_tests(V, T, L, thd, tht)
+    
+    #Runs of successive positions passing the tests
+    edges = np.diff(np.concatenate(([0], test.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    
+    #IF the position preceding a run passes the distance test 
+    #THEN add it to the trip
+    starts = starts - test_d[starts - 1].astype(starts.dtype)
+    
+    #IF the last vessel path continues after the block
+    #THEN the run ending with the block is still open
+    if not complete and len(ends) > 0 and ends[-1] == n:
+        starts = starts[:-1]
+        ends = ends[:-1]
+    
+    #Keep trips with more than two positions (to compute the angle)
+    keep = (ends - starts) > 2
+    if stats is not None:
+        #Trips dropped, except the runs reduced to the last position of a vessel path (not started by the loop engine)
+        last = (ends == n) | (V[np.minimum(ends, n - 1)] != V[ends - 1])
+        tail = last & (edges[ends - 1] == 1)
+        stats.count('trips_dropped', int(np.count_nonzero(~keep & ~tail)))
+    starts = starts[keep]
+    ends = ends[keep]
+    
+    #Number the trips within each vessel path
+    trips_vessel = V[starts]
+    IDtrips = np.arange(1, len(starts) + 1) - np.searchsorted(trips_vessel, trips_vessel, side="left")
+    
+    return starts, ends, IDtrips
+
+#Trips of a block of vessel paths (numpy engine)
+#Input: IDs, V, T, X, Y, L (arrays of vessel ID, vessel index, Unix time, cartesian coordinates and distance to land of 
+#       complete vessel paths sorted by vessel and time), thd, tht, epsilon, stats (see Instrumentation.py) and 
+#       simplifier (see simplify)
+#Output: a generator of trip columns (see trip_columns)
+def block_trips(IDs, V, T, X, Y, L, thd, tht, epsilon, stats=None, simplifier="rdp"):
+    starts, ends, IDtrips = segment_trips(V, T, L, thd, tht, stats)
+    yield from range_trips(IDs, T, X, Y, L, starts, ends, IDtrips, epsilon, stats, simplifier)
+
+#Trips given by index ranges of a block of positions
+#Input: IDs, T, X, Y, L (arrays of vessel ID, Unix time, cartesian coordinates and distance to land), starts, ends, 
+#       IDtrips (see segment_trips), epsilon, stats (see Instrumentation.py) and simplifier (see simplify)
+#Output: a generator of trip columns (see trip_columns)
+def range_trips(IDs, T, X, Y, L, starts, ends, IDtrips, epsilon, stats=None, simplifier="rdp"):
+    
+    #Interevent time, distance and angle of all the trips of the block
+    begin = time.perf_counter() if stats is not None else None
+    kinematics = Kinematics.kinematics(T, X, Y, starts, ends)
+    if stats is not None:
+        stats.add_time('angles', time.perf_counter() - begin)
+    
+    for start, end, IDtrip in zip(starts.tolist(), ends.tolist(), IDtrips.tolist()):
+        
+        #Simplified trip (Ramer–Douglas–Peucker algorithm by default)
+        S = simplify(X[start:end], Y[start:end], epsilon, simplifier, stats)
         
-        IDtrip = 0                       #ID trip        
-        time_old = 0                     #Unix Time previous position 
-        x_old = 0.0                      #X cartesian coordinate previous position 
-        y_old = 0.0                      #Y cartesian coordinate previous position
-        land_old = 0.0                   #Distance to land previous position
+        yield trip_columns(IDs[start], IDtrip, T[start:end].tolist(), X[start:end].tolist(), Y[start:end].tolist(), 
+                           L[start:end].tolist(), S, stats, Kinematics.kinematics_lists(*kinematics, start, end))
+
+#Blocks of complete vessel paths of positions (numpy engine)
+#Input: positions (iterable of positions (Vessel ID, Unix Time, X, Y, DistLand) sorted by vessel and time) and 
+#       block_size (minimum number of positions per block)
+#Output: a generator of blocks, tuples of arrays IDs, V, T, X, Y, L (see block_trips)
+def position_blocks(positions, block_size):
+    
+    #Block of complete vessel paths
+    IDs, V, T, X, Y, L = [], [], [], [], [], []
+    
+    #Vessel index
+    v = 0
+    
+    #Looping through the positions
+    for ID, time, x, y, land in positions:
+        
+        #IF new vessel 
+        #THEN return the block if it is large enough
+        if IDs and ID != IDs[-1]:
+            v += 1
+            if len(T) >= block_size:
+                yield (np.array(IDs, dtype=object), np.array(V), np.array(T, dtype=np.int64), np.array(X), np.array(Y), 
+                       np.array(L))
+                IDs, V, T, X, Y, L = [], [], [], [], [], []
+        
+        IDs.append(ID)
+        V.append(v)
+        T.append(time)
+        X.append(x)
+        Y.append(y)
+        L.append(land)
+    
+    #Last block
+    if T:
+        yield (np.array(IDs, dtype=object), np.array(V), np.array(T, dtype=np.int64), np.array(X), np.array(Y), 
+               np.array(L))
+
+#Trips of positions loaded by blocks of complete vessel paths (numpy engine)
+#Input: positions (iterable of positions (Vessel ID, Unix Time, X, Y, DistLand) sorted by vessel and time), thd, tht, 
+#       epsilon, block_size (minimum number of positions per block), stats (see Instrumentation.py) and simplifier 
+#       (see simplify)
+#Output: a generator of trip columns (see trip_columns)
+def numpy_trips(positions, thd, tht, epsilon, block_size, stats=None, simplifier="rdp"):
+    for IDs, V, T, X, Y, L in position_blocks(positions, block_size):
+        yield from block_trips(IDs, V, T, X, Y, L, thd, tht, epsilon, stats, simplifier)
+
+#Trips of positions read by record batches from a Parquet or Arrow file (numpy engine)
+#Input: batches (pyarrow record batches of positions sorted by vessel and time), thd, tht, epsilon, 
+#       block_size (minimum number of positions per block), stats (see Instrumentation.py), coast (CoastRaster 
+#       giving the DistLand, read from the batches if None) and simplifier (see simplify)
+#Output: a generator of trip columns (see trip_columns)
+def batch_trips(batches, thd, tht, epsilon, block_size, stats=None, coast=None, simplifier="rdp"):
+    
+    #Block of vessel paths, the last one may be incomplete
+    block = None
+    
+    for batch in batches:
+        
+        if coast is None:
+            columns = [batch.column(k).to_numpy(zero_copy_only=False) for k in range(5)]
+        else:
+            columns = [batch.column(k).to_numpy(zero_copy_only=False) for k in range(4)]
+            columns.append(coast.sample(columns[2], columns[3]))
+        if stats is not None:
+            stats.count('positions', len(columns[0]))
+        if block is not None:
+            columns = [np.concatenate((a, b)) for a, b in zip(block, columns)]
+        block = columns
+        
+        #IF the block is large enough
+        #THEN process the complete vessel paths and keep the last one
+        if len(block[0]) >= block_size:
+            IDs = block[0]
+            new = np.flatnonzero(IDs[1:] != IDs[:-1]) + 1
+            if len(new) > 0:
+                last = new[-1]
+                yield from array_trips(*[column[:last] for column in block], thd=thd, tht=tht, epsilon=epsilon, 
+                                       stats=stats, simplifier=simplifier)
+                block = [column[last:] for column in block]
+    
+    #Last block
+    if block is not None and len(block[0]) > 0:
+        yield from array_trips(*block, thd=thd, tht=tht, epsilon=epsilon, stats=stats, simplifier=simplifier)
+
+#Trips of complete vessel paths given as arrays (numpy engine)
+#Input: IDs, T, X, Y, L (arrays of vessel ID, Unix time, cartesian coordinates and distance to land sorted by vessel and 
+#       time, the last vessel path is considered complete), thd, tht, epsilon, stats (see Instrumentation.py) and 
+#       simplifier (see simplify)
+#Output: a generator of trip columns (see trip_columns)
+def array_trips(IDs, T, X, Y, L, thd, tht, epsilon, stats=None, simplifier="rdp"):
+    
+    IDs = np.asarray(IDs)
+    V = np.zeros(len(IDs), dtype=np.int64)
+    V[1:] = np.cumsum(IDs[1:] != IDs[:-1])
+    if stats is not None and len(V) > 0:
+        stats.count('vessels', int(V[-1]) + 1)
+    
+    yield from block_trips(IDs.astype(object), V, np.asarray(T).astype(np.int64), np.asarray(X, dtype=float), 
+                           np.asarray(Y, dtype=float), np.asarray(L, dtype=float), thd, tht, epsilon, stats, simplifier)
+
+#Pieces of a trip spilled on disk (chunked engine)
+#Input: ID (vessel ID), IDtrip (trip ID), spill (TripSpill of the complete trip), epsilon, size (number of positions 
+#       of a piece), stats (see Instrumentation.py) and simplifier (see simplify)
+#Output: a generator of trip columns (see trip_columns), each one giving a piece of the trip
+def spilled_trip(ID, IDtrip, spill, epsilon, size, stats=None, simplifier="rdp"):
+    
+    T, X, Y, L = spill.columns()
+    n = len(T)
+    
+    #Simplified trip, computed piece by piece by the opening window, memory-mapped flags (or significance) otherwise
+    G = None
+    if simplifier == "window":
+        window = Simplification.OpeningWindow(epsilon)
+        flags = []
+        pushed = 0
+    elif simplifier == "significance":
+        G = RDP_significance(X, Y, stats, spill.flags(np.float64))
+    else:
+        S = simplify(X, Y, epsilon, simplifier, stats, spill.flags())
+    
+    for start in range(0, n, size):
+        end = min(start + size, n)
+        
+        #Flags of the piece, the window is pushed until they are known
+        if simplifier == "window":
+            begin = time.perf_counter() if stats is not None else None
+            while len(flags) < end - start:
+                for x, y in zip(X[pushed:(pushed + size)].tolist(), Y[pushed:(pushed + size)].tolist()):
+                    flags.extend(window.push(x, y))
+                pushed = min(pushed + size, n)
+                if pushed == n:
+                    flags.extend(window.close())
+            S_piece, flags = flags[:(end - start)], flags[(end - start):]
+            if stats is not None:
+                stats.add_time('simplification', time.perf_counter() - begin)
+        elif G is not None:
+            S_piece = significant(G[start:end], epsilon).tolist()
+        else:
+            S_piece = S[start:end].tolist()
+        
+        #Interevent time, distance and angle with the positions surrounding the piece
+        begin = time.perf_counter() if stats is not None else None
+        lo = max(start - 1, 0)
+        hi = min(end + 1, n)
+        Dt, Dd, Theta = Kinematics.kinematics_lists(*Kinematics.kinematics(T[lo:hi], X[lo:hi], Y[lo:hi]), start - lo, 
+                                                    end - lo, start == 0)
+        if stats is not None:
+            stats.add_time('angles', time.perf_counter() - begin)
+        
+        columns = ([ID] * (end - start), [IDtrip] * (end - start), T[start:end].tolist(), X[start:end].tolist(), 
+                   Y[start:end].tolist(), L[start:end].tolist(), Dt, Dd, Theta, S_piece)
+        yield columns if G is None else columns + (G[start:end].tolist(),)
+    
+    if stats is not None:
+        stats.count('trips')
+
+#Trips of a chunk of positions (chunked engine)
+#Input: IDs, T, X, Y, L (arrays of vessel ID, Unix time, cartesian coordinates and distance to land sorted by vessel and 
+#       time, starting with the unfinished tail of the previous chunk), thd, tht, epsilon, size (number of positions of 
+#       a chunk), offset (number of trips already written for the first vessel path), spill (TripSpill of the open trip 
+#       of the first vessel path, its last position starts the chunk, None if not spilled), final (True if the chunk 
+#       ends the input), tmpdir (directory of the spilled trips), stats (see Instrumentation.py) and simplifier (see 
+#       simplify)
+#Output: a generator of trip columns (see trip_columns), returning the offset and the spill of the last vessel path and 
+#        its unfinished tail (list of arrays IDs, T, X, Y, L) to start the next chunk
+def chunk_trips(IDs, T, X, Y, L, thd, tht, epsilon, size, offset, spill, final, tmpdir=None, stats=None, simplifier="rdp"):
+    
+    n = len(T)
+    V = np.zeros(n, dtype=np.int64)
+    V[1:] = np.cumsum(IDs[1:] != IDs[:-1])
+    
+    #IF the open trip of the first vessel path is spilled on disk
+    #THEN append the positions continuing it
+    if spill is not None:
+        test = segment_tests(V, T, L, thd, tht)[1]
+        stop = np.flatnonzero(~test[1:])
+        end = int(stop[0]) + 1 if len(stop) > 0 else n
         
-        test_t = True                    #Test if interevent time between current and last position is lower than tht
-        test_d = True                    #Test if distance to land is lower than thd
-        test_t_old = False               #Test if interevent time between the last and last last position is lower than tht
-        test_d_old = (land > thd)        #Test if distance to land of previous position is lower than thd
-
-        #Trip
-        T = []                           #Trip successive time
-        X = []                           #Trip successive X coordinate 
-        Y = []                           #Trip successive Y coordinate
-        L = []                           #Trip successive distance to land
+        #IF the trip goes on after the chunk
+        #THEN spill the chunk but its last position
+        if end == n and not final:
+            spill.append(T[:(n - 1)], X[:(n - 1)], Y[:(n - 1)], L[:(n - 1)])
+            return offset, spill, [column[(n - 1):] for column in (IDs, T, X, Y, L)]
         
-        firstline = False
+        spill.append(T[:end], X[:end], Y[:end], L[:end])
+        offset += 1
+        try:
+            yield from spilled_trip(IDs[0], offset, spill, epsilon, size, stats, simplifier)
+        finally:
+            spill.remove()
+        spill = None
         
+        #Rest of the chunk
+        if end < n and V[end] != V[0]:
+            offset = 0
+        IDs, V, T, X, Y, L = [column[end:] for column in (IDs, V, T, X, Y, L)]
+        V = V - V[0] if end < n else V
+        n = len(T)
+        if n == 0:
+            return 0, None, [column[:0] for column in (IDs, T, X, Y, L)]
+    
+    #Trips ending in the chunk, the trip IDs of the first vessel path follow the trips already written
+    starts, ends, IDtrips = segment_trips(V, T, L, thd, tht, stats, complete=final)
+    IDtrips[V[starts] == 0] += offset
+    
+    #Unfinished tail of the last vessel path: its open trip with the preceding position or its last position
+    if final:
+        tail = n
     else:
+        test = segment_tests(V, T, L, thd, tht)[1]
+        if test[n - 1]:
+            tail = n - int(np.argmin(test[::-1])) - 1
+        else:
+            tail = n - 1
+    
+    yield from range_trips(IDs, T, X, Y, L, starts, ends, IDtrips, epsilon, stats, simplifier)
+    
+    if final:
+        return 0, None, None
+    
+    #Trips already written for the last vessel path
+    last = V[starts] == V[n - 1]
+    if last.any():
+        offset = int(IDtrips[last][-1])
+    elif V[n - 1] != 0:
+        offset = 0
+    
+    #IF the open trip is longer than half a chunk (and than a trip)
+    #THEN spill it on disk but its last position
+    if test[n - 1] and n - tail > max(size // 2, 3):
+        first = tail if L[tail] > thd else tail + 1                #Preceding position in the trip if it passes the distance test
+        spill = TripSpill.TripSpill(tmpdir)
+        spill.append(T[first:(n - 1)], X[first:(n - 1)], Y[first:(n - 1)], L[first:(n - 1)])
+        tail = n - 1
+    
+    return offset, spill, [column[tail:] for column in (IDs, T, X, Y, L)]
+
+#Trips of positions read by chunks of a fixed number of positions within a memory budget (chunked engine)
+#Input: positions (iterable of positions (Vessel ID, Unix Time, X, Y, DistLand) sorted by vessel and time), thd, tht, 
+#       epsilon, memory (memory budget in MB), tmpdir (directory of the spilled trips), stats (see Instrumentation.py) 
+#       and simplifier (see simplify)
+#Output: a generator of trip columns (see trip_columns), the trips are the same as with the other engines but a trip 
+#        spilled on disk is yielded by pieces of a chunk
+def chunked_trips(positions, thd, tht, epsilon, memory=1024, tmpdir=None, stats=None, simplifier="rdp"):
+    
+    if np is None:
+        raise ImportError("The chunked engine requires numpy")
+    
+    size = max(MINCHUNK, memory * 2 ** 20 // POSITION_BYTES)
+    
+    #Chunk starting with the unfinished tail of the previous chunk
+    IDs, T, X, Y, L = [], [], [], [], []
+    offset = 0
+    spill = None
+    
+    try:
+        
+        #Looping through the positions
+        for ID, t, x, y, land in positions:
+            
+            IDs.append(ID)
+            T.append(t)
+            X.append(x)
+            Y.append(y)
+            L.append(land)
+            
+            #IF the chunk is full
+            #THEN process it and keep its unfinished tail
+            if len(T) >= size:
+                offset, spill, tail = yield from chunk_trips(np.array(IDs, dtype=object), np.array(T, dtype=np.int64), 
+                                                             np.array(X), np.array(Y), np.array(L), thd, tht, epsilon, 
+                                                             size, offset, spill, False, tmpdir, stats, simplifier)
+                IDs, T, X, Y, L = [column.tolist() for column in tail]
+        
+        #Last chunk
+        if T:
+            yield from chunk_trips(np.array(IDs, dtype=object), np.array(T, dtype=np.int64), np.array(X), np.array(Y), 
+                                   np.array(L), thd, tht, epsilon, size, offset, spill, True, tmpdir, stats, simplifier)
+            spill = None
+    
+    finally:
+        if spill is not None:
+            spill.remove()
+
+#Trips of positions processed one by one (loop engine)
+#Input: positions (iterable of positions (Vessel ID, Unix Time, X, Y, DistLand) sorted by vessel and time, read in a
+#       single pass), thd, tht, epsilon and states (dictionary of the vessel states of an incremental run updated in 
+#       place, see TripState.py, None to close the trips at the last vessel position), stats (see Instrumentation.py) 
+#       and simplifier (see simplify)
+#Output: a generator of trip columns (see trip_columns)
+def loop_trips(positions, thd, tht, epsilon, states=None, stats=None, simplifier="rdp"):
+    
+    #Firstline of the vessel path 
+    firstline = True
+
+    #Next position, read one position ahead to detect the last position of a vessel
+    positions = iter(positions)
+    position_next = next(positions, None)
+
+    #Looping through the positions
+    while position_next is not None:
+    
+        ID, time, x, y, land = position_next
+        position_next = next(positions, None)
+    
+        test_t = True
+        test_d = True
+    
+        #Next Vessel ID (None if last position)
+        ID_next = None if position_next is None else position_next[0]
+        
+        #Last vessel position, the trip is kept open in incremental mode
+        last = (ID_next != ID)
+        end = last and states is None
+    
+        #IF first vessel's position of an incremental run AND vessel state saved by a previous run
+        #THEN restore the state
+        if firstline and states is not None and ID in states:
+            IDtrip, time_old, x_old, y_old, land_old, test_t_old, test_d_old, T, X, Y, L = states.pop(ID)
+            firstline = False
+    
+        #IF first vessel's position 
+        #THEN initialize variables    
+        if firstline:
+        
+            IDtrip = 0                       #ID trip        
+            time_old = 0                     #Unix Time previous position 
+            x_old = 0.0                      #X cartesian coordinate previous position 
+            y_old = 0.0                      #Y cartesian coordinate previous position
+            land_old = 0.0                   #Distance to land previous position
+        
+            test_t = True                    #Test if interevent time between current and last position is lower than tht
+            test_d = True                    #Test if distance to land is lower than thd
+            test_t_old = False               #Test if interevent time between the last and last last position is lower than tht
+            test_d_old = (land > thd)        #Test if distance to land of previous position is lower than thd
+
+            #Trip
+            T = []                           #Trip successive time
+            X = []                           #Trip successive X coordinate 
+            Y = []                           #Trip successive Y coordinate
+            L = []                           #Trip successive distance to land
+        
+            firstline = False
+        
+        else:
        
-       #Current time and distance tests        
-       test_t = ((time-time_old) < tht)
-       test_d = (land > thd)
+           #Current time and distance tests        
+           test_t = ((time-time_old) < tht)
+           test_d = (land > thd)
        
-       #IF the current position pass the tests AND the last one do not pass the tests AND not last position 
-       #THEN start a new trip with the current position                  
-       if ((test_t and test_d) and (not(test_t_old and test_d_old)) and (ID_next == ID)):
-           #IF the previous position pass the distance test
-           #THEN add the last position
-           if (test_d_old):                              
-               T = [time_old, time]        
-               X = [x_old, x]         
-               Y = [y_old, y]
-               L = [land_old, land]
-           else:
-               T = [time]        
-               X = [x]         
-               Y = [y]
-               L = [land]               
-       #IF current and last positions pass the tests AND not last position 
-       #THEN add current position        
-       elif ((test_t and test_d) and (test_t_old and test_d_old) and (ID_next == ID)):
-           T = T + [time]        
-           X = X + [x]         
-           Y = Y + [y]
-           L = L + [land]
-                                  
-       #IF last position pass the tests AND current position not 
-       #OR IF both last and current position pass the test AND last vessel position
-       #THEN end the trip and write the results in the output file                           
-       elif (((test_t_old and test_d_old) and (not(test_t and test_d))) or ((test_t_old and test_d_old) and (test_t and test_d) and (ID_next != ID))):
-          
-           #IF second condition
-           #THEN add current position
-           if ((test_t_old and test_d_old) and (test_t and test_d) and (ID_next != ID)):
+           #IF the current position pass the tests AND the last one do not pass the tests AND not last position 
+           #THEN start a new trip with the current position                  
+           if ((test_t and test_d) and (not(test_t_old and test_d_old)) and (not end)):
+               #IF the previous position pass the distance test
+               #THEN add the last position
+               if (test_d_old):                              
+                   T = [time_old, time]        
+                   X = [x_old, x]         
+                   Y = [y_old, y]
+                   L = [land_old, land]
+               else:
+                   T = [time]        
+                   X = [x]         
+                   Y = [y]
+                   L = [land]               
+           #IF current and last positions pass the tests AND not last position 
+           #THEN add current position        
+           elif ((test_t and test_d) and (test_t_old and test_d_old) and (not end)):
                T = T + [time]        
                X = X + [x]         
                Y = Y + [y]
                L = L + [land]
+                                  
+           #IF last position pass the tests AND current position not 
+           #OR IF both last and current position pass the test AND last vessel position
+           #THEN end the trip and write the results in the output file                           
+           elif (((test_t_old and test_d_old) and (not(test_t and test_d))) or ((test_t_old and test_d_old) and (test_t and test_d) and end)):
+          
+               #IF second condition
+               #THEN add current position
+               if ((test_t_old and test_d_old) and (test_t and test_d) and end):
+                   T = T + [time]        
+                   X = X + [x]         
+                   Y = Y + [y]
+                   L = L + [land]
+               
+               #IF more than three positions (to compute the angle)
+               if (len(T) > 2):
                
-           #IF more than three positions (to compute the angle)
-           if (len(T) > 2):
+                   #Simplified trip (Ramer–Douglas–Peucker algorithm by default)
+                   S = simplify(X, Y, epsilon, simplifier, stats)
                
-               #Simplified trip with Ramer–Douglas–Peucker algorithm
-               S = RDP(X, Y, epsilon) 
+                   #ID trip
+                   IDtrip += 1
                
-               #ID trip
-               IDtrip += 1
+                   yield trip_columns(ID, IDtrip, T, X, Y, L, S, stats)
                
-               for i in range(0, len(T)):
-                   
-                   output_file.write(ID)                                   
-                   output_file.write(';')
-                   output_file.write(str(IDtrip))
-                   output_file.write(';')
-                   output_file.write(str(T[i]))
-                   output_file.write(';')
-                   output_file.write(str(X[i]))
-                   output_file.write(';')
-                   output_file.write(str(Y[i]))
-                   output_file.write(';')
-                   output_file.write(str(L[i]))
-                   output_file.write(';')
-                   
-                   if i==0:
-                       output_file.write(str(0))     
-                       output_file.write(';')
-                       output_file.write(str(0))     
-                       output_file.write(';')
-                       output_file.write(str(0)) 
-                       output_file.write(';')
-                       output_file.write(str(S[i]))                        
-                       output_file.write('\n')
-                   else:
-                       #Compute interevent time and distance                                                                                       
-                       output_file.write(str(T[i] - T[(i-1)]))
-                       output_file.write(';')
-                       output_file.write(str(disteucl(X[i], Y[i], X[(i-1)], Y[(i-1)])))
-                       output_file.write(';')
-    
-                       if i==(len(T)-1):
-                           output_file.write(str(0))
-                           output_file.write(';')
-                           output_file.write(str(S[i])) 
-                           output_file.write('\n')
-                       #Compute angle    
-                       else:
-                           #Coordinate and norm vector a and b
-                           Xa = X[i]-X[(i+1)]
-                           Ya = Y[i]-Y[(i+1)]          
-                           Xb = X[i]-X[(i-1)]
-                           Yb = Y[i]-Y[(i-1)]
-                           Na = math.sqrt(Xa**2+Ya**2);
-                           Nb = math.sqrt(Xb**2+Yb**2);
-                           
-                           #If same position
-                           if(Na==0 or Nb==0):
-                               output_file.write(str(0))
-                           else:    
-                               cos = (Xa*Xb+Ya*Yb)/(Na*Nb)
-                               if cos < -1:
-                                   cos = -1
-                               if cos >1:
-                                   cos = 1
-                                   
-                               sin = (Xa*Yb-Ya*Xb)
-                               if sin < 0:
-                                   output_file.write(str(180-math.acos(cos)*(180./math.pi)))
-                               else:
-                                   output_file.write(str(-180+math.acos(cos)*(180./math.pi)))
-                           output_file.write(';')
-                           output_file.write(str(S[i])) 
-                           output_file.write('\n')   
+               elif stats is not None:
+                   stats.count('trips_dropped')
        
-       #Update test value
-       test_t_old = test_t
-       test_d_old = test_d
+           #Update test value
+           test_t_old = test_t
+           test_d_old = test_d
+    
+        #IF lastline 
+        #THEN update firstline
+        if last:
+            firstline = True
+    
+        #Update position attribute                                                   
+        time_old = time 
+        x_old = x
+        y_old = y
+        land_old = land
+        
+        #IF lastline of an incremental run
+        #THEN save the vessel state with the open trip
+        if last and states is not None:
+            if not (test_t_old and test_d_old):
+                T, X, Y, L = [], [], [], []
+            states[ID] = [IDtrip, time_old, x_old, y_old, land_old, test_t_old, test_d_old, T, X, Y, L]
+
+#Trips still open at the end of the last incremental run, as if the last position of every vessel was the last one of 
+#its path
+#Input: states (dictionary giving the state of every vessel ID, see TripState.py, emptied), epsilon, stats and 
+#       simplifier (see simplify)
+#Output: a generator of trip columns (see trip_columns)
+def close_trips(states, epsilon, stats=None, simplifier="rdp"):
+    
+    for ID in sorted(states):
+        IDtrip, time_old, x_old, y_old, land_old, test_t_old, test_d_old, T, X, Y, L = states[ID]
+        
+        #IF the last position pass the tests AND more than three positions
+        #THEN write the open trip
+        if test_t_old and test_d_old and len(T) > 2:
+            yield trip_columns(ID, IDtrip + 1, T, X, Y, L, simplify(X, Y, epsilon, simplifier, stats), stats)
+    
+    states.clear()
+
+
+#Extract the trips of positions (streaming API)
+#Input: positions (iterable of positions (Vessel ID, Unix Time, X, Y, DistLand) sorted by vessel and time), thd, tht, 
+#       epsilon, engine ("loop", "numpy" or "chunked"), block_size (minimum number of positions per block, numpy engine), 
+#       states (dictionary of the vessel states of an incremental run, loop engine, see loop_trips), stats (see 
+#       Instrumentation.py), memory and tmpdir (memory budget in MB and directory of the spilled trips, chunked engine) 
+#       and simplifier (see simplify)
+#Output: a generator of trip columns (see trip_columns), the loop engine yields each trip as soon as it ends while the 
+#        numpy and chunked engines yield the trips by blocks of vessel paths or by chunks
+def extract_trips(positions, thd, tht, epsilon, engine="loop", block_size=1000000, states=None, stats=None, memory=1024, 
+                  tmpdir=None, simplifier="rdp"):
+    if engine != "loop" and states is not None:
+        raise ValueError("The incremental mode requires the loop engine")
+    if engine == "numpy":
+        return numpy_trips(positions, thd, tht, epsilon, block_size, stats, simplifier)
+    if engine == "chunked":
+        return chunked_trips(positions, thd, tht, epsilon, memory, tmpdir, stats, simplifier)
+    return loop_trips(positions, thd, tht, epsilon, states, stats, simplifier)
+
+#Positions of lines of an input file, counted and timed if stats is given
+#Input: lines, stats (see Instrumentation.py), input_file (InputFiles.InputFile giving the offset in the input file
+#       for the progress lines, None if unknown) and coast (CoastRaster giving the DistLand, read from the lines if None)
+def track_positions(lines, stats=None, input_file=None, coast=None):
+    positions = parse_positions(lines)
+    if stats is not None and input_file is None:
+        positions = stats.positions(positions, 'vessels')
+    elif stats is not None:
+        positions = stats.positions(positions, 'vessels', input_file.offset(), input_file.size)
+    if coast is not None:
+        positions = CoastRaster.assign_land(positions, coast)
+    return positions
+
+#Positions of the lines of a csv file (see track_positions), parsed in a reader thread if overlap (depth of the queue
+#of batches, see Overlap.py) is given
+def read_positions(lines, stats=None, input_file=None, coast=None, overlap=None):
+    if overlap is None:
+        return track_positions(lines, stats, input_file, coast)
+    reader_stats = None if stats is None else Instrumentation.Stats(stats.progress)
+    return Overlap.read_ahead(track_positions(lines, reader_stats, input_file, coast), overlap, stats=stats,
+                              reader_stats=reader_stats)
+
+#Positions of an input file (see extract_file) parsed in a reader thread if overlap is given (csv input file)
+#Output: the positions and the input file to close (None for Parquet and Arrow input files)
+def open_positions(wdinput, unsorted=False, memory=1024, tmpdir=None, id_min=None, id_max=None, stats=None, coast=None, 
+                   overlap=None):
+    
+    if ColumnarIO.is_columnar(wdinput):
+        positions = ColumnarIO.read_rows(wdinput, id_min, id_max)
+        if stats is not None:
+            positions = stats.positions(positions)
+        if coast is not None:
+            positions = CoastRaster.assign_land(positions, coast)
+        return positions, None
+    
+    input_file = InputFiles.InputFile(wdinput)                     #Open file 
+    next(input_file)                                               #Skip column names
+    if unsorted:
+        positions = read_positions(ExternalSort.sort_lines(input_file, memory, tmpdir, input_file.lines_size()), stats, 
+                                   coast=coast, overlap=overlap)
+    else:
+        positions = read_positions(input_file, stats, input_file, coast, overlap)
+    return positions, input_file
+
+#Cache of the trips of the vessels (see ResultCache.py)
+#Input: wdcache (directory of the cache), size (size limit in MB), thd, tht, epsilon and simplifier
+def open_cache(wdcache, size, thd, tht, epsilon, simplifier="rdp"):
+    return ResultCache.ResultCache(wdcache, size, 'ExtractTrips', [thd, tht, epsilon, simplifier])
+
+#Trips of positions reusing the trips of the unchanged vessels cached by a previous run
+#Input: positions (iterable of positions (Vessel ID, Unix Time, X, Y, DistLand) sorted by vessel and time), thd, tht, 
+#       epsilon, cache (ResultCache, see open_cache), engine, block_size (minimum number of positions of a batch of 
+#       vessels computed together), stats, memory, tmpdir and simplifier (see extract_trips)
+#Output: a generator of trip columns (see trip_columns), the same trips as extract_trips
+def cached_trips(positions, thd, tht, epsilon, cache, engine="loop", block_size=1000000, stats=None, memory=1024, 
+                 tmpdir=None, simplifier="rdp"):
+    
+    #Trips of the vessels missing from the cache
+    def compute(batch):
+        results = {}
+        for trip in extract_trips(batch, thd, tht, epsilon, engine, block_size, stats=stats, memory=memory, 
+                                  tmpdir=tmpdir, simplifier=simplifier):
+            results.setdefault(trip[0][0], [[]])[0].append(trip)
+        return results
+    
+    for results in ResultCache.cached_results(positions, compute, cache, 1, block_size):
+        yield from results[0]
+
+#Lines of the input file between two byte offsets (decoded as the other csv input files, see InputFiles.py)
+def read_range(wdinput, start, end):
+    
+    with open(wdinput, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line.decode(InputFiles.ENCODING)
+
+#Byte offsets splitting the input file in (at most) n parts at vessel ID boundaries
+def vessel_boundaries(wdinput, n):
+    
+    with open(wdinput, 'rb') as f:
+        f.readline()                                       #Skip column names
+        first = f.tell()
+        size = f.seek(0, 2)
+        
+        bounds = [first]
+        for k in range(1, n):
+            
+            #Start of the first line after the approximate offset
+            f.seek(max(first, size * k // n) - 1)
+            f.readline()
+            
+            #Move forward to the first position of the next vessel
+            line = f.readline()
+            ID = line.split(b';')[0]
+            while line:
+                pos = f.tell()
+                line = f.readline()
+                if line.split(b';')[0] != ID:
+                    break
+            
+            if line and pos > bounds[-1]:
+                bounds.append(pos)
+        bounds.append(size)
+    
+    return bounds
+
+#Extract the trips of the vessel paths between two byte offsets of the input file and write them in wdpart (worker)
+#Output: the statistics of the worker if measure is True (see Instrumentation.py), None otherwise
+def extract_range(wdinput, start, end, wdpart, thd, tht, epsilon, engine, block_size, precision, measure=False, 
+                  memory=1024, tmpdir=None, wdcoast=None, simplifier="rdp", index=False):
+    
+    stats = Instrumentation.Stats() if measure else None
+    coast = None if wdcoast is None else CoastRaster.open_raster(wdcoast)
+    positions = track_positions(read_range(wdinput, start, end), stats, coast=coast)
     
-    #IF lastline 
-    #THEN update firstline
-    if ID_next != ID:
-        firstline = True
+    writer = OutputWriter.open_writer(wdpart, *output_columns(simplifier), precision, FLOATS, header=False, 
+                                      index=INDEX if index else None)
+    if engine == "numpy":
+        write_trips(numpy_trips(positions, thd, tht, epsilon, block_size, stats, simplifier), writer, stats)
+    elif engine == "chunked":
+        write_trips(chunked_trips(positions, thd, tht, epsilon, memory, tmpdir, stats, simplifier), writer, stats)
+    else:
+        write_trips(loop_trips(positions, thd, tht, epsilon, stats=stats, simplifier=simplifier), writer, stats)
+    writer.close()
+    
+    return None if stats is None else stats.as_dict()
+
+#Extract the trips of an input file and write them in one or several output files
+#Input: wdinput (path of the input file), wdoutput (path or list of paths of the output files, csv, Parquet, Arrow or 
+#       binary trip records), thd, tht, epsilon, the options of the command line, stats (see Instrumentation.py, 
+#       None if not measured), wdcoast (path of the raster of the distance to the coast, see CoastRaster.py), 
+#       simplifier (see simplify), index (index the csv output files, see OutputIndex.py) and overlap (depth of the 
+#       queues of the reader and writer threads, not overlapped if None, see Overlap.py) and cache (ResultCache of the 
+#       trips of the vessels, see open_cache, not cached if None)
+def extract_file(wdinput, wdoutput, thd, tht, epsilon, engine="loop", block_size=1000000, workers=1, unsorted=False, 
+                 memory=1024, tmpdir=None, precision=None, id_min=None, id_max=None, state=None, final=False, stats=None,
+                 wdcoast=None, simplifier="rdp", index=False, overlap=None, cache=None):
     
-    #Update position attribute                                                   
-    time_old = time 
-    x_old = x
-    y_old = y
-    land_old = land
+    #Output file
+    writer = OutputWriter.open_writer(wdoutput, *output_columns(simplifier), precision, FLOATS, 
+                                      index=INDEX if index else None)
+    if overlap is not None:
+        Overlap.overlap_writer(writer, overlap, stats)
 
+    #Raster of the distance to the coast
+    coast = None if wdcoast is None else CoastRaster.open_raster(wdcoast)
 
-#Close files
-input_file.close()
-input_file2.close()
-output_file.close()
+    #Incremental run resuming the open trips of the previous runs (loop engine)
+    if state is not None:
 
-#End
-print("End of the process")  
+        positions, input_file = open_positions(wdinput, unsorted, memory, tmpdir, id_min, id_max, stats, coast, overlap)
+
+        #Parameters of the checkpoint (the simplifier only if not the default one)
+        parameters = [thd, tht, epsilon] + ([simplifier] if simplifier != "rdp" else [])
+        states = TripState.read_states(state, parameters)
+        write_trips(extract_trips(positions, thd, tht, epsilon, states=states, stats=stats, simplifier=simplifier), writer, 
+                    stats)
+
+        #IF last run
+        #THEN close the open trips and remove the checkpoint
+        if final:
+            write_trips(close_trips(states, epsilon, stats, simplifier), writer, stats)
+            if os.path.exists(state):
+                os.remove(state)
+        else:
+            TripState.write_states(state, parameters, states)
+
+        if input_file is not None:
+            input_file.close()
+
+    #Trips of the unchanged vessels read from the cache, the other vessels computed by batches
+    elif cache is not None:
+
+        positions, input_file = open_positions(wdinput, unsorted, memory, tmpdir, id_min, id_max, stats, coast, overlap)
+        write_trips(cached_trips(positions, thd, tht, epsilon, cache, engine, block_size, stats, memory, tmpdir, 
+                                 simplifier), writer, stats)
+
+        if input_file is not None:
+            input_file.close()
+
+    #Parquet or Arrow input file read row by row (loop and chunked engines) or column by column (numpy engine)
+    elif ColumnarIO.is_columnar(wdinput) and engine != "numpy":
+
+        positions = ColumnarIO.read_rows(wdinput, id_min, id_max)
+        if stats is not None:
+            positions = stats.positions(positions)
+        if coast is not None:
+            positions = CoastRaster.assign_land(positions, coast)
+        write_trips(extract_trips(positions, thd, tht, epsilon, engine, block_size, stats=stats, memory=memory, 
+                                  tmpdir=tmpdir, simplifier=simplifier), writer, stats)
+
+    elif ColumnarIO.is_columnar(wdinput):
+
+        write_trips(batch_trips(ColumnarIO.read_batches(wdinput, id_min, id_max), thd, tht, epsilon, block_size, stats,
+                                coast, simplifier), writer, stats)
+
+    #Multi-process execution on parts of the input file split at vessel ID boundaries
+    elif workers > 1:
+
+        #IF the input file is not sorted
+        #THEN sort it in a temporary file first
+        if unsorted:
+            fd, wdsorted = tempfile.mkstemp(suffix=".csv", dir=tmpdir)
+            os.close(fd)
+            ExternalSort.sort_file(wdinput, wdsorted, memory, tmpdir)
+        else:
+            wdsorted = wdinput
+
+        bounds = vessel_boundaries(wdsorted, workers)
+        wdparts = [OutputWriter.part_path(wdoutput, k) for k in range(len(bounds) - 1)]
+
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.starmap(extract_range, [(wdsorted, bounds[k], bounds[k+1], wdparts[k], thd, tht, epsilon, engine, 
+                                                    block_size, precision, stats is not None, max(1, memory // workers),
+                                                    tmpdir, wdcoast, simplifier, index) for k in range(len(wdparts))])
+
+        #Statistics of the workers
+        if stats is not None:
+            for result in results:
+                stats.merge(result)
+
+        #Merge the parts in order
+        for wdpart in wdparts:
+            writer.append_part(wdpart)
+            OutputWriter.remove_part(wdpart)
+
+        if unsorted:
+            os.remove(wdsorted)
+
+    #Sort on the fly
+    elif unsorted:
+
+        input_file = InputFiles.InputFile(wdinput)                 #Open file 
+        next(input_file)                                           #Skip column names
+        lines = ExternalSort.sort_lines(input_file, memory, tmpdir, input_file.lines_size())
+
+        write_trips(extract_trips(read_positions(lines, stats, coast=coast, overlap=overlap), thd, tht, epsilon, engine, 
+                                  block_size, stats=stats, memory=memory, tmpdir=tmpdir, simplifier=simplifier), writer, 
+                    stats)
+
+        input_file.close()
+
+    else:
+
+        #Input file                                        
+        input_file = InputFiles.InputFile(wdinput)                 #Open file (read in a single pass)
+        next(input_file)                                           #Skip column names
+
+        positions = read_positions(input_file, stats, input_file, coast, overlap)
+
+        if engine == "numpy":
+            write_trips(numpy_trips(positions, thd, tht, epsilon, block_size, stats, simplifier), writer, stats)
+        elif engine == "chunked":
+            write_trips(chunked_trips(positions, thd, tht, epsilon, memory, tmpdir, stats, simplifier), writer, stats)
+        else:
+            write_trips(loop_trips(positions, thd, tht, epsilon, stats=stats, simplifier=simplifier), writer, stats)
+
+        input_file.close()
+
+    #Close files
+    if stats is None:
+        writer.close()
+    else:
+        with stats.timer('writing'):
+            writer.close()
+
+# ****************************** MAIN *************************************************************************************************
+# *************************************************************************************************************************************
+
+if __name__ == "__main__":
+    
+    stats = Instrumentation.Stats(progress) if (wdstats is not None or progress is not None) else None
+    cache = None if wdcache is None else open_cache(wdcache, cache_size, thd, tht, epsilon, simplifier)
+    
+    Instrumentation.profile(wdprofile, extract_file, wdinput, wdoutput, thd, tht, epsilon, engine, block_size, workers, 
+                            unsorted, memory, tmpdir, precision, id_min, id_max, state, final, stats, wdcoast, 
+                            simplifier, index, overlap, cache)
+    
+    #Cache hits and misses
+    if cache is not None:
+        print(cache.summary())
+        if stats is not None:
+            cache.report(stats)
+    
+    #Statistics
+    if wdstats is not None:
+        stats.write(wdstats)
+    
+    #End
+    print("End of the process")
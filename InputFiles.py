@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compressed and standard input csv files
+
+ExtractTrips.py and SpatialAggregation.py read their csv input files in a single pass, so the positions can be
+streamed from a pipe: the path "-" reads the standard input. The files compressed with gzip, bzip2 or xz are
+decompressed on the fly, the compression being detected from the first bytes of the file (or of the standard input),
+whatever the extension. The csv files are decoded as UTF-8 whatever the locale, like the byte ranges read by
+the processes (--workers option).
+
+The progress of the reading is the offset in the file on disk (compressed bytes for a compressed file), unknown for
+the standard input. Only the uncompressed files on disk can be read by byte ranges (--workers option).
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import io
+import os
+import sys
+import bz2
+import gzip
+import lzma
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+STDIN = "-"                          #Path of the standard input
+ENCODING = 'utf-8'                   #Encoding of the csv input files (whatever the locale)
+
+COMPRESSIONS = {'gzip': b'\x1f\x8b', 'bzip2': b'BZh', 'xz': b'\xfd7zXZ\x00'}     #Magic numbers of the compressed files
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Compression of a binary file object from its first bytes (None if not compressed)
+def detect_compression(raw_file):
+    head = raw_file.peek(8)
+    for name, magic in COMPRESSIONS.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+#Decompressing file object reading a compressed binary file object
+def decompress(raw_file, compression):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw_file, mode='rb')
+    if compression == 'bzip2':
+        return bz2.BZ2File(raw_file, 'rb')
+    return lzma.LZMAFile(raw_file, 'rb')
+
+#Test if a path is an uncompressed file on disk, which can be read by byte ranges
+def is_seekable(path):
+    if path == STDIN:
+        return False
+    with open(path, 'rb') as raw_file:
+        return detect_compression(raw_file) is None
+
+class InputFile:
+
+    #Input: path (path of a csv file, compressed or not, or "-" for the standard input)
+    def __init__(self, path):
+
+        if path == STDIN:
+            self.raw_file = sys.stdin.buffer
+            self.size = None
+        else:
+            self.raw_file = open(path, 'rb')
+            self.size = os.path.getsize(path)
+
+        #Decompress on the fly
+        self.compression = detect_compression(self.raw_file)
+        if self.compression is None:
+            self.lines = io.TextIOWrapper(self.raw_file, encoding=ENCODING)
+        else:
+            self.lines = io.TextIOWrapper(decompress(self.raw_file, self.compression), encoding=ENCODING)
+
+    def __iter__(self):
+        return self.lines
+
+    def __next__(self):
+        return next(self.lines)
+
+    #Input size in bytes, None if unknown (standard input) or not the size of the lines (compressed file)
+    def lines_size(self):
+        return self.size if self.compression is None else None
+
+    #Function giving the current offset in the file on disk (None for the standard input)
+    def offset(self):
+        return None if self.size is None else self.raw_file.tell
+
+    #Close the file (the standard input is left open)
+    def close(self):
+        if self.raw_file is sys.stdin.buffer:
+            self.lines.detach()
+        else:
+            self.lines.close()
+            self.raw_file.close()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Instrumentation of long runs
+
+ExtractTrips.py, SpatialAggregation.py and Pipeline.py collect optional run statistics (--stats and --progress
+options) in a Stats object passed down to the processing functions:
+
+	1. Timers (in seconds): parsing, state_machine (trip detection), rdp, simplification (other simplifiers, see 
+	   Simplification.py), angles (interevent time, distance and angle), aggregation and writing. The time of a stage excludes the time of the stages nested in it (the trips are
+	   produced by generators consuming the parsed positions)
+	2. Counters: positions read, vessels, trips emitted, trips dropped (two positions or less), maximum recursion
+	   depth of the Ramer–Douglas–Peucker algorithm, and for SpatialAggregation.py trips read, trips aggregated and
+	   polygon runs dropped (aggregate positions without simplified position)
+	3. Queues of an overlapped run (see Overlap.py): for the reader_queue and the writer_queue, the number of items, 
+	   the mean and maximum depth (counters) and the time waited by the producer and by the consumer (timers 
+	   put_stall and get_stall, not excluded from the stage timers)
+	4. Result cache (--cache, see ResultCache.py): hits, misses, evictions and hit rate (counters) and time spent
+	   hashing, reading and writing the entries (timer cache)
+
+Periodic progress lines give the number of positions read, the number of positions per second and, when the input
+file is read sequentially, the progress and the estimated time remaining based on the file offset. The statistics
+are written in a json file at the end of the run. Without Stats object (None) nothing is measured.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import sys
+import json
+import time
+import cProfile
+import contextlib
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+CHECK = 10000                #Number of positions read between two progress checks
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+class Stats:
+
+    #Input: progress (interval between two progress lines in seconds, None for no progress lines)
+    def __init__(self, progress=None):
+        self.timers = {}
+        self.counters = {}
+        self.progress = progress
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.nested = 0.0                                      #Total time of the timers (to exclude the nested stages)
+
+    #Add a time to a timer
+    def add_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+        self.nested += seconds
+
+    #Add a value to a counter
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    #Update a counter keeping the maximum value
+    def maximum(self, name, value):
+        self.counters[name] = max(self.counters.get(name, 0), value)
+
+    #Add the statistics of a bounded queue (see Overlap.py), the stall times are not nested in the other timers
+    #Input: name (queue), items (number of items put), depth_sum (sum of the depth after each put), max_depth, 
+    #       put_stall and get_stall (time waited by the producer and the consumer in seconds)
+    def queue(self, name, items, depth_sum, max_depth, put_stall, get_stall):
+        self.timers[name + '_put_stall'] = self.timers.get(name + '_put_stall', 0.0) + put_stall
+        self.timers[name + '_get_stall'] = self.timers.get(name + '_get_stall', 0.0) + get_stall
+        self.count(name + '_items', items)
+        self.maximum(name + '_max_depth', max_depth)
+        self.counters[name + '_mean_depth'] = depth_sum / items if items > 0 else 0.0
+
+    #Time a block of code
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    #Time the production of the items of an iterable, excluding the time of the stages nested in it
+    #Input: items (iterable) and name (timer)
+    def exclusive(self, items, name):
+        items = iter(items)
+        while True:
+            nested = self.nested
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start - (self.nested - nested))
+                return
+            self.add_time(name, time.perf_counter() - start - (self.nested - nested))
+            yield item
+
+    #Count and time the positions read, print the progress lines
+    #Input: positions (iterable of positions, the first value is the ID), ids (name of the ID counter),
+    #       offset (function giving the current offset in the input file, None if unknown) and size (size of the input
+    #       file in bytes)
+    def positions(self, positions, ids='vessels', offset=None, size=None):
+
+        positions = iter(positions)
+        parsing = 0.0
+        n = 0
+        nids = 0
+        ID_old = None
+
+        try:
+            while True:
+
+                start = time.perf_counter()
+                try:
+                    position = next(positions)
+                except StopIteration:
+                    elapsed = time.perf_counter() - start
+                    parsing += elapsed
+                    self.nested += elapsed
+                    break
+                elapsed = time.perf_counter() - start
+                parsing += elapsed
+                self.nested += elapsed
+
+                n += 1
+                if position[0] != ID_old:
+                    nids += 1
+                    ID_old = position[0]
+
+                #Progress line
+                if self.progress is not None and n % CHECK == 0:
+                    now = time.perf_counter()
+                    if now - self.last >= self.progress:
+                        self.last = now
+                        self.print_progress(self.counters.get('positions', 0) + n, now,
+                                            None if offset is None else offset(), size)
+
+                yield position
+
+        finally:
+            self.timers['parsing'] = self.timers.get('parsing', 0.0) + parsing
+            self.count('positions', n)
+            self.count(ids, nids)
+
+    #Print a progress line
+    #Input: n (number of positions read), now (current time), offset and size (bytes read and size of the input file)
+    def print_progress(self, n, now, offset=None, size=None):
+        rate = n / (now - self.start)
+        line = "Progress: " + str(n) + " positions, " + str(int(rate)) + " positions/s"
+        if offset is not None and size:
+            done = offset / size
+            line += ", " + "%.1f" % (100 * done) + "%"
+            if done > 0:
+                eta = int((now - self.start) * (1 - done) / done)
+                line += ", ETA " + "%d:%02d:%02d" % (eta // 3600, eta // 60 % 60, eta % 60)
+        print(line, file=sys.stderr, flush=True)
+
+    #Add the statistics of another run (a worker for example), nested is False if the other run was concurrent (its
+    #times are not excluded from the current stage timers)
+    def merge(self, other, nested=True):
+        for name, seconds in other['timers'].items():
+            if nested:
+                self.add_time(name, seconds)
+            else:
+                self.timers[name] = self.timers.get(name, 0.0) + seconds
+        for name, value in other['counters'].items():
+            if name.endswith('max_depth'):
+                self.maximum(name, value)
+            else:
+                self.count(name, value)
+
+    #Statistics as a dictionary
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.start
+        return {'elapsed': elapsed, 'timers': dict(self.timers), 'counters': dict(self.counters),
+                'positions_per_second': self.counters.get('positions', 0) / elapsed if elapsed > 0 else None}
+
+    #Write the statistics in a json file
+    def write(self, path):
+        with open(path, 'w') as stats_file:
+            json.dump(self.as_dict(), stats_file, indent=1, sort_keys=True)
+
+#Profile a function call with cProfile
+#Input: path (path of the profile, None to call the function without profiling), function and its arguments
+#Output: the result of the function
+def profile(path, function, *args, **kwargs):
+    if path is None:
+        return function(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
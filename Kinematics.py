@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+Interevent time, distance and angle of trips
+
+ExtractTrips.py and SpatialAggregation.py describe every position of a trip with three columns:
+
+	1. Delta_t: Time ellapsed between the last and the current position
+	2. Delta_d: Euclidean distance traveled between the last and the current position
+	3. Theta: Angle between the last, the current and the next position (in degree). Negative for left and positive
+	          for right.
+
+Delta_t and Delta_d are 0 for the first position of a trip, Theta is 0 for the first and last positions and when the
+current position is the same as the last or the next one. The next position used by the angle can be given apart
+(SpatialAggregation.py uses the sum coordinates of the next aggregate position).
+
+The columns of many trips are computed at once with numpy, the trips being given by the index of their first position
+and the index following their last position in the arrays. The values are the same as the ones computed position by
+position: the squares are computed with the pow function of the C library (as the ** operator of Python) and the
+angles with math.acos. Short trips (or without numpy) are computed position by position.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+MINSIZE = 64                 #Number of positions from which a single trip is computed with numpy
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Euclidean distance bebween (x0, y0) and (x1, y1)
+def disteucl(x0, y0, x1, y1):
+    return  math.sqrt((x0 - x1) ** 2 + (y0 - y1) ** 2)
+
+#Interevent time, distance and angle of a trip computed position by position
+#Input: T, X, Y (lists of time and cartesian coordinates) and XA, YA (coordinates of the next position used by the
+#       angle, X and Y by default)
+#Output: three lists Delta_t, Delta_d and Theta
+def loop_kinematics(T, X, Y, XA=None, YA=None):
+
+    if XA is None:
+        XA, YA = X, Y
+
+    n = len(T)
+
+    #Interevent time, distance and angle (0 for the first and last positions)
+    Dt = [0] * n
+    Dd = [0] * n
+    Theta = [0] * n
+
+    for i in range(1, n):
+
+        #Compute interevent time and distance
+        Dt[i] = T[i] - T[(i-1)]
+        Dd[i] = disteucl(X[i], Y[i], X[(i-1)], Y[(i-1)])
+
+        #Compute angle
+        if i < (n-1):
+            #Coordinate and norm vector a and b
+            Xa = X[i]-XA[(i+1)]
+            Ya = Y[i]-YA[(i+1)]
+            Xb = X[i]-X[(i-1)]
+            Yb = Y[i]-Y[(i-1)]
+            Na = math.sqrt(Xa**2+Ya**2);
+            Nb = math.sqrt(Xb**2+Yb**2);
+
+            #If same position
+            if(Na==0 or Nb==0):
+                Theta[i] = 0
+            else:
+                cos = (Xa*Xb+Ya*Yb)/(Na*Nb)
+                if cos < -1:
+                    cos = -1
+                if cos >1:
+                    cos = 1
+
+                sin = (Xa*Yb-Ya*Xb)
+                if sin < 0:
+                    Theta[i] = 180-math.acos(cos)*(180./math.pi)
+                else:
+                    Theta[i] = -180+math.acos(cos)*(180./math.pi)
+
+    return Dt, Dd, Theta
+
+#Interevent time, distance and angle of trips given as arrays
+#Input: T, X, Y (arrays of time and cartesian coordinates), starts, ends (arrays of the index of the first position
+#       and of the index following the last position of every trip, a single trip over the arrays if None) and
+#       XA, YA (arrays of the coordinates of the next position used by the angle, X and Y by default)
+#Output: three arrays Delta_t, Delta_d, Theta and a boolean array flat giving the positions whose angle is 0 (first
+#        and last positions of the trips, same position as the last or the next one), the values outside of the trips
+#        are meaningless
+def kinematics(T, X, Y, starts=None, ends=None, XA=None, YA=None):
+
+    if np is None:
+        raise ImportError("The vectorized kinematics require numpy")
+
+    T = np.asarray(T)
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    XA = X if XA is None else np.asarray(XA, dtype=float)
+    YA = Y if YA is None else np.asarray(YA, dtype=float)
+    n = len(T)
+
+    #First and last positions of the trips, positions inside of the trips
+    first = np.zeros(n, dtype=bool)
+    last = np.zeros(n, dtype=bool)
+    if starts is None:
+        first[:1] = True
+        last[-1:] = True
+        inside = np.ones(n, dtype=bool)
+    else:
+        first[starts] = True
+        last[np.asarray(ends) - 1] = True
+        depth = np.zeros(n + 1, dtype=np.int64)
+        depth[starts] += 1
+        depth[ends] -= 1
+        inside = np.cumsum(depth[:n]) > 0
+
+    #Interevent time and distance (0 for the first positions)
+    Dt = np.zeros(n, dtype=T.dtype)
+    Dd = np.zeros(n)
+    Dt[1:] = T[1:] - T[:-1]
+    Dd[1:] = np.sqrt(np.float_power(X[1:] - X[:-1], 2) + np.float_power(Y[1:] - Y[:-1], 2))
+    Dt[first] = 0
+    Dd[first] = 0
+
+    #Coordinate and norm vector a and b of the positions with a last and a next position
+    Theta = np.zeros(n)
+    flat = first | last | ~inside
+    inner = np.flatnonzero(~flat)
+    Xa = X[inner] - XA[inner + 1]
+    Ya = Y[inner] - YA[inner + 1]
+    Xb = X[inner] - X[inner - 1]
+    Yb = Y[inner] - Y[inner - 1]
+    Na = np.sqrt(np.float_power(Xa, 2) + np.float_power(Ya, 2))
+    Nb = np.sqrt(np.float_power(Xb, 2) + np.float_power(Yb, 2))
+
+    #Same position
+    same = (Na == 0) | (Nb == 0)
+    flat[inner[same]] = True
+    inner = inner[~same]
+    Xa, Ya, Xb, Yb, Na, Nb = Xa[~same], Ya[~same], Xb[~same], Yb[~same], Na[~same], Nb[~same]
+
+    #Compute angle
+    cos = np.clip((Xa*Xb+Ya*Yb)/(Na*Nb), -1, 1)
+    acos = np.fromiter(map(math.acos, cos.tolist()), dtype=float, count=len(cos))
+    sin = (Xa*Yb-Ya*Xb)
+    Theta[inner] = np.where(sin < 0, 180-acos*(180./math.pi), -180+acos*(180./math.pi))
+
+    return Dt, Dd, Theta, flat
+
+#Lists of the interevent time, distance and angle of a trip computed with kinematics, the 0 values are integers as
+#when computed position by position
+#Input: Dt, Dd, Theta, flat (output of kinematics), start, end (first position and position following the last one) and
+#       first (False if start is not the first position of a trip, a piece of a trip for example)
+#Output: three lists Delta_t, Delta_d and Theta
+def kinematics_lists(Dt, Dd, Theta, flat, start, end, first=True):
+    Dt = Dt[start:end].tolist()
+    Dd = Dd[start:end].tolist()
+    if Dt and first:
+        Dt[0] = 0
+        Dd[0] = 0
+    Theta = [0 if f else theta for theta, f in zip(Theta[start:end].tolist(), flat[start:end].tolist())]
+    return Dt, Dd, Theta
+
+#Interevent time, distance and angle of a trip
+#Input: T, X, Y (lists or arrays of time and cartesian coordinates) and XA, YA (see loop_kinematics)
+#Output: three lists Delta_t, Delta_d and Theta
+def trip_kinematics(T, X, Y, XA=None, YA=None):
+    n = len(T)
+    if np is None or n < MINSIZE:
+        return loop_kinematics(T, X, Y, XA, YA)
+    return kinematics_lists(*kinematics(T, X, Y, XA=XA, YA=YA), 0, n)
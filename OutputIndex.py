@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+"""
+Offset index of the csv output files
+
+ExtractTrips.py, SpatialAggregation.py and Pipeline.py can write a sidecar index of their csv output files while the
+rows are written (--index option), so that the rows of a trip are read with a seek instead of a scan of the whole file:
+
+	1. Trip index (output path + ".idx"): one line per trip with the columns identifying the trip (Vessel ID and
+	   Trip ID, or Trip ID for the aggregated trips), the byte offsets of the first row of the trip and of the row
+	   following its last row in the output file, and the minimum and maximum Unix Time of its rows
+	2. Polygon postings (output path + ".pidx", aggregated trips only): one line per polygon and trip visiting it with
+	   the Polygon ID, the Trip ID and the minimum and maximum Unix Time of the aggregate positions of the trip in the
+	   polygon, sorted by Polygon ID
+
+The index files are csv files with column names (the value separator is a semicolon ";"). The parts written by the
+processes of a multi-process run are indexed on their own and their index is shifted when they are merged.
+
+The rows are queried with the command:
+
+	python OutputIndex.py output.csv --vessel 227006760 --trip 17
+	python OutputIndex.py aggregated.csv --polygon P12 --start 1488326400 --end 1491004799 --output march.csv
+
+with the following options (the rows matching all the given options are written with the column names):
+
+	--vessel: Vessel ID (the part of the Trip ID of the aggregated trips before its last underscore, "Vessel ID_Trip ID"
+	          for the output of Pipeline.py)
+	--trip: Trip ID (the part of the Trip ID of the aggregated trips after its last underscore, or the whole Trip ID
+	        if it has no underscore)
+	--polygon: Polygon ID (aggregated trips only), the aggregate positions in the polygon
+	--start, --end: Period (Unix Time), the rows whose Unix Time is in the period
+	--output: Path of the output file (standard output by default)
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import sys
+import argparse
+import itertools
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+TRIPS = '.idx'                       #Extension of the trip index
+POSTINGS = '.pidx'                   #Extension of the polygon postings
+TIME = 'Unix Time'                   #Time column of the output files
+RANGE = ['Start', 'End', 'Min Time', 'Max Time']     #Columns of the trip index following the trip columns
+ENCODING = 'utf-8'                   #Encoding of the csv output files and of their index (offsets in bytes)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Query the rows of an indexed csv output file")
+    parser.add_argument("wdoutput", help="Path of the indexed output file")
+    parser.add_argument("--vessel", default=None, help="Vessel ID")
+    parser.add_argument("--trip", default=None, help="Trip ID")
+    parser.add_argument("--polygon", default=None, help="Polygon ID (aggregated trips)")
+    parser.add_argument("--start", type=float, default=None, help="Start of the period (Unix Time)")
+    parser.add_argument("--end", type=float, default=None, help="End of the period (Unix Time)")
+    parser.add_argument("--output", default=None, help="Path of the output file (standard output by default)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.wdoutput + TRIPS):
+        sys.exit("No index for " + args.wdoutput + " (see the --index option)")
+
+    if args.polygon is not None and not os.path.exists(args.wdoutput + POSTINGS):
+        sys.exit("No polygon postings for " + args.wdoutput + " (aggregated trips only)")
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Unix Time of an index file (integer if possible)
+def parse_time(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+class IndexBuilder:
+
+    #Input: wdoutput (path of the csv output file), columns (output column names), keys (names of the columns
+    #       identifying a trip) and polygon (name of the Polygon ID column, None if no postings)
+    def __init__(self, wdoutput, columns, keys, polygon=None):
+        self.wdoutput = wdoutput
+        self.keys = keys
+        self.polygon = polygon
+        self.key_columns = [columns.index(name) for name in keys]
+        self.time_column = columns.index(TIME)
+        self.polygon_column = None if polygon is None else columns.index(polygon)
+        self.offset = 0                      #Size of the rows already indexed (in bytes)
+        self.trips = []                      #Trips [key, start, end, min time, max time] in order
+        self.postings = {}                   #(Polygon ID, key) -> [min time, max time]
+
+    #Skip bytes of the output file which are not rows of a trip (column names)
+    def skip(self, size):
+        self.offset += size
+
+    #Index rows given as formatted columns (lists of strings), values (columns of values) and lines
+    def add(self, columns, values, lines):
+
+        keys = zip(*[columns[k] for k in self.key_columns])
+        times = values[self.time_column]
+        polygons = itertools.repeat(None) if self.polygon_column is None else columns[self.polygon_column]
+
+        trips = self.trips
+        trip = trips[-1] if trips else None
+        offset = self.offset
+        for key, t, line, polygon in zip(keys, times, lines, polygons):
+
+            #IF the row follows the last row of the same trip
+            #THEN extend the trip ELSE start a new trip
+            end = offset + len(line.encode(ENCODING))
+            if trip is not None and trip[0] == key and trip[2] == offset:
+                trip[2] = end
+                trip[3] = min(trip[3], t)
+                trip[4] = max(trip[4], t)
+            else:
+                trip = [key, offset, end, t, t]
+                trips.append(trip)
+
+            if polygon is not None:
+                self.post(polygon, key, t, t)
+            offset = end
+
+        self.offset = offset
+
+    #Add a polygon visited by a trip between two times
+    def post(self, polygon, key, tmin, tmax):
+        posting = self.postings.get((polygon, key))
+        if posting is None:
+            self.postings[(polygon, key)] = [tmin, tmax]
+        else:
+            posting[0] = min(posting[0], tmin)
+            posting[1] = max(posting[1], tmax)
+
+    #Index the rows of a part written by another IndexBuilder (without column names) of size bytes
+    def append_part(self, wdpart, size):
+        for key, start, end, tmin, tmax in read_trips(wdpart):
+            self.trips.append([key, start + self.offset, end + self.offset, tmin, tmax])
+        if self.polygon is not None:
+            for polygon, key, tmin, tmax in read_postings(wdpart):
+                self.post(polygon, key, tmin, tmax)
+        self.offset += size
+
+    #Write the index files
+    def close(self):
+
+        with open(self.wdoutput + TRIPS, 'w', encoding=ENCODING) as index_file:
+            index_file.write(';'.join(self.keys + RANGE) + '\n')
+            for key, start, end, tmin, tmax in self.trips:
+                index_file.write(';'.join(list(key) + [str(start), str(end), str(tmin), str(tmax)]) + '\n')
+
+        if self.polygon is not None:
+            with open(self.wdoutput + POSTINGS, 'w', encoding=ENCODING) as postings_file:
+                postings_file.write(';'.join([self.polygon] + self.keys + RANGE[2:]) + '\n')
+                for (polygon, key), (tmin, tmax) in sorted(self.postings.items(), key=lambda item: item[0][0]):
+                    postings_file.write(';'.join([polygon] + list(key) + [str(tmin), str(tmax)]) + '\n')
+
+#Column names of a csv file
+def read_header(path):
+    with open(path, encoding=ENCODING) as csv_file:
+        return csv_file.readline().rstrip('\n\r').split(';')
+
+#Trips of the index of an output file
+#Output: a generator of trips (key, start, end, min time, max time), the key being the tuple of the trip columns
+def read_trips(wdoutput):
+    with open(wdoutput + TRIPS, encoding=ENCODING) as index_file:
+        n = len(index_file.readline().split(';')) - len(RANGE)
+        for line in index_file:
+            attr = line.rstrip('\n\r').split(';')
+            yield tuple(attr[:n]), int(attr[n]), int(attr[n+1]), parse_time(attr[n+2]), parse_time(attr[n+3])
+
+#Polygon postings of an output file
+#Output: a generator of postings (Polygon ID, key, min time, max time)
+def read_postings(wdoutput):
+    with open(wdoutput + POSTINGS, encoding=ENCODING) as postings_file:
+        n = len(postings_file.readline().split(';')) - 2
+        for line in postings_file:
+            attr = line.rstrip('\n\r').split(';')
+            yield attr[0], tuple(attr[1:n]), parse_time(attr[n]), parse_time(attr[n+1])
+
+#Remove the index files of an output file
+def remove_index(wdoutput):
+    for path in (wdoutput + TRIPS, wdoutput + POSTINGS):
+        if os.path.exists(path):
+            os.remove(path)
+
+#Vessel ID and Trip ID of a trip key, the Trip ID of the aggregated trips is split at its last underscore
+def split_key(key):
+    if len(key) == 2:
+        return key
+    vessel, underscore, trip = key[0].rpartition('_')
+    return (vessel, trip) if underscore else (None, trip)
+
+#Test if [tmin, tmax] overlaps the period [start, end] (open if None)
+def overlaps(tmin, tmax, start=None, end=None):
+    return (start is None or tmax >= start) and (end is None or tmin <= end)
+
+#Rows of an indexed output file read with seeks
+#Input: wdoutput (path of the output file), vessel, trip, polygon, start and end (see the command line, ignored if None)
+#Output: a generator of the matching rows (lines of the output file)
+def query(wdoutput, vessel=None, trip=None, polygon=None, start=None, end=None):
+
+    #Trips visiting the polygon during the period
+    visits = None
+    if polygon is not None:
+        visits = set(key for name, key, tmin, tmax in read_postings(wdoutput)
+                     if name == polygon and overlaps(tmin, tmax, start, end))
+
+    #Byte ranges of the matching trips (successive ranges are merged)
+    ranges = []
+    for key, first, last, tmin, tmax in read_trips(wdoutput):
+        if visits is not None and key not in visits:
+            continue
+        ID, IDtrip = split_key(key)
+        if (vessel is not None and ID != vessel) or (trip is not None and IDtrip != trip):
+            continue
+        if not overlaps(tmin, tmax, start, end):
+            continue
+        if ranges and ranges[-1][1] == first:
+            ranges[-1][1] = last
+        else:
+            ranges.append([first, last])
+
+    #Columns of the rows filtered by time and polygon
+    columns = read_header(wdoutput)
+    time_column = columns.index(TIME)
+    polygon_column = columns.index(read_header(wdoutput + POSTINGS)[0]) if polygon is not None else None
+    filtered = polygon is not None or start is not None or end is not None
+
+    with open(wdoutput, 'rb') as output_file:
+        for first, last in ranges:
+            output_file.seek(first)
+            for line in output_file.read(last - first).decode(ENCODING).splitlines(keepends=True):
+                if filtered:
+                    attr = line.rstrip('\n\r').split(';')
+                    t = float(attr[time_column])
+                    if polygon_column is not None and attr[polygon_column] != polygon:
+                        continue
+                    if not overlaps(t, t, start, end):
+                        continue
+                yield line
+
+# ****************************** MAIN *************************************************************************************************
+# *************************************************************************************************************************************
+
+if __name__ == "__main__":
+
+    output_file = sys.stdout if args.output is None else open(args.output, 'w', encoding=ENCODING)
+    output_file.write(';'.join(read_header(args.wdoutput)) + '\n')
+    output_file.writelines(query(args.wdoutput, args.vessel, args.trip, args.polygon, args.start, args.end))
+    if args.output is not None:
+        output_file.close()
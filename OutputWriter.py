@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+Buffered row-batch csv writer
+
+ExtractTrips.py and SpatialAggregation.py format their output a whole trip at a time: each column of the trip is
+converted to strings at once, the rows are joined with the value separator ";" and the resulting batch is appended
+to a buffer written to the output file in large chunks.
+
+By default the values are formatted with str(), which gives the same output as writing them one by one. An optional
+fixed precision (number of decimals) can be given for the float columns of the coordinates, distances and angles.
+
+Parquet and Arrow output files are written by ColumnarIO.ColumnarWriter and binary trip records by 
+TripRecords.RecordWriter, which have the same interface. A MultiWriter writes the same rows in several output files.
+
+A BatchWriter can also index the rows of the csv output file as they are written (see OutputIndex.py). The csv output
+files are written in UTF-8 whatever the locale, the offsets of the index being computed on the UTF-8 bytes of the rows.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import io
+import os
+import shutil
+
+import ColumnarIO
+import OutputIndex
+import TripRecords
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+CHUNKSIZE = 4 * 1024 * 1024         #Number of characters buffered before writing in the output file
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+class BatchWriter:
+
+    #Input: output_file (file object opened in text mode), columns (list of column names), header (write the column 
+    #       names as first line), precision (number of decimals of the float columns, None to use str()) and
+    #       floats (list of the names of the float columns) and index (OutputIndex.IndexBuilder of the rows, None if
+    #       not indexed)
+    def __init__(self, output_file, columns, header=True, precision=None, floats=(), chunksize=CHUNKSIZE, index=None):
+        self.output_file = output_file
+        self.columns = columns
+        self.chunksize = chunksize
+        self.buffer = io.StringIO()
+        self.index = index
+        
+        #Format of the columns
+        self.formats = [self.format] * len(columns)
+        if precision is not None:
+            self.fmt = '%.' + str(precision) + 'f'
+            for k, name in enumerate(columns):
+                if name in floats:
+                    self.formats[k] = self.format_float
+        
+        if header:
+            self.write_batch(';'.join(columns) + '\n')
+            if index is not None:
+                index.skip(len((';'.join(columns) + '\n').encode(OutputIndex.ENCODING)))
+
+    #Format a column of values with str()
+    def format(self, values):
+        return list(map(str, values))
+
+    #Format a column of float values with the fixed precision
+    def format_float(self, values):
+        fmt = self.fmt
+        return [fmt % v for v in values]
+
+    #Write rows given as columns of values (lists of the same length)
+    def write(self, *values):
+        columns = [fmt(column) for fmt, column in zip(self.formats, values)]
+        lines = [';'.join(row) + '\n' for row in zip(*columns)]
+        if self.index is not None:
+            self.index.add(columns, values, lines)
+        self.write_batch(''.join(lines))
+
+    #Write an already formatted batch of rows
+    def write_batch(self, batch):
+        self.buffer.write(batch)
+        if self.buffer.tell() >= self.chunksize:
+            self.flush()
+
+    #Write the rows of a part written by another BatchWriter (without header)
+    def append_part(self, wdpart):
+        self.flush()
+        with open(wdpart, encoding=OutputIndex.ENCODING) as part_file:
+            shutil.copyfileobj(part_file, self.output_file)
+        if self.index is not None:
+            self.index.append_part(wdpart, os.path.getsize(wdpart))
+
+    #Write the buffer in the output file
+    def flush(self):
+        self.output_file.write(self.buffer.getvalue())
+        self.buffer = io.StringIO()
+
+    #Flush and close the output file
+    def close(self):
+        self.flush()
+        self.output_file.close()
+        if self.index is not None:
+            self.index.close()
+
+class MultiWriter:
+
+    #Input: writers (list of writers)
+    def __init__(self, writers):
+        self.writers = writers
+
+    #Write rows given as columns of values in every output file
+    def write(self, *values):
+        for writer in self.writers:
+            writer.write(*values)
+
+    #Write the rows of the parts (list of paths, one per output file)
+    def append_part(self, wdparts):
+        for writer, wdpart in zip(self.writers, wdparts):
+            writer.append_part(wdpart)
+
+    #Flush and close the output files
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+#Open a writer, a ColumnarWriter for Parquet and Arrow files, a RecordWriter for binary trip records, a BatchWriter 
+#otherwise and a MultiWriter for a list of paths
+#Input: wdoutput (path or list of paths of the output files), columns (list of column names), types (list of pyarrow 
+#       type names of the columns), precision, floats, header (see BatchWriter), index (names of the columns 
+#       identifying a trip, the csv output files are indexed if given, see OutputIndex.py) and polygon (name of the 
+#       Polygon ID column of the polygon postings of the index)
+def open_writer(wdoutput, columns, types, precision=None, floats=(), header=True, index=None, polygon=None):
+    if isinstance(wdoutput, list):
+        return MultiWriter([open_writer(path, columns, types, precision, floats, header, index, polygon) 
+                            for path in wdoutput])
+    if ColumnarIO.is_columnar(wdoutput):
+        return ColumnarIO.ColumnarWriter(wdoutput, columns, types)
+    if TripRecords.is_records(wdoutput):
+        return TripRecords.RecordWriter(wdoutput, columns)
+    builder = None if index is None else OutputIndex.IndexBuilder(wdoutput, columns, index, polygon)
+    return BatchWriter(open(wdoutput, 'w', encoding=OutputIndex.ENCODING), columns, header, precision, floats, index=builder)
+
+#Test if a path is a csv output file (neither Parquet, Arrow nor binary trip records)
+def is_csv(path):
+    return not ColumnarIO.is_columnar(path) and not TripRecords.is_records(path)
+
+#Path of the k-th part of an output file (or of a list of output files) written by a worker
+def part_path(wdoutput, k):
+    if isinstance(wdoutput, list):
+        return [part_path(path, k) for path in wdoutput]
+    root, ext = os.path.splitext(wdoutput)
+    return root + '.part' + str(k) + ext
+
+#Remove a part (or a list of parts)
+def remove_part(wdpart):
+    if isinstance(wdpart, list):
+        for path in wdpart:
+            remove_part(path)
+    elif TripRecords.is_records(wdpart):
+        TripRecords.remove_records(wdpart)
+    else:
+        os.remove(wdpart)
+        OutputIndex.remove_index(wdpart)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""
+Overlapped reading, computing and writing
+
+ExtractTrips.py and SpatialAggregation.py can overlap the reading of the input file with the computation and the
+writing of the output file (--overlap option). Three stages run in their own thread, connected by bounded queues:
+
+	1. Reader: reads and parses the input file (distance to the coast and Polygon IDs included) and puts batches of
+	   BATCHSIZE positions in the reader queue
+	2. Compute (calling thread): takes the positions of the batches, segments and aggregates the whole vessel paths
+	   and formats the output rows (see OutputWriter.py)
+	3. Writer: drains the chunks of formatted rows of the writer queue and writes them in the output file (csv output
+	   files, the other output files are written by the compute stage)
+
+A stage waits when its output queue is full (backpressure, the memory used by the queues is bounded by their depth)
+or when its input queue is empty. The output is the same as without overlapping. The statistics of a queue (see
+Instrumentation.py) are the number of items (batches of positions or chunks of rows), the mean and maximum depth
+(number of items in the queue after each put) and the stall times: the time its producer waited for a free slot
+(put_stall, the consumer is slower) and the time its consumer waited for an item (get_stall, the producer is slower).
+The stage timers include the stalls. The compute stage shares the interpreter lock with the other stages: the
+overlap hides the waits of the reads and writes (network storage, compressed files), not the parsing.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import time
+import queue
+import threading
+
+import OutputWriter
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+BATCHSIZE = 10000            #Number of positions of a batch of the reader queue
+DEPTH = 8                    #Default number of items of a queue
+TIMEOUT = 0.1                #Time between two checks of the stop event by a producer waiting for a free slot (in seconds)
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+class BoundedQueue:
+
+    #Input: depth (maximum number of items in the queue)
+    def __init__(self, depth=DEPTH):
+        self.queue = queue.Queue(depth)
+        self.items = 0
+        self.depth_sum = 0
+        self.max_depth = 0
+        self.put_stall = 0.0                 #Time waited by the producer (queue full)
+        self.get_stall = 0.0                 #Time waited by the consumer (queue empty)
+
+    #Put an item, wait for a free slot if the queue is full
+    #Input: item and stop (threading.Event, the wait is given up once it is set, None to wait until a slot is free)
+    #Output: True if the item was put, False if the wait was given up
+    def put(self, item, stop=None):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            start = time.perf_counter()
+            done = False
+            while not done and (stop is None or not stop.is_set()):
+                try:
+                    self.queue.put(item, timeout=None if stop is None else TIMEOUT)
+                    done = True
+                except queue.Full:
+                    pass
+            self.put_stall += time.perf_counter() - start
+            if not done:
+                return False
+        depth = self.queue.qsize()
+        self.items += 1
+        self.depth_sum += depth
+        self.max_depth = max(self.max_depth, depth)
+        return True
+
+    #Get an item, wait for an item if the queue is empty
+    def get(self):
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            start = time.perf_counter()
+            item = self.queue.get()
+            self.get_stall += time.perf_counter() - start
+            return item
+
+    #Remove the items of the queue (the producer blocked on a full queue can go on)
+    def drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    #Add the statistics of the queue to stats (see Instrumentation.py) under the name of the queue
+    def report(self, stats, name):
+        stats.queue(name, self.items, self.depth_sum, self.max_depth, self.put_stall, self.get_stall)
+
+#Iterate over items produced by a reader thread (read ahead by batches)
+#Input: items (iterable, iterated in the reader thread), depth (number of batches of the queue), batch_size (number of
+#       items of a batch), stats (see Instrumentation.py, queue "reader_queue", None if not measured) and
+#       reader_stats (statistics measured by the items in the reader thread, added to stats at the end)
+#Output: a generator of the items in the same order
+def read_ahead(items, depth=DEPTH, batch_size=BATCHSIZE, stats=None, reader_stats=None):
+
+    batches = BoundedQueue(depth)
+    stop = threading.Event()
+
+    #Reader thread, the end of the items is an empty batch and an error is passed to the consumer. The reader ends
+    #once the consumer stops, even if it waits for a free slot (the queue can be filled again after it is drained)
+    def read():
+        try:
+            batch = []
+            for item in items:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    if not batches.put(batch, stop) or stop.is_set():
+                        return
+                    batch = []
+            if batch and not batches.put(batch, stop):
+                return
+            batches.put([], stop)
+        except BaseException as error:
+            batches.put(error, stop)
+
+    reader = threading.Thread(target=read, name="reader", daemon=True)
+    reader.start()
+
+    try:
+        while True:
+            batch = batches.get()
+            if isinstance(batch, BaseException):
+                raise batch
+            if not batch:
+                break
+            yield from batch
+
+    #Stop the reader (end of the items or error of the consumer), the queue is drained until the reader ends
+    finally:
+        stop.set()
+        while reader.is_alive():
+            batches.drain()
+            reader.join(TIMEOUT)
+        if stats is not None:
+            batches.report(stats, 'reader_queue')
+            if reader_stats is not None:
+                stats.merge(reader_stats.as_dict(), nested=False)
+
+class QueueFile:
+
+    #Text file whose writes are drained by a writer thread
+    #Input: output_file (file object), depth (number of chunks of the queue) and stats (see Instrumentation.py, queue
+    #       "writer_queue", None if not measured)
+    def __init__(self, output_file, depth=DEPTH, stats=None):
+        self.output_file = output_file
+        self.stats = stats
+        self.chunks = BoundedQueue(depth)
+        self.error = None
+        self.writer = threading.Thread(target=self.drain, name="writer", daemon=True)
+        self.writer.start()
+
+    #Writer thread, None ends the writes
+    def drain(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            if self.error is None:
+                try:
+                    self.output_file.write(chunk)
+                except BaseException as error:
+                    self.error = error
+
+    #Raise the error of the writer thread
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    #Write a chunk (in the writer thread)
+    def write(self, chunk):
+        self.check()
+        if chunk:
+            self.chunks.put(chunk)
+
+    #Wait for the writes and close the output file
+    def close(self):
+        self.chunks.put(None)
+        self.writer.join()
+        self.output_file.close()
+        if self.stats is not None:
+            self.chunks.report(self.stats, 'writer_queue')
+        self.check()
+
+#Write the csv output files of a writer (see OutputWriter.open_writer) in writer threads
+#Input: writer, depth and stats (see QueueFile)
+#Output: the writer
+def overlap_writer(writer, depth=DEPTH, stats=None):
+    if isinstance(writer, OutputWriter.MultiWriter):
+        for inner in writer.writers:
+            overlap_writer(inner, depth, stats)
+    elif isinstance(writer, OutputWriter.BatchWriter):
+        writer.output_file = QueueFile(writer.output_file, depth, stats)
+    return writer
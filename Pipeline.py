@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+
+"""
+Extract and aggregate trips in one run
+
+This script runs ExtractTrips.py and SpatialAggregation.py one after the other without parsing any intermediate csv
+file. The trips are written in binary trip records (see TripRecords.py) memory-mapped as a numpy structured array,
+completed in place with the Speed and the Polygon ID of every position, and aggregated directly from the records.
+
+	1. Speed: Distance traveled between the last and the current position divided by the time ellapsed
+	          (in meters per second), 0 for the first position of a trip
+	2. Polygon ID: Polygon of a polygon layer containing the position ("NA" outside of the polygons, see 
+	               PolygonIndex.py) or cell of a regular grid of cell size meters containing the position 
+	               ("column_row", with column = floor(X / cell) and row = floor(Y / cell))
+
+The Trip ID of the aggregated trips is "Vessel ID_Trip ID".
+
+The algorithm has 5 parameters:
+
+	1. wdinput:  Path of the input file (see ExtractTrips.py, "-" for the standard input)
+	2. wdoutput: Path of the output file (see SpatialAggregation.py)
+	3. thd: Distance threshold (in meters)
+	4. tht: Time threshold (in seconds)
+	5. epsilon: Maximum distance (in meters) between the simplified path and the original one
+
+and the following options:
+
+	--polygons: Path of the polygon layer (GeoJSON or csv file of WKT)
+	--polygon-id: GeoJSON property of the Polygon ID (default "id")
+	--index-cache: Path of the cached spatial index (polygon layer path + ".index.npz" by default)
+	--cell: Cell size of the grid (in meters), used if no polygon layer is given
+	--trips: Path of the trips file (output of ExtractTrips.py), not written if not given
+	--records: Path of the binary trip records (.bin), written in a temporary file removed at the end if not given
+	--engine, --block-size, --workers, --unsorted, --memory, --tmpdir, --precision, --id-min, --id-max, --state, --final,
+	--stats, --progress, --profile, --coast, --simplifier: See ExtractTrips.py, the engine and block size are used by the extraction and the 
+	          aggregation, the statistics cover the extraction, the completion of the records (timer "records") and 
+	          the aggregation
+	--index: Write the sidecar index of the output file and of the trips file if it is a csv file (see OutputIndex.py)
+	--cache: Directory of a cache of the trips and aggregated trips of the vessels (see ResultCache.py), keyed by a hash
+	         of the positions of the vessel, of the parameters and of the polygon layer or cell size. The results of the
+	         unchanged vessels are read from the cache, the other vessels are extracted and aggregated by batches of 
+	         block size positions without binary trip records (single process, not incremental), the output is the same
+	--cache-size: Size limit of the cache (in MB, default 1024), the least recently used entries are removed
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import sys
+import math
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+import CoastRaster
+import ExtractTrips
+import SpatialAggregation
+import InputFiles
+import Instrumentation
+import OutputWriter
+import PolygonIndex
+import ResultCache
+import TripRecords
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Extract and aggregate trips in one run")
+    parser.add_argument("wdinput", help="Path of the input file")
+    parser.add_argument("wdoutput", help="Path of the output file")
+    parser.add_argument("thd", type=float, help="Distance threshold (in meters)")
+    parser.add_argument("tht", type=float, help="Time threshold (in seconds)")
+    parser.add_argument("epsilon", type=float, help="Maximum distance between the simplified path and the original one")
+    parser.add_argument("--polygons", default=None, help="Path of the polygon layer")
+    parser.add_argument("--polygon-id", default="id", help="GeoJSON property of the Polygon ID")
+    parser.add_argument("--index-cache", default=None, help="Path of the cached spatial index")
+    parser.add_argument("--cell", type=float, default=None, help="Cell size of the grid (in meters)")
+    parser.add_argument("--trips", default=None, help="Path of the trips file")
+    parser.add_argument("--records", default=None, help="Path of the binary trip records (.bin)")
+    parser.add_argument("--engine", choices=["loop", "numpy", "chunked"], default="loop", help="Trip segmentation engine")
+    parser.add_argument("--block-size", type=int, default=1000000, help="Minimum number of positions per block (numpy engine)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes")
+    parser.add_argument("--unsorted", action="store_true", help="Sort the input file by vessel ID and time first")
+    parser.add_argument("--memory", type=int, default=1024, help="Memory budget of the sort and of the chunked engine (in MB)")
+    parser.add_argument("--tmpdir", default=None, help="Directory of the temporary files")
+    parser.add_argument("--precision", type=int, default=None, help="Number of decimals of X, Y, Delta_d and Theta")
+    parser.add_argument("--id-min", default=None, help="Smallest vessel ID read from a Parquet or Arrow input file")
+    parser.add_argument("--id-max", default=None, help="Largest vessel ID read from a Parquet or Arrow input file")
+    parser.add_argument("--state", default=None, help="Checkpoint of the open trips of an incremental run")
+    parser.add_argument("--final", action="store_true", help="Close the open trips of the checkpoint (last incremental run)")
+    parser.add_argument("--stats", default=None, help="Path of the json statistics of the run")
+    parser.add_argument("--progress", type=float, default=None, help="Interval between two progress lines (in seconds)")
+    parser.add_argument("--profile", default=None, help="Path of the cProfile statistics of the run")
+    parser.add_argument("--coast", default=None, help="Path of the raster of the distance to the coast (DistLand)")
+    parser.add_argument("--simplifier", choices=["rdp", "window", "visvalingam"], default="rdp", 
+                        help="Simplification of the trips")
+    parser.add_argument("--index", action="store_true", help="Write the offset index of the output files")
+    parser.add_argument("--cache", default=None, help="Directory of the cache of the results of the vessels")
+    parser.add_argument("--cache-size", type=int, default=ResultCache.SIZE, help="Size limit of the cache (in MB)")
+    args = parser.parse_args()
+
+    if (args.polygons is None) == (args.cell is None):
+        sys.exit("Either a polygon layer (--polygons) or a cell size (--cell) must be given")
+
+    if args.workers > 1 and not InputFiles.is_seekable(args.wdinput):
+        sys.exit("Multiple processes require an uncompressed input file")
+
+    if args.memory < 1:
+        sys.exit("The memory budget (--memory) must be at least 1 MB")
+
+    if args.state is not None and (args.engine != "loop" or args.workers > 1):
+        sys.exit("The incremental mode requires the loop engine and a single process")
+
+    if args.final and args.state is None:
+        sys.exit("The --final option requires a checkpoint (--state)")
+
+    if args.records is not None and not TripRecords.is_records(args.records):
+        sys.exit("The binary trip records must have the extension " + TripRecords.EXTENSION)
+
+    if args.index and not OutputWriter.is_csv(args.wdoutput):
+        sys.exit("The index (--index) requires a csv output file")
+
+    if args.cache is not None and (args.workers > 1 or args.state is not None or args.records is not None):
+        sys.exit("The cache (--cache) requires a single process, no incremental mode and no binary trip records")
+
+    print(" ")
+    print("Parameters:" + " " + args.wdinput + " " + args.wdoutput + " " + str(args.thd) + " " + str(args.tht) + " " +
+          str(args.epsilon) + " " + str(args.polygons or args.cell))
+    print(" ")
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Aggregation engine of an extraction engine (see SpatialAggregation.py)
+def aggregation_engine(engine):
+    return "loop" if engine == "loop" else "numpy"
+
+#Speed of a chunk of records (in meters per second, 0 for the first position of a trip)
+def assign_speed(chunk):
+    speed = np.zeros(len(chunk))
+    moving = chunk['delta_t'] > 0
+    speed[moving] = chunk['delta_d'][moving] / chunk['delta_t'][moving]
+    chunk['speed'] = speed
+
+#Polygon ID of a chunk of records on a regular grid
+#Input: chunk (records), cell (cell size in meters), polygons (list of Polygon IDs) and
+#       index (dictionary giving the index of a Polygon ID in polygons), updated with the new cells
+def assign_grid(chunk, cell, polygons, index):
+
+    columns = np.floor(chunk['x'] / cell).astype(np.int64)
+    rows = np.floor(chunk['y'] / cell).astype(np.int64)
+    cells, inverse = np.unique(np.stack((columns, rows), axis=1), axis=0, return_inverse=True)
+
+    codes = np.empty(len(cells), dtype=np.int64)
+    for k, (column, row) in enumerate(cells.tolist()):
+        name = str(column) + '_' + str(row)
+        if name not in index:
+            index[name] = len(polygons)
+            polygons.append(name)
+        codes[k] = index[name]
+
+    chunk['polygon'] = codes[inverse.reshape(-1)]
+
+#Complete binary trip records in place with the Speed and the Polygon ID of the positions
+#Input: wdrecords (path of the binary trip records) and either polygon_index (PolygonIndex of a polygon layer) or
+#       cell (cell size of the grid in meters)
+def complete_records(wdrecords, polygon_index=None, cell=None):
+
+    records, metadata = TripRecords.open_records(wdrecords, 'r+')
+    polygons = [] if polygon_index is None else polygon_index.names
+    index = {}
+
+    for start in range(0, len(records), TripRecords.CHUNKSIZE):
+        chunk = records[start:(start + TripRecords.CHUNKSIZE)]
+        assign_speed(chunk)
+        if polygon_index is None:
+            assign_grid(chunk, cell, polygons, index)
+        else:
+            chunk['polygon'] = polygon_index.assign(chunk['x'], chunk['y'])
+
+    if isinstance(records, np.memmap):
+        records.flush()
+    del records
+
+    metadata['polygons'] = polygons
+    TripRecords.write_metadata(wdrecords, metadata)
+
+#Aggregate binary trip records (see SpatialAggregation.py), the output file is written without column names if header
+#is False (part of an output file)
+def aggregate_records(wdrecords, wdoutput, precision=None, engine="loop", block_size=1000000, stats=None, index=False,
+                      header=True):
+
+    writer = SpatialAggregation.open_writer(wdoutput, precision, index, header)
+    trips = SpatialAggregation.aggregate_trips(TripRecords.read_positions(wdrecords), stats=stats, engine=engine,
+                                               block_size=block_size)
+    SpatialAggregation.write_trips(trips, writer, stats)
+    writer.close()
+
+#Trip's positions of extracted trips with the Speed and the Polygon ID (see SpatialAggregation.py)
+#Input: trips (iterable of trip columns, see ExtractTrips.trip_columns, the Significance column of the significance 
+#       simplifier is ignored) and either polygon_index (PolygonIndex of a polygon layer) or cell (cell size of the 
+#       grid in meters)
+#Output: a generator of trip's positions (Trip ID, Unix Time, X, Y, DistLand, Speed, Simplified, Polygon ID)
+def trip_positions(trips, polygon_index=None, cell=None):
+    
+    for trip in trips:
+        
+        IDs, IDtrips, T, X, Y, L, Dt, Dd, Theta, S = trip[:10]
+        
+        IDs = [str(IDs[0]) + '_' + str(IDtrips[0])] * len(T)
+        Sp = [dd / dt if dt > 0 else 0.0 for dt, dd in zip(Dt, Dd)]
+        
+        if polygon_index is not None:
+            P = [polygon_index.names[k] if k >= 0 else 'NA' for k in polygon_index.assign(X, Y).tolist()]
+        else:
+            P = [str(math.floor(x / cell)) + '_' + str(math.floor(y / cell)) for x, y in zip(X, Y)]
+        
+        yield from zip(IDs, T, X, Y, L, Sp, S, P)
+
+#Extract and aggregate the trips of positions without intermediate file (streaming API)
+#Input: positions (iterable of positions (Vessel ID, Unix Time, X, Y, DistLand) sorted by vessel and time), thd, tht,
+#       epsilon, either polygon_index or cell (see trip_positions), engine, block_size and simplifier (see 
+#       ExtractTrips.extract_trips)
+#Output: a generator of aggregated trip columns (see SpatialAggregation.trip_columns)
+def stream_trips(positions, thd, tht, epsilon, polygon_index=None, cell=None, engine="loop", block_size=1000000, 
+                 simplifier="rdp"):
+    trips = ExtractTrips.extract_trips(positions, thd, tht, epsilon, engine, block_size, simplifier=simplifier)
+    return SpatialAggregation.aggregate_trips(trip_positions(trips, polygon_index, cell),
+                                              engine=aggregation_engine(engine), block_size=block_size)
+
+#Cache of the trips and aggregated trips of the vessels (see ResultCache.py), keyed by the parameters and the content 
+#of the polygon layer or the cell size (see the command line)
+def open_cache(args):
+    layer = args.cell if args.polygons is None else PolygonIndex.layer_hash(args.polygons, args.polygon_id)
+    return ResultCache.ResultCache(args.cache, args.cache_size, 'Pipeline', 
+                                   [args.thd, args.tht, args.epsilon, args.simplifier, layer])
+
+#Extract and aggregate the trips of an input file reusing the trips and aggregated trips of the unchanged vessels cached 
+#by a previous run (see the command line and open_cache), the other vessels are extracted and aggregated by batches of 
+#block size positions without binary trip records
+def cached_run(args, cache, stats=None):
+
+    polygon_index = None
+    if args.polygons is not None:
+        polygon_index = PolygonIndex.open_index(args.polygons, args.polygon_id, args.index_cache)
+    coast = None if args.coast is None else CoastRaster.open_raster(args.coast)
+    positions, input_file = ExtractTrips.open_positions(args.wdinput, args.unsorted, args.memory, args.tmpdir, 
+                                                        args.id_min, args.id_max, stats, coast)
+
+    #Trips and aggregated trips of the vessels missing from the cache
+    def compute(batch):
+        trips = list(ExtractTrips.extract_trips(batch, args.thd, args.tht, args.epsilon, args.engine, args.block_size,
+                                                stats=stats, memory=args.memory, tmpdir=args.tmpdir, 
+                                                simplifier=args.simplifier))
+        results = {}
+        vessels = {}
+        for trip in trips:
+            results.setdefault(trip[0][0], [[], []])[0].append(trip)
+            vessels[str(trip[0][0]) + '_' + str(trip[1][0])] = trip[0][0]
+        for visit in SpatialAggregation.aggregate_trips(trip_positions(trips, polygon_index, args.cell), stats, 
+                                                        aggregation_engine(args.engine), args.block_size):
+            results[vessels[visit[0][0]]][1].append(visit)
+        return results
+
+    #Output files
+    writer = SpatialAggregation.open_writer(args.wdoutput, args.precision, args.index)
+    trips_writer = None
+    if args.trips is not None:
+        index = ExtractTrips.INDEX if args.index and OutputWriter.is_csv(args.trips) else None
+        trips_writer = OutputWriter.open_writer(args.trips, ExtractTrips.COLUMNS, ExtractTrips.TYPES, args.precision,
+                                                ExtractTrips.FLOATS, index=index)
+
+    for trips, visits in ResultCache.cached_results(positions, compute, cache, 2, args.block_size):
+        if trips_writer is not None:
+            ExtractTrips.write_trips(trips, trips_writer, stats)
+        SpatialAggregation.write_trips(visits, writer, stats)
+
+    if input_file is not None:
+        input_file.close()
+    writer.close()
+    if trips_writer is not None:
+        trips_writer.close()
+
+#Extract and aggregate the trips of an input file (see the command line)
+def run(args, stats=None):
+
+    #Binary trip records
+    if args.records is not None:
+        wdrecords = args.records
+    else:
+        fd, wdrecords = tempfile.mkstemp(suffix=TripRecords.EXTENSION, dir=args.tmpdir)
+        os.close(fd)
+
+    try:
+
+        #Extract the trips
+        wdtrips = [wdrecords] if args.trips is None else [wdrecords, args.trips]
+        ExtractTrips.extract_file(args.wdinput, wdtrips, args.thd, args.tht, args.epsilon, args.engine, args.block_size,
+                                  args.workers, args.unsorted, args.memory, args.tmpdir, args.precision, args.id_min,
+                                  args.id_max, args.state, args.final, stats, args.coast, args.simplifier, args.index)
+
+        #Speed and Polygon ID
+        start = time.perf_counter()
+        if args.polygons is not None:
+            complete_records(wdrecords, PolygonIndex.open_index(args.polygons, args.polygon_id, args.index_cache))
+        else:
+            complete_records(wdrecords, cell=args.cell)
+        if stats is not None:
+            stats.add_time('records', time.perf_counter() - start)
+
+        #Aggregate the trips
+        aggregate_records(wdrecords, args.wdoutput, args.precision, aggregation_engine(args.engine), args.block_size, 
+                          stats, args.index)
+
+    #Remove the temporary binary trip records, even if the run fails
+    finally:
+        if args.records is None:
+            TripRecords.remove_records(wdrecords)
+
+# ****************************** MAIN *************************************************************************************************
+# *************************************************************************************************************************************
+
+if __name__ == "__main__":
+
+    stats = Instrumentation.Stats(args.progress) if (args.stats is not None or args.progress is not None) else None
+
+    if args.cache is None:
+        Instrumentation.profile(args.profile, run, args, stats)
+    else:
+        cache = open_cache(args)
+        Instrumentation.profile(args.profile, cached_run, args, cache, stats)
+
+        #Cache hits and misses
+        print(cache.summary())
+        if stats is not None:
+            cache.report(stats)
+
+    #Statistics
+    if args.stats is not None:
+        stats.write(args.stats)
+
+    #End
+    print("End of the process")
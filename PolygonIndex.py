@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+Point-in-polygon assignment with a spatial index
+
+This module assigns to spatio-temporal positions the ID of the polygon containing them (the Polygon ID column of
+SpatialAggregation.py). The polygon layer is given in the same cartesian coordinates (in meters) as the positions,
+either as
+
+	1. a GeoJSON file (.geojson, .json) of Polygon and MultiPolygon features, the Polygon ID is the property given
+	   by id_field (the feature id or its rank if missing)
+	2. a 2 columns csv file with column names (the value separator is a semicolon ";"): Polygon ID and the WKT of a
+	   POLYGON or MULTIPOLYGON
+
+The polygons are indexed with a uniform grid: each cell lists the polygons whose bounding box intersects it. The
+positions are assigned by batches, the candidate polygons of every position are given by its cell and filtered by
+bounding box, then an even-odd ray casting test is computed for all the positions of a candidate polygon at once.
+A position in several polygons is assigned to the first one, a position outside of the polygons to -1.
+
+The index is cached on disk (.index.npz next to the layer by default) and only rebuilt if the layer changes.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import re
+import json
+import hashlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+VERSION = 1                  #Version of the cached index format
+MAXPAIRS = 4000000           #Maximum number of (position, edge) pairs tested at once
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Rings of a WKT POLYGON or MULTIPOLYGON as lists of (x, y) coordinates
+def wkt_rings(wkt):
+    rings = []
+    for ring in re.findall(r'\(([^()]+)\)', wkt):
+        rings.append([tuple(float(v) for v in point.split()[:2]) for point in ring.split(',')])
+    return rings
+
+#Rings of a GeoJSON Polygon or MultiPolygon geometry
+def geojson_rings(geometry):
+    if geometry['type'] == 'Polygon':
+        return [[tuple(point[:2]) for point in ring] for ring in geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return [[tuple(point[:2]) for point in ring] for polygon in geometry['coordinates'] for ring in polygon]
+    raise ValueError("Unsupported geometry type: " + geometry['type'])
+
+#Load a polygon layer
+#Input: wdpolygons (path of the GeoJSON or csv file) and id_field (GeoJSON property of the Polygon ID)
+#Output: a list of Polygon IDs and a list of lists of rings
+def load_polygons(wdpolygons, id_field="id"):
+
+    names = []
+    polygons = []
+
+    if os.path.splitext(wdpolygons)[1].lower() in ('.geojson', '.json'):
+        with open(wdpolygons) as polygon_file:
+            layer = json.load(polygon_file)
+        for k, feature in enumerate(layer['features']):
+            properties = feature.get('properties') or {}
+            names.append(str(properties.get(id_field, feature.get('id', k))))
+            polygons.append(geojson_rings(feature['geometry']))
+    else:
+        with open(wdpolygons) as polygon_file:
+            next(polygon_file)                                 #Skip column names
+            for line in polygon_file:
+                if line.strip():
+                    attr = line.rstrip('\n\r').split(';', 1)
+                    names.append(attr[0])
+                    polygons.append(wkt_rings(attr[1]))
+
+    return names, polygons
+
+#Hash of the content of a polygon layer
+def layer_hash(wdpolygons, id_field):
+    sha = hashlib.sha1()
+    sha.update((str(VERSION) + ';' + id_field + ';').encode())
+    with open(wdpolygons, 'rb') as polygon_file:
+        for block in iter(lambda: polygon_file.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+class PolygonIndex:
+
+    #Input: names (list of Polygon IDs), edges (array of the polygon edges x1, y1, x2, y2, sorted by polygon),
+    #       offsets (edges of polygon k are edges[offsets[k]:offsets[k+1]]), bboxes (array of the polygon bounding boxes
+    #       xmin, ymin, xmax, ymax), grid (xmin, ymin, cell size, number of columns and rows) and
+    #       cells, items (polygons of cell c are items[cells[c]:cells[c+1]])
+    def __init__(self, names, edges, offsets, bboxes, grid, cells, items):
+        self.names = names
+        self.edges = edges
+        self.offsets = offsets
+        self.bboxes = bboxes
+        self.grid = grid
+        self.cells = cells
+        self.items = items
+
+    #Build the index of a list of polygons (see load_polygons)
+    @classmethod
+    def build(cls, names, polygons):
+
+        if len(polygons) == 0:
+            raise ValueError("The polygon layer is empty")
+
+        #Edges and bounding boxes
+        edges = []
+        offsets = [0]
+        bboxes = np.empty((len(polygons), 4))
+        for k, rings in enumerate(polygons):
+            points = np.array([point for ring in rings for point in ring], dtype=float).reshape(-1, 2)
+            bboxes[k] = [points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()]
+            count = 0
+            for ring in rings:
+                ring = np.array(ring, dtype=float)
+                if len(ring) > 1 and (ring[0] != ring[-1]).any():
+                    ring = np.vstack((ring, ring[:1]))
+                edges.append(np.hstack((ring[:-1], ring[1:])))
+                count += len(ring) - 1
+            offsets.append(offsets[-1] + count)
+        edges = np.vstack(edges) if edges else np.empty((0, 4))
+        offsets = np.array(offsets, dtype=np.int64)
+
+        #Uniform grid with about one cell per polygon
+        xmin, ymin = bboxes[:, 0].min(), bboxes[:, 1].min()
+        xmax, ymax = bboxes[:, 2].max(), bboxes[:, 3].max()
+        size = max(np.sqrt((xmax - xmin) * (ymax - ymin) / len(polygons)), 1e-9)
+        ncols = int((xmax - xmin) // size) + 1
+        nrows = int((ymax - ymin) // size) + 1
+
+        #Polygons of every cell
+        pairs_cell = []
+        pairs_polygon = []
+        for k in range(len(polygons)):
+            c0, r0 = int((bboxes[k, 0] - xmin) // size), int((bboxes[k, 1] - ymin) // size)
+            c1, r1 = int((bboxes[k, 2] - xmin) // size), int((bboxes[k, 3] - ymin) // size)
+            c, r = np.meshgrid(np.arange(c0, c1 + 1), np.arange(r0, r1 + 1))
+            pairs_cell.append((r * ncols + c).reshape(-1))
+            pairs_polygon.append(np.full(c.size, k))
+        pairs_cell = np.concatenate(pairs_cell)
+        pairs_polygon = np.concatenate(pairs_polygon)
+        order = np.lexsort((pairs_polygon, pairs_cell))
+        items = pairs_polygon[order]
+        cells = np.zeros(ncols * nrows + 1, dtype=np.int64)
+        cells[1:] = np.cumsum(np.bincount(pairs_cell, minlength=ncols * nrows))
+
+        return cls(names, edges, offsets, bboxes, np.array([xmin, ymin, size, ncols, nrows]), cells, items)
+
+    #Save the index in a npz file
+    def save(self, path, key):
+        with open(path, 'wb') as index_file:
+            np.savez(index_file, key=np.array(key), names=np.array(json.dumps(self.names)), edges=self.edges,
+                     offsets=self.offsets, bboxes=self.bboxes, grid=self.grid, cells=self.cells, items=self.items)
+
+    #Load an index saved in a npz file, None if missing or built from another layer
+    @classmethod
+    def load(cls, path, key):
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if str(data['key']) != key:
+                return None
+            return cls(json.loads(str(data['names'])), data['edges'], data['offsets'], data['bboxes'], data['grid'],
+                       data['cells'], data['items'])
+
+    #Index of the polygons containing a batch of positions
+    #Input: X, Y (arrays of cartesian coordinates)
+    #Output: an array of polygon indices (-1 outside of the polygons)
+    def assign(self, X, Y):
+
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        n = len(X)
+        xmin, ymin, size, ncols, nrows = self.grid.tolist()
+        ncols, nrows = int(ncols), int(nrows)
+
+        #Cell of the positions
+        c = np.floor((X - xmin) / size)
+        r = np.floor((Y - ymin) / size)
+        inside = (c >= 0) & (c < ncols) & (r >= 0) & (r < nrows)
+        points = np.flatnonzero(inside)
+        cell = (r[inside] * ncols + c[inside]).astype(np.int64)
+
+        #Candidate (position, polygon) pairs
+        counts = self.cells[cell + 1] - self.cells[cell]
+        pairs_point = np.repeat(points, counts)
+        first = np.repeat(self.cells[cell] - np.cumsum(counts) + counts, counts)
+        pairs_polygon = self.items[first + np.arange(len(first))]
+
+        #Bounding box filter
+        bbox = self.bboxes[pairs_polygon]
+        keep = ((X[pairs_point] >= bbox[:, 0]) & (X[pairs_point] <= bbox[:, 2]) &
+                (Y[pairs_point] >= bbox[:, 1]) & (Y[pairs_point] <= bbox[:, 3]))
+        pairs_point = pairs_point[keep]
+        pairs_polygon = pairs_polygon[keep]
+
+        #Ray casting polygon by polygon
+        result = np.full(n, len(self.names), dtype=np.int64)
+        order = np.argsort(pairs_polygon, kind='stable')
+        pairs_point = pairs_point[order]
+        pairs_polygon = pairs_polygon[order]
+        bounds = np.flatnonzero(np.diff(pairs_polygon)) + 1
+        for group in np.split(np.arange(len(pairs_polygon)), bounds):
+            if len(group) == 0:
+                continue
+            k = pairs_polygon[group[0]]
+            pts = pairs_point[group]
+            edges = self.edges[self.offsets[k]:self.offsets[k + 1]]
+            step = max(1, MAXPAIRS // max(1, len(edges)))
+            for start in range(0, len(pts), step):
+                p = pts[start:(start + step)]
+                px = X[p][:, None]
+                py = Y[p][:, None]
+                x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    crossing = ((y1 > py) != (y2 > py)) & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+                inpoly = (np.count_nonzero(crossing, axis=1) % 2) == 1
+                np.minimum.at(result, p[inpoly], k)
+
+        result[result == len(self.names)] = -1
+        return result
+
+#Load the index of a polygon layer from the cache or build it (and save it in the cache)
+#Input: wdpolygons (path of the polygon layer), id_field (GeoJSON property of the Polygon ID) and
+#       wdcache (path of the cached index, wdpolygons + ".index.npz" by default)
+def open_index(wdpolygons, id_field="id", wdcache=None):
+    if np is None:
+        raise ImportError("The point-in-polygon assignment requires numpy")
+    if wdcache is None:
+        wdcache = wdpolygons + ".index.npz"
+    key = layer_hash(wdpolygons, id_field)
+    index = PolygonIndex.load(wdcache, key)
+    if index is None:
+        index = PolygonIndex.build(*load_polygons(wdpolygons, id_field))
+        index.save(wdcache, key)
+    return index
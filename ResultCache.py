@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+"""
+Content-addressed cache of the results of the vessels
+
+ExtractTrips.py, SpatialAggregation.py and Pipeline.py can reuse the results of a previous run for the vessels whose
+input rows have not changed (--cache option). The positions (sorted by vessel) are grouped by vessel (by trip for
+SpatialAggregation.py, whose input has no vessel ID) and every group is identified by a hash (SHA-256) of:
+
+	1. The tool (ExtractTrips, SpatialAggregation or Pipeline) and VERSION, the version of the results
+	2. The parameters of the results (thd, tht, epsilon, simplifier, polygon layer or cell size)
+	3. The parsed rows of the group (pickled), after the distance to the coast (--coast) and the Polygon IDs (--polygons) are
+	   assigned, so a change of the raster or of the polygon layer changes the hash of the groups it affects
+
+The cache is a directory with one json file per group named after its hash, holding the results of the group: the
+finished trips (output columns of ExtractTrips.py) and/or the aggregated polygon visits (output columns of
+SpatialAggregation.py). The results are written by the writers of the run (the precision and the output format are not
+part of the hash), so a cached group gives the same output rows as a recomputed one. The groups missing from the
+cache are gathered in batches of at least block size positions and computed together by the engine of the run, the
+time of a rerun after a small upstream correction is spent on the changed vessels.
+
+The size of the cache is limited (--cache-size, in MB): the least recently used entries (last written or read) are
+removed once the limit is exceeded. The hits (groups read from the cache), misses (groups computed), evictions and
+the hit rate are printed at the end of the run and added to the statistics (see Instrumentation.py).
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import json
+import time
+import pickle
+import hashlib
+import tempfile
+import collections
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+VERSION = 1                  #Version of the cached results (changed with the output of the tools)
+EXTENSION = '.json'          #Extension of the cache entries
+SIZE = 1024                  #Default size limit of the cache (in MB)
+PROTOCOL = 4                 #Pickle protocol of the hashed rows (fixed, the hashes do not depend on the Python version)
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Lists of the numpy values of the results (arrays and scalars)
+def json_value(value):
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError("Cannot cache a value of type " + type(value).__name__)
+
+class ResultCache:
+
+    #Input: directory (directory of the cache entries, created if needed), size (size limit in MB), tool (name of the
+    #       tool) and parameters (list of the parameters of the results)
+    def __init__(self, directory, size=SIZE, tool='', parameters=()):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.limit = size * 2 ** 20
+        self.prefix = json.dumps([tool, VERSION] + list(parameters)).encode()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.seconds = 0.0                   #Time spent hashing, reading and writing the entries
+
+        #Entries from the least to the most recently used, with their size
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(EXTENSION):
+                info = os.stat(os.path.join(directory, name))
+                entries.append((info.st_mtime, name[:-len(EXTENSION)], info.st_size))
+        self.entries = collections.OrderedDict((key, size) for mtime, key, size in sorted(entries))
+        self.size = sum(self.entries.values())
+        self.evict()
+
+    #Path of an entry
+    def path(self, key):
+        return os.path.join(self.directory, key + EXTENSION)
+
+    #Hash of the rows of a group (list of tuples of values, pickled)
+    def key(self, rows):
+        sha = hashlib.sha256(self.prefix)
+        sha.update(pickle.dumps(rows, PROTOCOL))
+        return sha.hexdigest()
+
+    #Results of a group, None if not cached (the entry becomes the most recently used one)
+    def get(self, key):
+        start = time.perf_counter()
+        results = None
+        if key in self.entries:
+            try:
+                with open(self.path(key)) as entry_file:
+                    results = json.load(entry_file)
+                os.utime(self.path(key))
+                self.entries.move_to_end(key)
+            except (OSError, ValueError):
+                #Entry removed or damaged, computed again
+                self.remove(key)
+        if results is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.seconds += time.perf_counter() - start
+        return results
+
+    #Cache the results of a group (json values, numpy values are converted to lists)
+    def put(self, key, results):
+        start = time.perf_counter()
+        fd, wdtemp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        with os.fdopen(fd, 'w') as entry_file:
+            entry_file.write(json.dumps(results, separators=(',', ':'), default=json_value))
+        os.replace(wdtemp, self.path(key))
+        self.size += os.path.getsize(self.path(key)) - self.entries.pop(key, 0)
+        self.entries[key] = os.path.getsize(self.path(key))
+        self.evict()
+        self.seconds += time.perf_counter() - start
+
+    #Remove an entry
+    def remove(self, key):
+        self.size -= self.entries.pop(key, 0)
+        if os.path.exists(self.path(key)):
+            os.remove(self.path(key))
+
+    #Remove the least recently used entries until the cache is within its size limit
+    def evict(self):
+        while self.size > self.limit and self.entries:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    #Fraction of the groups read from the cache
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    #Add the hits, misses, evictions, hit rate and time of the cache to stats (see Instrumentation.py)
+    def report(self, stats):
+        stats.count('cache_hits', self.hits)
+        stats.count('cache_misses', self.misses)
+        stats.count('cache_evictions', self.evictions)
+        stats.counters['cache_hit_rate'] = self.hit_rate()
+        stats.add_time('cache', self.seconds)
+
+    #Summary line of the cache
+    def summary(self):
+        return ("Cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses (" +
+                "%.1f" % (100 * self.hit_rate()) + "% hit rate), " + str(self.evictions) + " evictions")
+
+#Results of groups of positions reusing the cached results of the unchanged groups
+#Input: positions (iterable of positions sorted by group, the group being the first value), compute (function of a
+#       list of positions of complete groups returning a dictionary giving for each group with results the list of its
+#       results per output, a result being a tuple of output columns), cache (ResultCache), outputs (number of outputs)
+#       and batch_size (minimum number of positions of a batch of groups)
+#Output: a generator of the results of the groups in order (lists of results per output)
+def cached_results(positions, compute, cache, outputs=1, batch_size=1000000):
+
+    #Groups of the batch (group, key and results if cached), positions of the groups to compute
+    batch = []
+    missing = []
+    size = 0
+
+    group = []
+    for position in positions:
+
+        #IF new group
+        #THEN look it up in the cache
+        if group and position[0] != group[0][0]:
+            size += len(group)
+            add_group(group, cache, batch, missing)
+            group = []
+
+            #IF the batch is large enough
+            #THEN compute the missing groups and yield the results of the batch
+            if size >= batch_size:
+                yield from batch_results(batch, missing, compute, cache, outputs)
+                batch, missing, size = [], [], 0
+
+        group.append(position)
+
+    if group:
+        add_group(group, cache, batch, missing)
+    if batch:
+        yield from batch_results(batch, missing, compute, cache, outputs)
+
+#Add a group of positions to a batch, its positions are added to missing if its results are not cached
+def add_group(group, cache, batch, missing):
+    key = cache.key(group)
+    results = cache.get(key)
+    if results is None:
+        missing.extend(group)
+    batch.append((group[0][0], key, results))
+
+#Results of a batch of groups, the missing groups are computed together and cached
+def batch_results(batch, missing, compute, cache, outputs):
+    computed = compute(missing) if missing else {}
+    for group, key, results in batch:
+        if results is None:
+            results = computed.get(group, [[] for k in range(outputs)])
+            cache.put(key, results)
+        yield results
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sharded execution on several hosts
+
+A large archive is processed by independent processes, on one or several hosts sharing a filesystem, each process
+extracting the trips of a shard of the input file (see ExtractTrips.py) and aggregating them (see Pipeline.py):
+
+	1. split: The sorted input file is split in n shards at vessel ID boundaries (byte ranges of the input file, see
+	   ExtractTrips.vessel_boundaries), an unsorted input file is sorted in the shard directory first. The shards and
+	   the parameters of the run are written in a manifest (manifest.json of the shard directory) identified by a
+	   hash of its content
+	2. run: A process runs shards of the manifest and writes their outputs in the shard directory without column
+	   names (shard<k>.csv and shard<k>.trips.csv), then a marker (shard<k>.done) giving the manifest hash, the size of
+	   the outputs, the host and the time of the run. Without shard numbers, the process claims the shards one after
+	   the other with lock files created atomically (shard<k>.lock), so the same command can be started on every host.
+	   The run stops if the input file was modified since the split (size different from the size in the manifest)
+	3. status: Shards complete, claimed (running, or failed if the process stopped) and not run
+	4. merge: The markers are verified against the manifest (same manifest hash, outputs of the recorded size), the
+	   shards without a valid marker are run again locally, and the shard outputs are concatenated in order with the
+	   column names. The merged outputs are identical to the outputs of a single run. The merge stops as the run if the
+	   input file was modified since the split
+
+The trips are aggregated if a polygon layer or a cell size is given (the output file is then the aggregated trips, the
+trips being written only with --trips), otherwise the output file is the trips. The commands are:
+
+	python Shards.py split input.csv shards 64 4000 3600 300 --cell 5000 --trips
+	python Shards.py run shards 0 1 2
+	python Shards.py run shards
+	python Shards.py status shards
+	python Shards.py merge shards output.csv --trips trips.csv --workers 8
+
+with the following options:
+
+	split: --polygons, --polygon-id, --index-cache, --cell, --engine, --block-size, --unsorted, --memory, --tmpdir,
+	       --precision, --coast, --simplifier (see Pipeline.py), --trips (write the trips of the aggregated shards) and
+	       --index (index the merged csv outputs, see OutputIndex.py)
+	merge: --trips (path of the merged trips), --workers (number of processes running the failed shards again,
+	       default 1) and --clean (remove the shard outputs, markers, locks and sorted input after the merge)
+
+Requires numpy (binary trip records of the aggregation).
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import argparse
+import multiprocessing
+
+import ExtractTrips
+import ExternalSort
+import InputFiles
+import OutputWriter
+import Pipeline
+import PolygonIndex
+import SpatialAggregation
+import TripRecords
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+VERSION = 1                          #Version of the manifest
+MANIFEST = 'manifest.json'           #Name of the manifest in the shard directory
+SORTED = 'sorted.csv'                #Name of the sorted input file in the shard directory (unsorted input file)
+PATHS = ['polygons', 'index_cache', 'tmpdir', 'coast']     #Path parameters (absolute in the manifest)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Sharded execution on several hosts")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    split_parser = commands.add_parser("split", help="Split the input file in shards and write the manifest")
+    split_parser.add_argument("wdinput", help="Path of the input file")
+    split_parser.add_argument("wdshards", help="Shard directory (on the shared filesystem)")
+    split_parser.add_argument("n", type=int, help="Number of shards")
+    split_parser.add_argument("thd", type=float, help="Distance threshold (in meters)")
+    split_parser.add_argument("tht", type=float, help="Time threshold (in seconds)")
+    split_parser.add_argument("epsilon", type=float, help="Maximum distance between the simplified path and the original one")
+    split_parser.add_argument("--polygons", default=None, help="Path of the polygon layer")
+    split_parser.add_argument("--polygon-id", default="id", help="GeoJSON property of the Polygon ID")
+    split_parser.add_argument("--index-cache", default=None, help="Path of the cached spatial index")
+    split_parser.add_argument("--cell", type=float, default=None, help="Cell size of the grid (in meters)")
+    split_parser.add_argument("--trips", action="store_true", help="Write the trips of the aggregated shards")
+    split_parser.add_argument("--engine", choices=["loop", "numpy", "chunked"], default="loop", help="Trip segmentation engine")
+    split_parser.add_argument("--block-size", type=int, default=1000000, help="Minimum number of positions per block (numpy engine)")
+    split_parser.add_argument("--unsorted", action="store_true", help="Sort the input file by vessel ID and time first")
+    split_parser.add_argument("--memory", type=int, default=1024, help="Memory budget of a process (in MB)")
+    split_parser.add_argument("--tmpdir", default=None, help="Directory of the temporary files")
+    split_parser.add_argument("--precision", type=int, default=None, help="Number of decimals of X, Y, Delta_d and Theta")
+    split_parser.add_argument("--coast", default=None, help="Path of the raster of the distance to the coast (DistLand)")
+    split_parser.add_argument("--simplifier", choices=["rdp", "window", "visvalingam"], default="rdp",
+                              help="Simplification of the trips")
+    split_parser.add_argument("--index", action="store_true", help="Write the offset index of the merged outputs")
+
+    run_parser = commands.add_parser("run", help="Run shards of the manifest")
+    run_parser.add_argument("wdshards", help="Shard directory")
+    run_parser.add_argument("shards", type=int, nargs="*", help="Shard numbers (the shards not claimed if not given)")
+
+    status_parser = commands.add_parser("status", help="Status of the shards")
+    status_parser.add_argument("wdshards", help="Shard directory")
+
+    merge_parser = commands.add_parser("merge", help="Run the failed shards again and merge the shard outputs")
+    merge_parser.add_argument("wdshards", help="Shard directory")
+    merge_parser.add_argument("wdoutput", help="Path of the output file")
+    merge_parser.add_argument("--trips", default=None, help="Path of the trips file (aggregated shards)")
+    merge_parser.add_argument("--workers", type=int, default=1, help="Number of processes running the failed shards")
+    merge_parser.add_argument("--clean", action="store_true", help="Remove the shard files after the merge")
+
+    args = parser.parse_args()
+
+    if args.command == "split":
+
+        if args.polygons is not None and args.cell is not None:
+            sys.exit("Either a polygon layer (--polygons) or a cell size (--cell) can be given")
+
+        if args.trips and args.polygons is None and args.cell is None:
+            sys.exit("The --trips option requires an aggregation (--polygons or --cell)")
+
+        if not InputFiles.is_seekable(args.wdinput):
+            sys.exit("The shards require an uncompressed input file")
+
+        if args.n < 1:
+            sys.exit("The number of shards must be positive")
+
+        if args.memory < 1:
+            sys.exit("The memory budget (--memory) must be at least 1 MB")
+
+    if args.command == "merge" and not OutputWriter.is_csv(args.wdoutput):
+        sys.exit("The merged output must be a csv file")
+
+    print(" ")
+    print("Parameters:" + " " + args.command + " " + args.wdshards)
+    print(" ")
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Paths of the files of the k-th shard (aggregated trips, trips, binary trip records, marker and lock)
+def shard_paths(wdshards, k):
+    root = os.path.join(wdshards, 'shard' + str(k))
+    return {'output': root + '.csv', 'trips': root + '.trips.csv', 'records': root + TripRecords.EXTENSION,
+            'done': root + '.done', 'lock': root + '.lock'}
+
+#Hash of the content of a manifest (without its hash)
+def manifest_hash(manifest):
+    content = {name: value for name, value in manifest.items() if name != 'hash'}
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+#Write a json file atomically (written in a temporary file renamed once complete)
+def write_json(path, content):
+    with open(path + '.tmp', 'w') as json_file:
+        json.dump(content, json_file, indent=1)
+    os.replace(path + '.tmp', path)
+
+#Read the manifest of a shard directory
+def read_manifest(wdshards):
+    with open(os.path.join(wdshards, MANIFEST)) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('version') != VERSION or manifest.get('hash') != manifest_hash(manifest):
+        raise ValueError("Unsupported or modified manifest, split the input file again")
+    return manifest
+
+#Check that the input file of a manifest was not modified since the split (the byte ranges of the shards would no longer
+#fall at vessel ID boundaries)
+def check_input(manifest):
+    if not os.path.exists(manifest['input']) or os.path.getsize(manifest['input']) != manifest['size']:
+        raise ValueError("The input file " + manifest['input'] + " was modified since the split, split it again")
+
+#Split an input file in shards at vessel ID boundaries and write the manifest
+#Input: wdinput (path of the input file), wdshards (shard directory), n (number of shards), parameters (dictionary of
+#       the parameters and options of the run, see the command line), unsorted, memory and tmpdir (sort of an unsorted
+#       input file, see ExternalSort.py)
+#Output: the manifest (the paths are absolute, the shards can be run from any working directory)
+def split_input(wdinput, wdshards, n, parameters, unsorted=False, memory=1024, tmpdir=None):
+
+    os.makedirs(wdshards, exist_ok=True)
+    parameters = dict(parameters)
+    for name in PATHS:
+        if parameters.get(name) is not None:
+            parameters[name] = os.path.abspath(parameters[name])
+
+    #IF the input file is not sorted
+    #THEN sort it in the shard directory first
+    if unsorted:
+        wdsorted = os.path.join(wdshards, SORTED)
+        ExternalSort.sort_file(wdinput, wdsorted, memory, tmpdir)
+    else:
+        wdsorted = wdinput
+
+    #Build the cached spatial index once, before the processes read it
+    if parameters['polygons'] is not None:
+        PolygonIndex.open_index(parameters['polygons'], parameters['polygon_id'], parameters['index_cache'])
+
+    bounds = ExtractTrips.vessel_boundaries(wdsorted, n)
+    manifest = {'version': VERSION, 'input': os.path.abspath(wdsorted), 'size': os.path.getsize(wdsorted),
+                'parameters': parameters, 'shards': [[bounds[k], bounds[k+1]] for k in range(len(bounds) - 1)]}
+    manifest['hash'] = manifest_hash(manifest)
+    write_json(os.path.join(wdshards, MANIFEST), manifest)
+
+    return manifest
+
+#Test if the trips of a run are aggregated
+def is_aggregated(parameters):
+    return parameters['polygons'] is not None or parameters['cell'] is not None
+
+#Outputs of a shard (see shard_paths)
+def shard_outputs(parameters):
+    if not is_aggregated(parameters):
+        return ['trips']
+    return ['output', 'trips'] if parameters['trips'] else ['output']
+
+#Run the k-th shard of a manifest and write its marker
+def run_shard(wdshards, manifest, k):
+
+    start_time = time.time()
+    p = manifest['parameters']
+    paths = shard_paths(wdshards, k)
+    if os.path.exists(paths['done']):
+        os.remove(paths['done'])
+    start, end = manifest['shards'][k]
+
+    #Extract the trips (binary trip records of the aggregation and/or trips)
+    if is_aggregated(p):
+        wdtrips = [paths['records'], paths['trips']] if p['trips'] else [paths['records']]
+    else:
+        wdtrips = paths['trips']
+    ExtractTrips.extract_range(manifest['input'], start, end, wdtrips, p['thd'], p['tht'], p['epsilon'], p['engine'],
+                               p['block_size'], p['precision'], False, p['memory'], p['tmpdir'], p['coast'],
+                               p['simplifier'], p['index'])
+
+    #Aggregate the trips (see Pipeline.py)
+    if is_aggregated(p):
+        if p['polygons'] is not None:
+            index = PolygonIndex.open_index(p['polygons'], p['polygon_id'], p['index_cache'])
+            Pipeline.complete_records(paths['records'], index)
+        else:
+            Pipeline.complete_records(paths['records'], cell=p['cell'])
+        Pipeline.aggregate_records(paths['records'], paths['output'], p['precision'],
+                                   Pipeline.aggregation_engine(p['engine']), p['block_size'], index=p['index'],
+                                   header=False)
+        TripRecords.remove_records(paths['records'])
+
+    #Marker of the completed shard
+    sizes = {name: os.path.getsize(paths[name]) for name in shard_outputs(p)}
+    write_json(paths['done'], {'hash': manifest['hash'], 'sizes': sizes, 'host': socket.gethostname(),
+                               'seconds': time.time() - start_time})
+
+#Claim a shard (atomic creation of its lock file)
+#Output: True if the shard was not claimed yet
+def claim_shard(wdshards, k):
+    try:
+        fd = os.open(shard_paths(wdshards, k)['lock'], os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.write(fd, (socket.gethostname() + ' ' + str(os.getpid())).encode())
+    os.close(fd)
+    return True
+
+#Run shards of a shard directory, the shards not claimed yet if shards is None or empty
+def run_shards(wdshards, shards=None):
+    manifest = read_manifest(wdshards)
+    check_input(manifest)
+    if shards:
+        for k in shards:
+            run_shard(wdshards, manifest, k)
+    else:
+        for k in range(len(manifest['shards'])):
+            if not is_complete(wdshards, manifest, k) and claim_shard(wdshards, k):
+                run_shard(wdshards, manifest, k)
+
+#Test if the k-th shard is complete (marker of the manifest and outputs of the recorded size)
+def is_complete(wdshards, manifest, k):
+    paths = shard_paths(wdshards, k)
+    try:
+        with open(paths['done']) as done_file:
+            done = json.load(done_file)
+    except (OSError, ValueError):
+        return False
+    if done.get('hash') != manifest['hash']:
+        return False
+    for name in shard_outputs(manifest['parameters']):
+        if not os.path.exists(paths[name]) or os.path.getsize(paths[name]) != done['sizes'].get(name):
+            return False
+    return True
+
+#Shards of a shard directory not complete
+def failed_shards(wdshards, manifest):
+    return [k for k in range(len(manifest['shards'])) if not is_complete(wdshards, manifest, k)]
+
+#Status of the shards (complete, claimed and not run)
+#Output: a list of (shard, status, host, seconds)
+def shard_status(wdshards):
+
+    manifest = read_manifest(wdshards)
+    status = []
+    for k in range(len(manifest['shards'])):
+        paths = shard_paths(wdshards, k)
+        if is_complete(wdshards, manifest, k):
+            with open(paths['done']) as done_file:
+                done = json.load(done_file)
+            status.append((k, 'complete', done['host'], done['seconds']))
+        elif os.path.exists(paths['lock']):
+            with open(paths['lock']) as lock_file:
+                status.append((k, 'claimed', lock_file.read().split(' ')[0], None))
+        else:
+            status.append((k, 'not run', None, None))
+
+    return status
+
+#Run the failed shards again and merge the shard outputs in order
+#Input: wdshards (shard directory), wdoutput (path of the output file), wdtrips (path of the trips file of the aggregated
+#       shards, not written if None), workers (number of processes running the failed shards) and clean (remove the
+#       shard files)
+def merge_shards(wdshards, wdoutput, wdtrips=None, workers=1, clean=False):
+
+    manifest = read_manifest(wdshards)
+    check_input(manifest)
+    p = manifest['parameters']
+
+    #Failed shards
+    failed = failed_shards(wdshards, manifest)
+    if failed:
+        print("Running again shards: " + " ".join(map(str, failed)))
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                pool.starmap(run_shard, [(wdshards, manifest, k) for k in failed])
+        else:
+            for k in failed:
+                run_shard(wdshards, manifest, k)
+        failed = failed_shards(wdshards, manifest)
+        if failed:
+            raise RuntimeError("Incomplete shards: " + " ".join(map(str, failed)))
+
+    #Output files
+    writers = []
+    if is_aggregated(p):
+        writers.append(('output', SpatialAggregation.open_writer(wdoutput, p['precision'], p['index'])))
+        wdtrips = wdtrips if p['trips'] else None
+    else:
+        wdtrips = wdoutput
+    if wdtrips is not None:
+        index = ExtractTrips.INDEX if p['index'] else None
+        writers.append(('trips', OutputWriter.open_writer(wdtrips, ExtractTrips.COLUMNS, ExtractTrips.TYPES,
+                                                          p['precision'], ExtractTrips.FLOATS, index=index)))
+
+    #Merge the shards in order
+    for k in range(len(manifest['shards'])):
+        paths = shard_paths(wdshards, k)
+        for name, writer in writers:
+            writer.append_part(paths[name])
+    for name, writer in writers:
+        writer.close()
+
+    #Remove the shard files
+    if clean:
+        for k in range(len(manifest['shards'])):
+            paths = shard_paths(wdshards, k)
+            for name in shard_outputs(p):
+                OutputWriter.remove_part(paths[name])
+            for name in ('done', 'lock'):
+                if os.path.exists(paths[name]):
+                    os.remove(paths[name])
+        if os.path.exists(os.path.join(wdshards, SORTED)):
+            os.remove(os.path.join(wdshards, SORTED))
+
+# ****************************** MAIN *************************************************************************************************
+# *************************************************************************************************************************************
+
+if __name__ == "__main__":
+
+    if args.command == "split":
+
+        parameters = {'thd': args.thd, 'tht': args.tht, 'epsilon': args.epsilon, 'polygons': args.polygons,
+                      'polygon_id': args.polygon_id, 'index_cache': args.index_cache, 'cell': args.cell,
+                      'trips': args.trips, 'engine': args.engine, 'block_size': args.block_size, 'memory': args.memory,
+                      'tmpdir': args.tmpdir, 'precision': args.precision, 'coast': args.coast,
+                      'simplifier': args.simplifier, 'index': args.index}
+        manifest = split_input(args.wdinput, args.wdshards, args.n, parameters, args.unsorted, args.memory, args.tmpdir)
+        print(str(len(manifest['shards'])) + " shards")
+
+    elif args.command == "run":
+
+        run_shards(args.wdshards, args.shards)
+
+    elif args.command == "status":
+
+        for k, status, host, seconds in shard_status(args.wdshards):
+            print("Shard " + str(k) + ": " + status + ("" if host is None else " (" + host + ")") +
+                  ("" if seconds is None else " " + str(round(seconds, 1)) + " s"))
+
+    else:
+
+        merge_shards(args.wdshards, args.wdoutput, args.trips, args.workers, args.clean)
+
+    #End
+    print("End of the process")
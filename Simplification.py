@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+Alternative simplifications of the trips
+
+ExtractTrips.py flags the positions of the simplified trips (Simplified column) with the Ramer–Douglas–Peucker
+algorithm by default. Two other algorithms can be selected with the --simplifier option:
+
+	1. window: Opening window algorithm. The positions are read one by one from an anchor (the first position, then
+	   the last kept position), the window is extended while all the positions of the window are within epsilon
+	   meters of the line between the anchor and the current position. When a position is farther, the previous
+	   position is kept and becomes the new anchor. The window is also closed after MAXWINDOW positions, so the
+	   algorithm runs online in linear time with a bounded memory: the flags are known at most MAXWINDOW positions
+	   after the position. The memory of a trip is only bounded with the chunked engine of ExtractTrips.py, which feeds
+	   the window piece by piece from the spilled trips; the loop and numpy engines hold every trip in memory until it
+	   ends and simplify it then.
+	2. visvalingam: Visvalingam–Whyatt algorithm. The position with the smallest effective area (area of the
+	   triangle formed with its two neighbours) is removed until every remaining position has an area of at least
+	   epsilon² square meters (a triangle of base 2 epsilon and height epsilon), the areas are kept in a heap so the
+	   algorithm runs in O(n log n). The whole trip is needed.
+
+The first and last positions of a trip are always kept, every position is kept if epsilon is 0 or lower.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import math
+import heapq
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+MAXWINDOW = 256              #Maximum number of positions of an opening window
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+class OpeningWindow:
+
+    #Input: epsilon (maximum distance in meters between the simplified trip and the original one) and window (maximum
+    #       number of positions of a window)
+    def __init__(self, epsilon, window=MAXWINDOW):
+        self.epsilon = epsilon
+        self.window = window
+        self.anchor = None                   #Coordinates of the anchor
+        self.points = []                     #Positions of the window after the anchor
+
+    #Add the next position of the trip
+    #Output: the list of the flags known after this position (1 if the position is kept, 0 otherwise), in the order
+    #        of the positions
+    def push(self, x, y):
+
+        #First position
+        if self.anchor is None:
+            self.anchor = (x, y)
+            return [1]
+
+        if self.epsilon <= 0:
+            return [1]
+
+        flags = []
+        if len(self.points) >= self.window or not self.covers(x, y):
+            #Keep the previous position as the new anchor
+            flags = [0] * (len(self.points) - 1) + [1]
+            self.anchor = self.points[-1]
+            self.points = []
+
+        self.points.append((x, y))
+        return flags
+
+    #Test if the positions of the window are within epsilon of the line between the anchor and (x, y)
+    def covers(self, x, y):
+
+        x0, y0 = self.anchor
+        dx = x - x0
+        dy = y - y0
+        norm = math.sqrt(dx ** 2 + dy ** 2)
+
+        if norm == 0:
+            return all(math.sqrt((px - x0) ** 2 + (py - y0) ** 2) < self.epsilon for px, py in self.points)
+        bound = self.epsilon * norm
+        return all(abs(dx * (y0 - py) - (x0 - px) * dy) < bound for px, py in self.points)
+
+    #Close the trip (the last position is kept)
+    #Output: the list of the remaining flags
+    def close(self):
+        flags = [0] * (len(self.points) - 1) + [1] if self.points else []
+        self.anchor = None
+        self.points = []
+        return flags
+
+#Opening window simplification of a trip
+#Input: X, Y (lists or arrays of cartesian coordinates in meters), epsilon (maximum distance in meters) and window
+#       (maximum number of positions of a window)
+#Output: a list of length X giving for each position 1 if it is in the simplified trip and 0 otherwise
+def opening_window(X, Y, epsilon, window=MAXWINDOW):
+
+    if hasattr(X, 'tolist'):
+        X, Y = X.tolist(), Y.tolist()
+
+    simplifier = OpeningWindow(epsilon, window)
+    flags = []
+    for x, y in zip(X, Y):
+        flags.extend(simplifier.push(x, y))
+    flags.extend(simplifier.close())
+    return flags
+
+#Visvalingam–Whyatt simplification of a trip
+#Input: X, Y (lists or arrays of cartesian coordinates in meters) and epsilon (the positions whose effective area is
+#       lower than epsilon² square meters are removed)
+#Output: a list of length X giving for each position 1 if it is in the simplified trip and 0 otherwise
+def visvalingam(X, Y, epsilon):
+
+    if hasattr(X, 'tolist'):
+        X, Y = X.tolist(), Y.tolist()
+
+    n = len(X)
+    flags = [1] * n
+    if epsilon <= 0 or n < 3:
+        return flags
+    threshold = epsilon ** 2
+
+    #Area of the triangle formed by a position and its neighbours
+    def area(i, p, q):
+        return abs((X[p] - X[i]) * (Y[q] - Y[i]) - (X[q] - X[i]) * (Y[p] - Y[i])) / 2
+
+    #Neighbours of the remaining positions and heap of their effective areas (outdated entries are skipped)
+    previous = list(range(-1, n - 1))
+    following = list(range(1, n + 1))
+    areas = [0.0] + [area(i, i - 1, i + 1) for i in range(1, n - 1)] + [0.0]
+    heap = [(areas[i], i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+
+    while heap:
+
+        a, i = heapq.heappop(heap)
+        if flags[i] == 0 or a != areas[i]:
+            continue
+        if a >= threshold:
+            break
+
+        #Remove the position, the area of its neighbours is at least the area removed
+        flags[i] = 0
+        p, q = previous[i], following[i]
+        following[p] = q
+        previous[q] = p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                areas[j] = max(area(j, previous[j], following[j]), a)
+                heapq.heappush(heap, (areas[j], j))
+
+    return flags
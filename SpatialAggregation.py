@@ -16,7 +16,8 @@ and the previous one. The departure time is approximated by the time between the
 The algorithm takes as input a 8 columns csv file with column names (the value separator is a semicolon ";"). Each row of the file 
 represents a spatio-temporal position of a vessel's trip. 
 
-It is important to note that the table must be SORTED by Trip ID and by time, and each trip should be composed of at least 3 positions. 
+It is important to note that the table must be SORTED by Trip ID and by time (or see the --unsorted option), and each trip should be 
+composed of at least 3 positions. 
  
 	1. Trip ID
 	2. Unix Time
@@ -26,13 +27,58 @@ It is important to note that the table must be SORTED by Trip ID and by time, an
 	6. Speed 
 	7. Simplified: 1 if the position is on a simplified trip
                      0 otherwise
-	8. Polygon ID                    
+	8. Polygon ID (optional with the --polygons option)                    
  
 The algorithm has 2 parameters:
 
-	1. wdinput:  Path of the input file
+	1. wdinput:  Path of the input file ("-" for the standard input, gzip, bzip2 and xz csv files are decompressed on 
+	             the fly, see InputFiles.py)
 	2. wdoutput: Path of the output file
 
+and the following options:
+
+	--engine: Aggregation engine, "loop" (default) processes the positions one by one, "numpy" loads blocks of complete 
+	          trips into arrays and computes the runs of successive positions in the same polygon with boolean masks 
+	          (requires numpy). Both engines return exactly the same aggregated trips
+	--block-size: Minimum number of positions loaded in a block by the numpy engine (default 1000000)
+	--unsorted: The input file is not sorted, it is sorted by Trip ID and time with hash partitioning on disk first
+	--memory: Memory budget of the sort (in MB, default 1024)
+	--tmpdir: Directory of the temporary files of the sort (system default if not given)
+	--precision: Number of decimals of X, Y, Delta_d and Theta in the output file (shortest representation by default)
+	--id-min, --id-max: Range of Trip IDs read from a Parquet or Arrow input file, the row groups outside of the 
+	                    range are skipped
+	--polygons: Path of a polygon layer (GeoJSON or csv file of WKT, see PolygonIndex.py) in the same cartesian 
+	            coordinates. The Polygon ID of the positions is assigned with a spatial index ("NA" outside of the 
+	            polygons) in place of the 8th column (requires numpy)
+	--polygon-id: GeoJSON property of the Polygon ID (default "id")
+	--index-cache: Path of the cached spatial index (polygon layer path + ".index.npz" by default)
+	--stats: Path of a json file of run statistics (see Instrumentation.py): time spent parsing, aggregating, 
+	         computing the angles and writing, and numbers of positions, trips read, trips aggregated and polygon runs 
+	         dropped (aggregate positions without simplified position)
+	--progress: Interval (in seconds) between two progress lines (positions per second and estimated time remaining) 
+	            printed on the standard error
+	--profile: Path of a cProfile dump of the run (read with pstats)
+	--overlap: Read, parse and assign the Polygon IDs of the input file in a reader thread and write the csv output 
+	           file in a writer thread, connected to the aggregation by bounded queues of the given depth (default 8 
+	           batches, see Overlap.py)
+	--index: Write a sidecar index of the csv output file (byte offsets and minimum and maximum Unix Time of every 
+	         trip, and Polygon ID to trip postings, see OutputIndex.py) queried by trip, polygon and time without 
+	         scanning the output file
+	--tolerance: Tolerance of the simplification (in meters). The 7th column is the significance of the positions 
+	             (Significance column of ExtractTrips.py with the significance simplifier) in place of the Simplified 
+	             flag, a position is on the simplified trip if its significance is the tolerance or higher: the trips 
+	             extracted once are aggregated at any tolerance, with the same result as the Simplified flags of 
+	             ExtractTrips.py run with epsilon equal to the tolerance (csv, Parquet and Arrow input files)
+	--cache: Directory of a cache of the aggregated trips (see ResultCache.py), keyed by a hash of the positions of 
+	         the trip (with their Polygon ID) and of the version of the aggregation. The aggregated trips of the 
+	         unchanged trips are read from the cache, the other trips are aggregated by batches of block size 
+	         positions, the output is the same
+	--cache-size: Size limit of the cache (in MB, default 1024), the least recently used entries are removed
+
+Parquet (.parquet, .pq) and Arrow (.arrow, .feather) files can be used as input and output files in place of csv 
+files (requires pyarrow), the columns are the same. Binary trip records (.bin) completed with the Speed and Polygon ID 
+(see TripRecords.py and Pipeline.py) can be used as input file.
+
 The algorithm returns a 10 columns csv file with column names (the value separator is a semicolon ";"). Each row of the file represents 
 a spatio-temporal aggregate position of a vessel's simplified trip. 
 
@@ -49,6 +95,10 @@ a spatio-temporal aggregate position of a vessel's simplified trip.
                 Negative for left and positive for right.
 	10. Time: Time spent in the polygon (in seconds)                
 
+The script can also be imported as a module: aggregate_trips(positions) is a generator of the aggregated trips (tuples 
+of output columns) of an iterable of trip's positions (the 8 input columns), yielded as soon as they are complete 
+(by blocks with the numpy engine).
+
 Author: Maxime Lenormand (2016)
 """
 
@@ -56,232 +106,594 @@ Author: Maxime Lenormand (2016)
 # *****************************************************************************************************************************************
 
 import sys
-import math
+import time
+import argparse
+import itertools
+
+import ColumnarIO
+import ExternalSort
+import InputFiles
+import Instrumentation
+import Kinematics
+import OutputWriter
+import Overlap
+import PolygonIndex
+import ResultCache
+import TripRecords
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # ****************************** PARAMETRES ***********************************************************************************************
 # *****************************************************************************************************************************************
 
-wdinput = sys.argv[1]
-wdoutput = sys.argv[2]
+MINRUNS = 8                  #Number of runs below which the run sums are completed value by value (numpy engine)
+
+if __name__ == "__main__":
+    
+    parser = argparse.ArgumentParser(description="Spatial aggregation of vessel trips")
+    parser.add_argument("wdinput", help="Path of the input file (\"-\" for the standard input)")
+    parser.add_argument("wdoutput", help="Path of the output file")
+    parser.add_argument("--engine", choices=["loop", "numpy"], default="loop", help="Aggregation engine")
+    parser.add_argument("--block-size", type=int, default=1000000, help="Minimum number of positions per block (numpy engine)")
+    parser.add_argument("--unsorted", action="store_true", help="Sort the input file by Trip ID and time first")
+    parser.add_argument("--memory", type=int, default=1024, help="Memory budget of the sort (in MB)")
+    parser.add_argument("--tmpdir", default=None, help="Directory of the temporary files of the sort")
+    parser.add_argument("--precision", type=int, default=None, help="Number of decimals of X, Y, Delta_d and Theta")
+    parser.add_argument("--id-min", default=None, help="Smallest Trip ID read from a Parquet or Arrow input file")
+    parser.add_argument("--id-max", default=None, help="Largest Trip ID read from a Parquet or Arrow input file")
+    parser.add_argument("--polygons", default=None, help="Path of a polygon layer used to assign the Polygon ID")
+    parser.add_argument("--polygon-id", default="id", help="GeoJSON property of the Polygon ID")
+    parser.add_argument("--index-cache", default=None, help="Path of the cached spatial index")
+    parser.add_argument("--stats", default=None, help="Path of the json statistics of the run")
+    parser.add_argument("--progress", type=float, default=None, help="Interval between two progress lines (in seconds)")
+    parser.add_argument("--profile", default=None, help="Path of the cProfile statistics of the run")
+    parser.add_argument("--index", action="store_true", help="Write the offset index of the output file")
+    parser.add_argument("--overlap", type=int, nargs="?", const=Overlap.DEPTH, default=None, 
+                        help="Overlap reading, computing and writing (depth of the queues)")
+    parser.add_argument("--tolerance", type=float, default=None, 
+                        help="Tolerance of the simplification (in meters) applied to the significance of the positions")
+    parser.add_argument("--cache", default=None, help="Directory of the cache of the aggregated trips")
+    parser.add_argument("--cache-size", type=int, default=ResultCache.SIZE, help="Size limit of the cache (in MB)")
+    args = parser.parse_args()
+
+    wdinput = args.wdinput
+    wdoutput = args.wdoutput
+    engine = args.engine
+    block_size = args.block_size
+    unsorted = args.unsorted
+    memory = args.memory
+    tmpdir = args.tmpdir
+    precision = args.precision
+    id_min = args.id_min
+    id_max = args.id_max
+    wdpolygons = args.polygons
+    polygon_id = args.polygon_id
+    wdcache = args.index_cache
+    wdstats = args.stats
+    progress = args.progress
+    wdprofile = args.profile
+    index = args.index
+    overlap = args.overlap
+    tolerance = args.tolerance
+    wdresults = args.cache
+    cache_size = args.cache_size
+
+    if engine == "numpy" and np is None:
+        sys.exit("The numpy engine requires numpy")
+
+    if ColumnarIO.is_columnar(wdinput) and unsorted:
+        sys.exit("Parquet and Arrow input files must be sorted")
+
+    if memory < 1:
+        sys.exit("The memory budget (--memory) must be at least 1 MB")
+
+    if overlap is not None and overlap < 1:
+        sys.exit("The depth of the queues must be positive")
 
-print(" ") 
-print("Parameters:" + " "+ wdinput + " " + wdoutput)
-print(" ") 
+    if index and not OutputWriter.is_csv(wdoutput):
+        sys.exit("The index (--index) requires a csv output file")
+
+    if tolerance is not None and TripRecords.is_records(wdinput):
+        sys.exit("Binary trip records have no significance column (--tolerance)")
+
+    print(" ") 
+    print("Parameters:" + " "+ wdinput + " " + wdoutput)
+    print(" ")
 
 # ********************************************* LOAD FUNCTIONS ***************************************************************************
 # ****************************************************************************************************************************************
 
-#Euclidean distance bebween (x0, y0) and (x1, y1)
-def disteucl(x0, y0, x1, y1):
-    return  math.sqrt((x0 - x1) ** 2 + (y0 - y1) ** 2)
+#Trip's position attributes of the lines of a csv file, the 7th column is the significance of the positions if a 
+#tolerance is given (see tolerance_positions)
+def parse_positions(lines, tolerance=None):
+    for line in lines:
+        attr = line.rstrip('\n\r').split(';')                     #Split line
+        ID = attr[0]                                              #Trip ID
+        time = int(attr[1])                                       #Unix Time
+        x = float(attr[2].replace(',', '.'))                      #X cartesian coordinate
+        y = float(attr[3].replace(',', '.'))                      #Y cartesian coordinatecoordinate
+        land = float(attr[4].replace(',', '.'))                   #Distance to Land
+        speed = float(attr[5].replace(',', '.'))                  #Speed
+        if tolerance is None:
+            simpl = int(attr[6].replace(',', '.'))                #Simplified?    
+        else:
+            simpl = int(float(attr[6].replace(',', '.')) >= tolerance)    #Significance above the tolerance?
+        polID = attr[7] if len(attr) > 7 else None               #Polygon ID 
+        yield ID, time, x, y, land, speed, simpl, polID
 
-   
-# ****************************** MAIN *****************************************************************************************************
-# *****************************************************************************************************************************************
+#Simplified flag of trip's positions given with the significance of the positions (7th value, see the significance 
+#simplifier of ExtractTrips.py) in place of the flag: 1 if the significance is the tolerance or higher, 0 otherwise
+def tolerance_positions(positions, tolerance):
+    for p in positions:
+        yield p[:6] + (int(p[6] >= tolerance),) + tuple(p[7:])
 
-#Input file                                        
-input_file = open(wdinput)                                 #Open file 
-next(input_file)                                           #Skip column names
-
-input_file2 = open(wdinput)                                #Open the file again to detect the next vessel ID
-next(input_file2)                                          #Skip column names
-next(input_file2)                                          #Skip first position
-
-#Output file
-output_file = open(wdoutput,'w')
-output_file.write('Trip ID')
-output_file.write(';')
-output_file.write('ID polygon')
-output_file.write(';')
-output_file.write('Unix Time')
-output_file.write(';')
-output_file.write('X')
-output_file.write(';')
-output_file.write('Y')
-output_file.write(';')
-output_file.write('DistLand')
-output_file.write(';')
-output_file.write('Speed')
-output_file.write(';')
-output_file.write('Delta_t')
-output_file.write(';')
-output_file.write('Delta_d')
-output_file.write(';')
-output_file.write('Theta')
-output_file.write(';')
-output_file.write('Time')
-output_file.write('\n')
-
-#Firstline of the vessel trip 
-firstline = True
-
-#Looping through the file line by line
-for line in input_file:
+#Assign the Polygon ID of trip's positions by batches
+#Input: positions (iterable of trip's positions, see aggregate_positions), index (PolygonIndex of the polygon layer) 
+#       and batch_size (number of positions assigned at once)
+def assign_polygons(positions, index, batch_size=100000):
+    
+    batch = []
+    for position in itertools.chain(positions, [None]):
         
-    #Trip's position attributes
-    attr = line.rstrip('\n\r').split(';')                         #Split line
-    ID = attr[0]                                                  #Trip ID
-    time = int(attr[1])                                           #Unix Time
-    x = float(attr[2].replace(',', '.'))                          #X cartesian coordinate
-    y = float(attr[3].replace(',', '.'))                          #Y cartesian coordinatecoordinate
-    land = float(attr[4].replace(',', '.'))                       #Distance to Land
-    speed = float(attr[5].replace(',', '.'))                      #Speed
-    simpl = int(attr[6].replace(',', '.'))                        #Simplified?    
-    polID = attr[7]                                               #Polygon ID 
-    
-    #Next Trip ID
-    try:
-        attr = next(input_file2).rstrip('\n\r').split(';')
-        ID_next = attr[0]                                         #Vessel ID                                   
-    except(StopIteration):
-        ID_next = ID + "last"                                     #Fake ID if last line
-    
-    #IF first vessel's position 
-    #THEN initialize variables    
-    if firstline:
-
-        #Trip description
-        muT = [time]                            #Sum time based on successive positions in the polygon
-        minT = [time]                           #Arrival time to the polygon 
-        maxT = [time]                           #Departure time from the polygon       
-        muX = [x]                               #Sum X coordinate based on successive positions in the polygon
-        muY = [y]                               #Sum Y coordinate based on successive positions in the polygon
-        muL = [land]                            #Sum dist to land based on successive positions in the polygon
-        muSp = [speed]                          #Sum speed in the polygon
-        muSi = [simpl]                          #Number of positions in the simplified trip in the polygon 
-        P = [polID]                             #Polygon ID
-        count = [1]                             #Number of position in the polygon (to compute the averages)
+        if position is not None:
+            batch.append(position)
         
-        #Update firstline
-        firstline = False
-            
+        #IF the batch is full or last position
+        #THEN assign the Polygon IDs
+        if len(batch) >= batch_size or (position is None and batch):
+            polygons = index.assign([p[2] for p in batch], [p[3] for p in batch]).tolist()
+            for p, k in zip(batch, polygons):
+                yield p[:7] + (index.names[k] if k >= 0 else 'NA',)
+            batch = []
+
+#Output column names, types (Parquet and Arrow output) and float columns (fixed precision)
+COLUMNS = ['Trip ID', 'ID polygon', 'Unix Time', 'X', 'Y', 'DistLand', 'Speed', 'Delta_t', 'Delta_d', 'Theta', 'Time']
+TYPES = [None, None, 'float64', 'float64', 'float64', 'float64', 'float64', 'float64', 'float64', 'float64', 'float64']
+FLOATS = ['X', 'Y', 'Delta_d', 'Theta']
+INDEX = ['Trip ID']                          #Columns identifying a trip in the output index (see OutputIndex.py)
+POLYGON = 'ID polygon'                       #Polygon column of the polygon postings of the output index
+
+#Columns of the aggregate positions of a trip
+#Input: ID (trip ID), P (list of polygon IDs), muT, minT, maxT, muX, muY, muL, muSp (lists of sums, arrival and 
+#       departure times), count (list of numbers of positions in the polygons), stats (see Instrumentation.py, None 
+#       if not measured) and kinematics (lists Delta_t, Delta_d and Theta already computed by block, computed from 
+#       the averages if None)
+#Output: a tuple of the 11 output columns of the trip (lists of the same length)
+def trip_columns(ID, P, muT, minT, maxT, muX, muY, muL, muSp, count, stats=None, kinematics=None):
+    
+    n = len(P)
+    start = time.perf_counter() if stats is not None else None
+    
+    #Sum coordinates (the angle is computed with the sum coordinates of the next aggregate position)
+    sumX = muX
+    sumY = muY
+    
+    #Compute the average
+    muT = [muT[i] / count[i] for i in range(n)]
+    muX = [muX[i] / count[i] for i in range(n)]
+    muY = [muY[i] / count[i] for i in range(n)]
+    muL = [muL[i] / count[i] for i in range(n)]
+    muSp = [muSp[i] / count[i] for i in range(n)]
+    
+    #Interevent time, distance and angle (0 for the first and last aggregate positions, see Kinematics.py)
+    if kinematics is None:
+        Dt, Dd, Theta = Kinematics.trip_kinematics(muT, muX, muY, sumX, sumY)
     else:
+        Dt, Dd, Theta = kinematics
+    
+    #Compute time spent in the polygon                                                      
+    Time = [maxT[i] - minT[i] for i in range(n)]
+    
+    if stats is not None:
+        stats.add_time('angles', time.perf_counter() - start)
+        stats.count('trips_aggregated')
+    
+    return [ID] * n, P, muT, muX, muY, muL, muSp, Dt, Dd, Theta, Time
+
+#Write aggregated trips in the output file
+#Input: trips (iterable of trip columns, see trip_columns), writer (BatchWriter of the output file) and stats (see 
+#       Instrumentation.py, the time spent producing the trips is the time of the aggregation)
+def write_trips(trips, writer, stats=None):
+    if stats is None:
+        for trip in trips:
+            writer.write(*trip)
+    else:
+        for trip in stats.exclusive(trips, 'aggregation'):
+            with stats.timer('writing'):
+                writer.write(*trip)
+
+#Sums of runs of successive values, the values of a run are added one by one in order (same floating point sums as
+#the loop engine)
+#Input: values (array), starts (array of the index of the first value of every run) and counts (array of run lengths)
+#Output: an array of run sums
+def run_sums(values, starts, counts):
+    
+    #Runs sorted by decreasing length, the k-th values of the m first runs are added at once
+    order = np.argsort(-counts, kind='stable')
+    starts = starts[order]
+    counts = counts[order]
+    sums = values[starts]
+    k = 1
+    m = np.count_nonzero(counts > k)
+    while m > MINRUNS:
+        sums[:m] += values[starts[:m] + k]
+        k += 1
+        m = np.count_nonzero(counts[:m] > k)
+    
+    #Remaining values of the longest runs added one by one
+    for r in range(m):
+        total = sums[r]
+        for value in values[(starts[r] + k):(starts[r] + counts[r])].tolist():
+            total += value
+        sums[r] = total
+    
+    result = np.empty_like(sums)
+    result[order] = sums
+    return result
+
+#Aggregated trips of a block of trip's positions given as arrays (numpy engine)
+#Input: IDs, T, X, Y, L, Sp, Si, P (arrays of Trip ID, Unix Time, cartesian coordinates, distance to land, speed, 
+#       simplified flag and Polygon ID sorted by trip and time, the block ends at the end of a trip), last (True if 
+#       the block ends the input) and stats (see Instrumentation.py)
+#Output: a generator of aggregated trip columns (see trip_columns), returning the number of positions at the end of 
+#        the block still to be aggregated with the next block
+#The aggregated trips are the same as with the loop engine: the runs of successive positions in the same polygon 
+#are computed with boolean masks, a run without simplified position is dropped unless it is the last run of the 
+#trip, and a trip of a single position is aggregated with the next trip
+def array_trips(IDs, T, X, Y, L, Sp, Si, P, last=True, stats=None):
+    
+    n = len(T)
+    
+    #Trips and their number of positions
+    starts = np.flatnonzero(np.concatenate(([True], IDs[1:] != IDs[:-1])))
+    lengths = np.diff(np.append(starts, n))
+    
+    #Aggregated trips (a trip of a single position is aggregated with the next trip)
+    rest = 0
+    if (lengths == 1).any():
+        first = []
+        k = 0
+        while k < len(starts):
+            first.append(starts[k])
+            k += 2 if lengths[k] == 1 else 1
+        
+        #IF the last trip of a single position has no next trip
+        #THEN keep it for the next block (never written at the end of the input)
+        if k > len(starts):
+            n = first.pop()
+            rest = 0 if last else 1
+        starts = np.array(first, dtype=np.int64)
+    
+    if len(starts) == 0:
+        return rest
+    
+    #First and last positions of the trips
+    begin = np.zeros(n, dtype=bool)
+    begin[starts] = True
+    end = np.zeros(n, dtype=bool)
+    end[starts[1:] - 1] = True
+    end[n - 1] = True
+    
+    #Runs of successive positions in the same polygon
+    new = begin.copy()
+    new[1:] |= P[1:n] != P[:(n - 1)]
+    run_start = np.flatnonzero(new)
+    counts = np.diff(np.append(run_start, n))
+    run_end = run_start + counts - 1
+    trip = np.cumsum(begin)[run_start] - 1
+    
+    #Run sums
+    muT = run_sums(T[:n], run_start, counts)
+    muX = run_sums(X[:n], run_start, counts)
+    muY = run_sums(Y[:n], run_start, counts)
+    muL = run_sums(L[:n], run_start, counts)
+    muSp = run_sums(Sp[:n], run_start, counts)
+    muSi = np.add.reduceat(Si[:n], run_start)
+    
+    #Arrival and departure times (half way to the previous and next positions inside the trip)
+    previous = T[np.maximum(run_start - 1, 0)]
+    following = T[np.minimum(run_end + 1, n - 1)]
+    minT = np.where(begin[run_start], T[run_start], previous + (T[run_start] - previous) / 2)
+    maxT = np.where(end[run_end], T[run_end], T[run_end] + (following - T[run_end]) / 2)
+    
+    #Remove the runs without simplified position (except the last run of the trip)
+    keep = (muSi != 0) | end[run_end]
+    if stats is not None:
+        stats.count('polygon_runs_dropped', len(keep) - int(np.count_nonzero(keep)))
+    
+    #Lists of the kept runs, the time spent in a trip of a single run stays an integer as with the loop engine
+    single = begin[run_start] & end[run_end]
+    minT = [t if s else m for t, s, m in zip(T[run_start].tolist(), single.tolist(), minT.tolist())]
+    maxT = [t if s else m for t, s, m in zip(T[run_end].tolist(), single.tolist(), maxT.tolist())]
+    keep = np.flatnonzero(keep)
+    bounds = np.append(0, np.cumsum(np.bincount(trip[keep], minlength=len(starts))))
+    
+    #Interevent time, distance and angle of all the trips of the block (the angle uses the sums of the next run)
+    begin = time.perf_counter() if stats is not None else None
+    kinematics = Kinematics.kinematics(muT[keep] / counts[keep], muX[keep] / counts[keep], muY[keep] / counts[keep], 
+                                       bounds[:-1], bounds[1:], muX[keep], muY[keep])
+    if stats is not None:
+        stats.add_time('angles', time.perf_counter() - begin)
+    
+    columns = [column[keep].tolist() for column in (P[run_start], muT, muX, muY, muL, muSp, counts)]
+    Pk, muT, muX, muY, muL, muSp, counts = columns
+    minT = [minT[r] for r in keep.tolist()]
+    maxT = [maxT[r] for r in keep.tolist()]
+    bounds = bounds.tolist()
+    
+    for t, ID in enumerate(IDs[end[:n].nonzero()[0]].tolist()):
+        a, b = bounds[t], bounds[t + 1]
+        yield trip_columns(ID, Pk[a:b], muT[a:b], minT[a:b], maxT[a:b], muX[a:b], muY[a:b], muL[a:b], muSp[a:b], 
+                           counts[a:b], stats, Kinematics.kinematics_lists(*kinematics, a, b))
+    
+    return rest
 
-       #IF same polygon 
-       #THEN update trip by aggregation        
-       if polID == P[-1]:
+#Aggregated trips of positions loaded by blocks of complete trips (numpy engine)
+#Input: positions (iterable of trip's positions sorted by trip and time, see aggregate_trips), 
+#       block_size (minimum number of positions per block) and stats (see Instrumentation.py)
+#Output: a generator of aggregated trip columns (see trip_columns)
+def numpy_trips(positions, block_size, stats=None):
+    
+    if np is None:
+        raise ImportError("The numpy engine requires numpy")
+    
+    #Block of complete trips
+    block = []
+    
+    #Looping through the positions
+    for position in positions:
+        
+        #IF new trip
+        #THEN process the block if it is large enough
+        if len(block) >= block_size and position[0] != block[-1][0]:
+            rest = yield from array_trips(*block_arrays(block), last=False, stats=stats)
+            block = block[(len(block) - rest):]
+        
+        block.append(position)
+    
+    #Last block
+    if block:
+        yield from array_trips(*block_arrays(block), last=True, stats=stats)
+
+#Arrays of the columns of a block of trip's positions (Trip ID and Polygon ID as object arrays)
+def block_arrays(block):
+    IDs, T, X, Y, L, Sp, Si, P = zip(*block)
+    return (np.array(IDs, dtype=object), np.array(T), np.array(X, dtype=float), np.array(Y, dtype=float), 
+            np.array(L, dtype=float), np.array(Sp, dtype=float), np.array(Si), np.array(P, dtype=object))
+
+#Aggregated trips of positions processed one by one (loop engine)
+#Input: positions (iterable of trip's positions sorted by trip and time, see aggregate_trips, read in a single pass)
+#       and stats (see Instrumentation.py)
+#Output: a generator of aggregated trip columns (see trip_columns)
+def loop_trips(positions, stats=None):
+    
+    #Firstline of the vessel trip 
+    firstline = True
+
+    #Next position, read one position ahead to detect the last position of a trip
+    positions = iter(positions)
+    position_next = next(positions, None)
+
+    #Looping through the positions
+    while position_next is not None:
+    
+        ID, time, x, y, land, speed, simpl, polID = position_next
+        position_next = next(positions, None)
+    
+        #Next Trip ID (None if last position)
+        ID_next = None if position_next is None else position_next[0]
+    
+        #IF first vessel's position 
+        #THEN initialize variables    
+        if firstline:
+
+            #Trip description
+            muT = [time]                            #Sum time based on successive positions in the polygon
+            minT = [time]                           #Arrival time to the polygon 
+            maxT = [time]                           #Departure time from the polygon       
+            muX = [x]                               #Sum X coordinate based on successive positions in the polygon
+            muY = [y]                               #Sum Y coordinate based on successive positions in the polygon
+            muL = [land]                            #Sum dist to land based on successive positions in the polygon
+            muSp = [speed]                          #Sum speed in the polygon
+            muSi = [simpl]                          #Number of positions in the simplified trip in the polygon 
+            P = [polID]                             #Polygon ID
+            count = [1]                             #Number of position in the polygon (to compute the averages)
+        
+            #Update firstline
+            firstline = False
+            
+        else:
+
+           #IF same polygon 
+           #THEN update trip by aggregation        
+           if polID == P[-1]:
            
-           muT[-1] += time
-           maxT[-1] = time
-           muX[-1] += x
-           muY[-1] += y
-           muL[-1] += land
-           muSp[-1] += speed
-           muSi[-1] += simpl
-           count[-1] +=1
+               muT[-1] += time
+               maxT[-1] = time
+               muX[-1] += x
+               muY[-1] += y
+               muL[-1] += land
+               muSp[-1] += speed
+               muSi[-1] += simpl
+               count[-1] +=1
        
-       #ELSE add a position
-       else:
+           #ELSE add a position
+           else:
            
-           mint = maxT[-1]
-           maxT[-1] = maxT[-1] + (time - maxT[-1]) / 2
+               mint = maxT[-1]
+               maxT[-1] = maxT[-1] + (time - maxT[-1]) / 2
            
-           #Remove last position if not in the simplified trip
-           if muSi[-1] == 0:
-               muT = muT[:-1]
-               minT = minT[:-1]
-               maxT = maxT[:-1]
-               muX = muX[:-1]
-               muY = muY[:-1]
-               muL = muL[:-1]
-               muSp = muSp[:-1]
-               muSi = muSi[:-1]
-               P = P[:-1]
-               count = count[:-1]
-
-           muT = muT + [time]                            
-           minT = minT + [mint + (time - mint) / 2]                           
-           maxT = maxT + [time]                                   
-           muX = muX + [x]                             
-           muY = muY + [y]                             
-           muL = muL + [land]                            
-           muSp = muSp + [speed]                        
-           muSi = muSi + [simpl]                        
-           P = P + [polID]                          
-           count = count + [1]                                  
+               #Remove last position if not in the simplified trip
+               if muSi[-1] == 0:
+                   if stats is not None:
+                       stats.count('polygon_runs_dropped')
+                   muT.pop()
+                   minT.pop()
+                   maxT.pop()
+                   muX.pop()
+                   muY.pop()
+                   muL.pop()
+                   muSp.pop()
+                   muSi.pop()
+                   P.pop()
+                   count.pop()
+
+               #New aggregate position appended in place
+               muT.append(time)
+               minT.append(mint + (time - mint) / 2)
+               maxT.append(time)
+               muX.append(x)
+               muY.append(y)
+               muL.append(land)
+               muSp.append(speed)
+               muSi.append(simpl)
+               P.append(polID)
+               count.append(1)
        
-       #IF last position
-       #THEN write the output
-       if ID != ID_next:
-                      
-           for i in range(0, len(P)):
-               
-               #Compute the average
-               muT[i] = muT[i] / count[i]
-               muX[i] = muX[i] / count[i]
-               muY[i] = muY[i] / count[i]
-               muL[i] = muL[i] / count[i]
-               muSp[i] = muSp[i] / count[i]
-               
-               output_file.write(ID)                                   
-               output_file.write(';')
-               output_file.write(P[i])
-               output_file.write(';')
-               output_file.write(str(muT[i]))
-               output_file.write(';')
-               output_file.write(str(muX[i]))
-               output_file.write(';')
-               output_file.write(str(muY[i]))
-               output_file.write(';')
-               output_file.write(str(muL[i]))
-               output_file.write(';')
-               output_file.write(str(muSp[i]))
-               output_file.write(';')
-               
-               if i==0:
-                   output_file.write(str(0))     
-                   output_file.write(';')
-                   output_file.write(str(0))     
-                   output_file.write(';')
-                   output_file.write(str(0)) 
-                   output_file.write(';')
-
-               else:
-                   #Compute interevent time and distance                                                                                       
-                   output_file.write(str(muT[i] - muT[(i-1)]))
-                   output_file.write(';')
-                   output_file.write(str(disteucl(muX[i], muY[i], muX[(i-1)], muY[(i-1)])))
-                   output_file.write(';')
-
-                   if i == (len(P)-1):
-                       output_file.write(str(0))
-                       output_file.write(';')
-                   #Compute angle    
-                   else:
-                       #Coordinate and norm vector a and b
-                       Xa = muX[i]-muX[(i+1)]
-                       Ya = muY[i]-muY[(i+1)]          
-                       Xb = muX[i]-muX[(i-1)]
-                       Yb = muY[i]-muY[(i-1)]
-                       Na = math.sqrt(Xa**2+Ya**2);
-                       Nb = math.sqrt(Xb**2+Yb**2);
-                       
-                       #If same position
-                       if(Na==0 or Nb==0):
-                           output_file.write(str(0))
-                       else:    
-                           cos = (Xa*Xb+Ya*Yb)/(Na*Nb)
-                           if cos < -1:
-                               cos = -1
-                           if cos >1:
-                               cos = 1
-                               
-                           sin = (Xa*Yb-Ya*Xb)
-                           if sin < 0:
-                               output_file.write(str(180-math.acos(cos)*(180./math.pi)))
-                           else:
-                               output_file.write(str(-180+math.acos(cos)*(180./math.pi)))
-                       output_file.write(';')
-               #Compute time spent in the polygon                                                      
-               output_file.write(str(maxT[i] - minT[i])) 
-               output_file.write('\n')   
+           #IF last position
+           #THEN write the output
+           if ID != ID_next:
+           
+               yield trip_columns(ID, P, muT, minT, maxT, muX, muY, muL, muSp, count, stats)
                                  
-           firstline = True
-             
-#Close files
-input_file.close()
-input_file2.close()
-output_file.close()
-
-#End
-print("End of the process")  
+               firstline = True
+
+   
+#Aggregate the trips (streaming API)
+#Input: positions (iterable of trip's positions (Trip ID, Unix Time, X, Y, DistLand, Speed, Simplified, Polygon ID) 
+#       sorted by trip and time), stats (see Instrumentation.py), engine ("loop" or "numpy") and block_size (minimum 
+#       number of positions per block, numpy engine)
+#Output: a generator of aggregated trip columns (see trip_columns), the loop engine yields each trip as soon as it 
+#        ends while the numpy engine yields the trips by blocks
+def aggregate_trips(positions, stats=None, engine="loop", block_size=1000000):
+    if engine == "numpy":
+        return numpy_trips(positions, block_size, stats)
+    return loop_trips(positions, stats)
+
+#Cache of the aggregated trips (see ResultCache.py)
+#Input: wdresults (directory of the cache) and size (size limit in MB)
+def open_cache(wdresults, size=ResultCache.SIZE):
+    return ResultCache.ResultCache(wdresults, size, 'SpatialAggregation')
+
+#Aggregate the trips reusing the aggregated trips of the unchanged trips cached by a previous run, the trips being the 
+#groups of the cache (the input has no Vessel ID)
+#Input: positions, stats, engine and block_size (see aggregate_trips, minimum number of positions of a batch of trips 
+#       computed together) and cache (ResultCache, see open_cache)
+#Output: a generator of aggregated trip columns (see trip_columns), the same aggregated trips as aggregate_trips
+def cached_trips(positions, cache, stats=None, engine="loop", block_size=1000000):
+    
+    #Aggregated trips of the trips missing from the cache
+    def compute(batch):
+        results = {}
+        for trip in aggregate_trips(batch, stats, engine, block_size):
+            results.setdefault(trip[0][0], [[]])[0].append(trip)
+        return results
+    
+    for results in ResultCache.cached_results(positions, compute, cache, 1, block_size):
+        yield from results[0]
+
+#Writer of the aggregated trips (see OutputWriter.open_writer), indexed if index is True
+def open_writer(wdoutput, precision=None, index=False, header=True):
+    if index:
+        return OutputWriter.open_writer(wdoutput, COLUMNS, TYPES, precision, FLOATS, header, INDEX, POLYGON)
+    return OutputWriter.open_writer(wdoutput, COLUMNS, TYPES, precision, FLOATS, header)
+
+#Aggregate the trips of an input file and write them in the output file
+#Input: wdinput (path of the input file, csv, Parquet, Arrow or binary trip records), wdoutput (path of the output file), 
+#       the options of the command line, stats (see Instrumentation.py, None if not measured), index (index the csv 
+#       output file, see OutputIndex.py) and overlap (depth of the queues of the reader and writer threads, not 
+#       overlapped if None, see Overlap.py) and tolerance (the 7th input column is the significance of the positions, 
+#       see tolerance_positions, the Simplified flag if None) and cache (ResultCache of the aggregated trips, see 
+#       open_cache, not cached if None)
+def aggregate_file(wdinput, wdoutput, unsorted=False, memory=1024, tmpdir=None, precision=None, id_min=None, id_max=None, 
+                   wdpolygons=None, polygon_id="id", wdcache=None, engine="loop", block_size=1000000, stats=None,
+                   index=False, overlap=None, tolerance=None, cache=None):
+    
+    #Statistics of the reader thread (overlapped run)
+    reader_stats = stats
+    if overlap is not None and stats is not None:
+        reader_stats = Instrumentation.Stats(stats.progress)
+
+    #Positions of the input file
+    input_file = None
+    if ColumnarIO.is_columnar(wdinput) or TripRecords.is_records(wdinput):
+        if TripRecords.is_records(wdinput):
+            positions = TripRecords.read_positions(wdinput)
+        else:
+            positions = ColumnarIO.read_rows(wdinput, id_min, id_max)
+            if tolerance is not None:
+                positions = tolerance_positions(positions, tolerance)
+        if reader_stats is not None:
+            positions = reader_stats.positions(positions, 'trips_read')
+    else:
+        input_file = InputFiles.InputFile(wdinput)                 #Open file (read in a single pass)
+        next(input_file)                                           #Skip column names
+    
+        #IF the input file is not sorted
+        #THEN sort it on the fly
+        if unsorted:
+            input_lines = ExternalSort.sort_lines(input_file, memory, tmpdir, input_file.lines_size())
+            offset = None
+        else:
+            input_lines = input_file
+            offset = input_file.offset()
+    
+        positions = parse_positions(input_lines, tolerance)
+        if reader_stats is not None:
+            positions = reader_stats.positions(positions, 'trips_read', offset, input_file.size)
+    
+    #IF a polygon layer is given
+    #THEN assign the Polygon IDs
+    if wdpolygons is not None:
+        positions = assign_polygons(positions, PolygonIndex.open_index(wdpolygons, polygon_id, wdcache))
+
+    #Read ahead in a reader thread
+    if overlap is not None:
+        positions = Overlap.read_ahead(positions, overlap, stats=stats, reader_stats=reader_stats)
+
+    #Output file
+    writer = open_writer(wdoutput, precision, index)
+    if overlap is not None:
+        Overlap.overlap_writer(writer, overlap, stats)
+
+    if cache is None:
+        write_trips(aggregate_trips(positions, stats, engine, block_size), writer, stats)
+    else:
+        write_trips(cached_trips(positions, cache, stats, engine, block_size), writer, stats)
+
+    #Close files
+    if input_file is not None:
+        input_file.close()
+    if stats is None:
+        writer.close()
+    else:
+        with stats.timer('writing'):
+            writer.close()
+
+# ****************************** MAIN *****************************************************************************************************
+# *****************************************************************************************************************************************
+
+if __name__ == "__main__":
+    
+    stats = Instrumentation.Stats(progress) if (wdstats is not None or progress is not None) else None
+    cache = None if wdresults is None else open_cache(wdresults, cache_size)
+    
+    Instrumentation.profile(wdprofile, aggregate_file, wdinput, wdoutput, unsorted, memory, tmpdir, precision, id_min, 
+                            id_max, wdpolygons, polygon_id, wdcache, engine, block_size, stats, index, overlap, tolerance,
+                            cache)
+    
+    #Cache hits and misses
+    if cache is not None:
+        print(cache.summary())
+        if stats is not None:
+            cache.report(stats)
+    
+    #Statistics
+    if wdstats is not None:
+        stats.write(wdstats)
+
+    #End
+    print("End of the process")
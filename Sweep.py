@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parameter sweep of the trip extraction
+
+This script extracts the trips of an input file (see ExtractTrips.py) for many combinations of the parameters thd, tht
+and epsilon in a single pass: the vessel paths are parsed once and loaded by blocks of complete vessel paths into
+arrays shared by all the combinations (numpy engine). The trips are segmented once per (thd, tht) pair and simplified
+once per combination, the interevent time, distance and angle being computed once per (thd, tht) pair. With the
+significance simplifier (--simplifier significance, see ExtractTrips.py) the trips are simplified once per (thd, tht)
+pair for all the values of epsilon.
+
+The combinations are the cartesian product of the values given with --thd, --tht and --epsilon, or the rows of a
+csv file (--grid, 3 columns thd, tht and epsilon with column names). The script writes a summary csv file with one
+row per combination (the value separator is a semicolon ";"):
+
+	1. thd, tht, epsilon: Parameters of the combination
+	2. Trips: Number of trips
+	3. Trips dropped: Number of trips of two positions or less
+	4. Positions: Number of positions of the trips
+	5. Simplified positions: Number of positions of the simplified trips
+	6. Simplification ratio: Simplified positions / Positions
+	7. Mean positions, Mean duration, Mean distance: Mean number of positions, duration (in seconds) and distance
+	   traveled (in meters) of the trips
+
+The trips of every combination can also be written (--trips, output of ExtractTrips.py) in files whose path is a
+template with the fields {thd}, {tht} and {epsilon}, the output of a combination being the same as the output of
+ExtractTrips.py with its parameters.
+
+	python Sweep.py input.csv summary.csv --thd 2000 4000 8000 --tht 1800 3600 --epsilon 0 100 300
+	python Sweep.py input.csv summary.csv --grid grid.csv --trips trips_{thd}_{tht}_{epsilon}.csv
+
+with the following options:
+
+	--thd, --tht, --epsilon: Values of the parameters (in meters, seconds and meters)
+	--grid: Path of a csv file of combinations in place of --thd, --tht and --epsilon
+	--trips: Template of the paths of the trips of the combinations (summary only if not given)
+	--block-size, --unsorted, --memory, --tmpdir, --precision, --stats, --progress, --coast, --simplifier: See
+	          ExtractTrips.py
+
+Requires numpy.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import sys
+import argparse
+import itertools
+
+import numpy as np
+
+import CoastRaster
+import ColumnarIO
+import ExternalSort
+import ExtractTrips
+import InputFiles
+import Instrumentation
+import Kinematics
+import OutputWriter
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+SUMMARY = ['thd', 'tht', 'epsilon', 'Trips', 'Trips dropped', 'Positions', 'Simplified positions',
+           'Simplification ratio', 'Mean positions', 'Mean duration', 'Mean distance']
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Parameter sweep of the trip extraction")
+    parser.add_argument("wdinput", help="Path of the input file (\"-\" for the standard input)")
+    parser.add_argument("wdsummary", help="Path of the summary file")
+    parser.add_argument("--thd", type=float, nargs="+", default=None, help="Distance thresholds (in meters)")
+    parser.add_argument("--tht", type=float, nargs="+", default=None, help="Time thresholds (in seconds)")
+    parser.add_argument("--epsilon", type=float, nargs="+", default=None, help="Maximum distances of the simplification")
+    parser.add_argument("--grid", default=None, help="Path of a csv file of combinations (thd, tht, epsilon)")
+    parser.add_argument("--trips", default=None, help="Template of the paths of the trips ({thd}, {tht}, {epsilon})")
+    parser.add_argument("--block-size", type=int, default=1000000, help="Minimum number of positions per block")
+    parser.add_argument("--unsorted", action="store_true", help="Sort the input file by vessel ID and time first")
+    parser.add_argument("--memory", type=int, default=1024, help="Memory budget of the sort (in MB)")
+    parser.add_argument("--tmpdir", default=None, help="Directory of the temporary files of the sort")
+    parser.add_argument("--precision", type=int, default=None, help="Number of decimals of X, Y, Delta_d and Theta")
+    parser.add_argument("--stats", default=None, help="Path of the json statistics of the run")
+    parser.add_argument("--progress", type=float, default=None, help="Interval between two progress lines (in seconds)")
+    parser.add_argument("--coast", default=None, help="Path of the raster of the distance to the coast (DistLand)")
+    parser.add_argument("--simplifier", choices=["rdp", "window", "visvalingam", "significance"], default="rdp",
+                        help="Simplification of the trips")
+    args = parser.parse_args()
+
+    values = [args.thd, args.tht, args.epsilon]
+    if (args.grid is None and None in values) or (args.grid is not None and values != [None, None, None]):
+        sys.exit("Either a grid file (--grid) or the values of --thd, --tht and --epsilon must be given")
+
+    if ColumnarIO.is_columnar(args.wdinput) and args.unsorted:
+        sys.exit("Parquet and Arrow input files must be sorted")
+
+    if args.memory < 1:
+        sys.exit("The memory budget (--memory) must be at least 1 MB")
+
+    print(" ")
+    print("Parameters:" + " " + args.wdinput + " " + args.wdsummary)
+    print(" ")
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Combinations of a grid file (csv file of thd, tht and epsilon with column names)
+def read_grid(wdgrid):
+    with open(wdgrid) as grid_file:
+        next(grid_file)
+        return [tuple(float(value.replace(',', '.')) for value in line.rstrip('\n\r').split(';')[:3])
+                for line in grid_file if line.strip()]
+
+#Path of the trips of a combination
+def trips_path(template, thd, tht, epsilon):
+    return template.format(thd='%g' % thd, tht='%g' % tht, epsilon='%g' % epsilon)
+
+class Combination:
+
+    #Input: thd, tht, epsilon and writer (writer of the trips, None if not written)
+    def __init__(self, thd, tht, epsilon, writer=None):
+        self.thd = thd
+        self.tht = tht
+        self.epsilon = epsilon
+        self.writer = writer
+        self.trips = 0
+        self.dropped = 0
+        self.positions = 0
+        self.simplified = 0
+        self.duration = 0
+        self.distance = 0.0
+
+    #Summary row of the combination
+    def summary(self):
+        n = self.trips
+        return [self.thd, self.tht, self.epsilon, n, self.dropped, self.positions, self.simplified,
+                self.simplified / self.positions if self.positions else 0.0, self.positions / n if n else 0.0,
+                self.duration / n if n else 0.0, self.distance / n if n else 0.0]
+
+#Trips of a block of vessel paths for the combinations of a (thd, tht) pair
+#Input: block (IDs, V, T, X, Y, L, see ExtractTrips.block_trips), thd, tht, combinations (list of Combination of
+#       the pair), simplifier (see ExtractTrips.simplify) and stats (see Instrumentation.py)
+def sweep_block(block, thd, tht, combinations, simplifier="rdp", stats=None):
+
+    IDs, V, T, X, Y, L = block
+
+    #Trips of the pair, trips dropped counted apart
+    counter = Instrumentation.Stats()
+    starts, ends, IDtrips = ExtractTrips.segment_trips(V, T, L, thd, tht, counter)
+
+    #Duration and distance of the trips
+    steps = np.zeros(len(T))
+    steps[1:] = np.sqrt(np.float_power(X[1:] - X[:-1], 2) + np.float_power(Y[1:] - Y[:-1], 2))
+    traveled = np.cumsum(steps)
+    duration = int((T[ends - 1] - T[starts]).sum()) if len(starts) else 0
+    distance = float((traveled[ends - 1] - traveled[starts]).sum()) if len(starts) else 0.0
+    for combination in combinations:
+        combination.trips += len(starts)
+        combination.dropped += counter.counters.get('trips_dropped', 0)
+        combination.positions += int((ends - starts).sum())
+        combination.duration += duration
+        combination.distance += distance
+
+    #Interevent time, distance and angle of the trips, computed once for the written combinations
+    written = [combination for combination in combinations if combination.writer is not None]
+    kinematics = Kinematics.kinematics(T, X, Y, starts, ends) if written else None
+
+    for start, end, IDtrip in zip(starts.tolist(), ends.tolist(), IDtrips.tolist()):
+
+        if written:
+            columns = (T[start:end].tolist(), X[start:end].tolist(), Y[start:end].tolist(), L[start:end].tolist())
+            trip_kinematics = Kinematics.kinematics_lists(*kinematics, start, end)
+
+        #Significance of the positions computed once for all the combinations (significance simplifier)
+        if simplifier == "significance":
+            G = ExtractTrips.RDP_significance(X[start:end], Y[start:end], stats)
+
+        #Simplified trip of every combination
+        for combination in combinations:
+            if simplifier == "significance":
+                S = ExtractTrips.significant(G, combination.epsilon)
+                simplified = (S, G)
+            else:
+                S = simplified = ExtractTrips.simplify(X[start:end], Y[start:end], combination.epsilon, simplifier,
+                                                       stats)
+            combination.simplified += int(sum(S))
+            if combination.writer is not None:
+                combination.writer.write(*ExtractTrips.trip_columns(IDs[start], IDtrip, *columns, simplified, None,
+                                                                    trip_kinematics))
+
+#Sweep the combinations of parameters over positions
+#Input: positions (iterable of positions (Vessel ID, Unix Time, X, Y, DistLand) sorted by vessel and time),
+#       combinations (list of Combination), block_size (minimum number of positions per block), simplifier (see
+#       ExtractTrips.simplify) and stats (see Instrumentation.py)
+def sweep_positions(positions, combinations, block_size=1000000, simplifier="rdp", stats=None):
+
+    #Combinations by (thd, tht) pair
+    pairs = {}
+    for combination in combinations:
+        pairs.setdefault((combination.thd, combination.tht), []).append(combination)
+
+    for block in ExtractTrips.position_blocks(positions, block_size):
+        for (thd, tht), pair in pairs.items():
+            sweep_block(block, thd, tht, pair, simplifier, stats)
+
+#Sweep the combinations of parameters over an input file and write the summary (and the trips)
+#Input: wdinput (path of the input file), wdsummary (path of the summary file), grid (list of (thd, tht, epsilon)),
+#       template (template of the paths of the trips, summary only if None) and the options of the command line
+def sweep_file(wdinput, wdsummary, grid, template=None, block_size=1000000, unsorted=False, memory=1024, tmpdir=None,
+               precision=None, stats=None, wdcoast=None, simplifier="rdp"):
+
+    #Combinations and their output files
+    combinations = []
+    for thd, tht, epsilon in grid:
+        writer = None
+        if template is not None:
+            writer = OutputWriter.open_writer(trips_path(template, thd, tht, epsilon),
+                                              *ExtractTrips.output_columns(simplifier), precision, ExtractTrips.FLOATS)
+        combinations.append(Combination(thd, tht, epsilon, writer))
+
+    #Positions of the input file (parsed once)
+    coast = None if wdcoast is None else CoastRaster.open_raster(wdcoast)
+    input_file = None
+    if ColumnarIO.is_columnar(wdinput):
+        positions = ColumnarIO.read_rows(wdinput)
+        if stats is not None:
+            positions = stats.positions(positions)
+        if coast is not None:
+            positions = CoastRaster.assign_land(positions, coast)
+    else:
+        input_file = InputFiles.InputFile(wdinput)
+        next(input_file)                                           #Skip column names
+        if unsorted:
+            lines = ExternalSort.sort_lines(input_file, memory, tmpdir, input_file.lines_size())
+            positions = ExtractTrips.track_positions(lines, stats, coast=coast)
+        else:
+            positions = ExtractTrips.track_positions(input_file, stats, input_file, coast)
+
+    sweep_positions(positions, combinations, block_size, simplifier, stats)
+
+    if input_file is not None:
+        input_file.close()
+
+    #Output files
+    for combination in combinations:
+        if combination.writer is not None:
+            combination.writer.close()
+    with open(wdsummary, 'w') as summary_file:
+        summary_file.write(';'.join(SUMMARY) + '\n')
+        for combination in combinations:
+            summary_file.write(';'.join(map(str, combination.summary())) + '\n')
+
+# ****************************** MAIN *************************************************************************************************
+# *************************************************************************************************************************************
+
+if __name__ == "__main__":
+
+    if args.grid is not None:
+        grid = read_grid(args.grid)
+    else:
+        grid = list(itertools.product(args.thd, args.tht, args.epsilon))
+
+    stats = Instrumentation.Stats(args.progress) if (args.stats is not None or args.progress is not None) else None
+
+    sweep_file(args.wdinput, args.wdsummary, grid, args.trips, args.block_size, args.unsorted, args.memory, args.tmpdir,
+               args.precision, stats, args.coast, args.simplifier)
+
+    #Statistics
+    if args.stats is not None:
+        stats.write(args.stats)
+
+    #End
+    print("End of the process")
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Binary trip records
+
+Fixed-width binary file of the trip positions extracted by ExtractTrips.py (.bin), memory-mapped as a numpy structured
+array. The records can be completed in place with the Speed and Polygon ID of the positions (see Pipeline.py) and
+read by SpatialAggregation.py without parsing.
+
+Each record has the following fields:
+
+	1. vessel: Index of the vessel ID in the metadata
+	2. trip: Trip ID
+	3. time: Unix Time
+	4. x, y: Cartesian coordinates (in meters)
+	5. land: Distance from the nearest land (in meters)
+	6. delta_t, delta_d, theta: Interevent time, distance and angle (see ExtractTrips.py)
+	7. simplified: 1 if the position is on the simplified trip, 0 otherwise
+	8. speed: Speed (in meters per second), 0 until assigned
+	9. polygon: Index of the Polygon ID in the metadata, -1 until assigned
+
+The metadata (vessel IDs and Polygon IDs) is stored in a json file next to the records (.bin.json).
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import json
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+EXTENSION = '.bin'             #Extension of the binary trip records
+CHUNKSIZE = 1000000            #Number of records processed at once
+
+if np is not None:
+    DTYPE = np.dtype([('vessel', '<i4'), ('trip', '<i4'), ('time', '<i8'), ('x', '<f8'), ('y', '<f8'), ('land', '<f8'),
+                      ('delta_t', '<i8'), ('delta_d', '<f8'), ('theta', '<f8'), ('simplified', 'i1'), ('speed', '<f8'),
+                      ('polygon', '<i8')])
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Test if a path is a binary trip records file (based on its extension)
+def is_records(path):
+    return os.path.splitext(path)[1].lower() == EXTENSION
+
+#Raise an error if numpy is not installed
+def require_numpy():
+    if np is None:
+        raise ImportError("Binary trip records require numpy")
+
+#Read the metadata of binary trip records
+def read_metadata(path):
+    with open(path + '.json') as metadata_file:
+        return json.load(metadata_file)
+
+#Write the metadata of binary trip records
+def write_metadata(path, metadata):
+    with open(path + '.json', 'w') as metadata_file:
+        json.dump(metadata, metadata_file)
+
+#Memory-map binary trip records
+#Input: path and mode ('r' read only, 'r+' read and write)
+#Output: the structured array of the records and the metadata
+def open_records(path, mode='r'):
+    require_numpy()
+    if os.path.getsize(path) == 0:
+        records = np.zeros(0, dtype=DTYPE)
+    else:
+        records = np.memmap(path, dtype=DTYPE, mode=mode)
+    return records, read_metadata(path)
+
+#Remove binary trip records and their metadata (the files not written yet are skipped)
+def remove_records(path):
+    for wdfile in (path, path + '.json'):
+        if os.path.exists(wdfile):
+            os.remove(wdfile)
+
+#Trip's positions of binary trip records (see SpatialAggregation.py), the Trip ID is "Vessel ID_Trip ID"
+def read_positions(path):
+
+    records, metadata = open_records(path)
+    IDs = [str(ID) + '_' for ID in metadata['ids']]
+    polygons = metadata['polygons']
+
+    for start in range(0, len(records), CHUNKSIZE):
+        chunk = records[start:(start + CHUNKSIZE)]
+        for vessel, trip, time, x, y, land, speed, simpl, polygon in zip(chunk['vessel'].tolist(), chunk['trip'].tolist(),
+                                                                           chunk['time'].tolist(), chunk['x'].tolist(),
+                                                                           chunk['y'].tolist(), chunk['land'].tolist(),
+                                                                           chunk['speed'].tolist(),
+                                                                           chunk['simplified'].tolist(),
+                                                                           chunk['polygon'].tolist()):
+            yield IDs[vessel] + str(trip), time, x, y, land, speed, simpl, polygons[polygon] if polygon >= 0 else 'NA'
+
+class RecordWriter:
+
+    #Input: wdoutput (path of the output file) and columns (ExtractTrips.py output columns)
+    def __init__(self, wdoutput, columns):
+        require_numpy()
+        if len(columns) != 10:
+            raise ValueError("Binary trip records only store the output of ExtractTrips.py")
+        self.wdoutput = wdoutput
+        self.output_file = open(wdoutput, 'wb')
+        self.ids = []
+        self.index = {}
+
+    #Index of a vessel ID
+    def vessel_index(self, ID):
+        if ID not in self.index:
+            self.index[ID] = len(self.ids)
+            self.ids.append(ID)
+        return self.index[ID]
+
+    #Write rows given as columns of values (Vessel ID, Trip ID, Unix Time, X, Y, DistLand, Delta_t, Delta_d, Theta,
+    #Simplified)
+    def write(self, IDs, IDtrips, T, X, Y, L, Dt, Dd, Theta, S):
+        records = np.empty(len(T), dtype=DTYPE)
+        records['vessel'] = [self.vessel_index(ID) for ID in IDs]
+        records['trip'] = IDtrips
+        records['time'] = T
+        records['x'] = X
+        records['y'] = Y
+        records['land'] = L
+        records['delta_t'] = Dt
+        records['delta_d'] = Dd
+        records['theta'] = Theta
+        records['simplified'] = S
+        records['speed'] = 0.0
+        records['polygon'] = -1
+        self.output_file.write(records.tobytes())
+
+    #Write the records of a part written by another RecordWriter
+    def append_part(self, wdpart):
+        offset = len(self.ids)
+        for ID in read_metadata(wdpart)['ids']:
+            self.index.setdefault(ID, len(self.ids))
+            self.ids.append(ID)
+        records, metadata = open_records(wdpart)
+        for start in range(0, len(records), CHUNKSIZE):
+            chunk = np.array(records[start:(start + CHUNKSIZE)])
+            chunk['vessel'] += offset
+            self.output_file.write(chunk.tobytes())
+        del records
+
+    #Close the output file and write the metadata
+    def close(self):
+        self.output_file.close()
+        write_metadata(self.wdoutput, {'ids': self.ids, 'polygons': []})
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Trips spilled on disk
+
+The chunked engine of ExtractTrips.py reads the positions by chunks of a fixed number of positions within the memory
+budget (--memory option) and carries the trip still open at the end of a chunk over to the next chunk. A trip longer
+than half a chunk is not carried over in memory: its positions are appended to a temporary file until the trip ends,
+then the trip is simplified and written from the memory-mapped file by pieces of a chunk. The memory used by the
+chunked engine does not depend on the length of the trips.
+
+The positions are stored as little-endian binary records (Unix Time as a 64-bit integer, X, Y and DistLand as 64-bit
+floats), the Ramer–Douglas–Peucker flags of the trip (or the significance of its positions) in a second temporary file. The temporary files are removed
+once the trip is written.
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+if np is not None:
+    DTYPE = np.dtype([('time', '<i8'), ('x', '<f8'), ('y', '<f8'), ('land', '<f8')])
+else:
+    DTYPE = None
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+class TripSpill:
+
+    #Input: tmpdir (directory of the temporary files, system default if None)
+    def __init__(self, tmpdir=None):
+        if np is None:
+            raise ImportError("Spilling trips on disk requires numpy")
+        fd, self.path = tempfile.mkstemp(suffix=".spill", dir=tmpdir)
+        self.spill_file = os.fdopen(fd, 'wb')
+        self.tmpdir = tmpdir
+        self.wdflags = None
+        self.n = 0
+
+    #Append positions given as arrays of Unix Time, X, Y and DistLand
+    def append(self, T, X, Y, L):
+        records = np.empty(len(T), dtype=DTYPE)
+        records['time'] = T
+        records['x'] = X
+        records['y'] = Y
+        records['land'] = L
+        self.spill_file.write(records.tobytes())
+        self.n += len(records)
+
+    #Memory-mapped columns of the spilled positions (no position can be appended anymore)
+    #Output: four arrays of Unix Time, X, Y and DistLand
+    def columns(self):
+        self.spill_file.close()
+        records = np.memmap(self.path, dtype=DTYPE, mode='r', shape=(self.n,))
+        return records['time'], records['x'], records['y'], records['land']
+
+    #Memory-mapped array of n zeros (Ramer–Douglas–Peucker flags of the trip, or significance of its positions if dtype is
+    #a float type)
+    def flags(self, dtype=None):
+        fd, self.wdflags = tempfile.mkstemp(suffix=".flags", dir=self.tmpdir)
+        os.close(fd)
+        return np.memmap(self.wdflags, dtype=np.int8 if dtype is None else dtype, mode='w+', shape=(self.n,))
+
+    #Remove the temporary files
+    def remove(self):
+        self.spill_file.close()
+        for path in (self.path, self.wdflags):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
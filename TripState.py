@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+Open trips of incremental runs
+
+In incremental mode (--state option of ExtractTrips.py) the trip of a vessel is not closed at the last position of the
+vessel in the input file. The state of the trip detection of every vessel is saved in a checkpoint at the end of the
+run and restored when the vessel appears in the next input file, so that processing successive files (hourly files
+for example) gives the same trips as a single run over the concatenated data. The trips still open are closed at the
+end of the last run (--final option).
+
+The checkpoint is a json file holding the parameters of the runs (thd, tht and epsilon, which must be the same in
+every run) and the state of every vessel:
+
+	1. Vessel ID
+	2. IDtrip: Trip ID of the last trip written
+	3. time_old, x_old, y_old, land_old: Last position of the vessel
+	4. test_t_old, test_d_old: Time and distance tests of the last position
+	5. T, X, Y, L: Positions of the open trip (empty if the last position does not pass the tests)
+"""
+
+# ****************************** IMPORTS **********************************************************************************************
+# *************************************************************************************************************************************
+
+import os
+import json
+
+# ****************************** PARAMETRES *******************************************************************************************
+# *************************************************************************************************************************************
+
+VERSION = 1                  #Version of the checkpoint format
+
+# ********************************************* LOAD FUNCTIONS ***********************************************************************
+# ************************************************************************************************************************************
+
+#Read the vessel states of a checkpoint
+#Input: path (path of the checkpoint) and parameters (list of the parameters thd, tht and epsilon of the run)
+#Output: a dictionary giving the state of every vessel ID (empty if the checkpoint does not exist)
+def read_states(path, parameters):
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as state_file:
+        checkpoint = json.load(state_file)
+
+    if checkpoint['version'] != VERSION or checkpoint['parameters'] != list(parameters):
+        raise ValueError("The checkpoint " + path + " was written by a run with other parameters")
+
+    return {state[0]: state[1:] for state in checkpoint['states']}
+
+#Write the vessel states in a checkpoint, the previous checkpoint is replaced once the new one is complete
+#Input: path, parameters (see read_states) and states (dictionary giving the state of every vessel ID)
+def write_states(path, parameters, states):
+
+    with open(path + '.tmp', 'w') as state_file:
+        json.dump({'version': VERSION, 'parameters': list(parameters),
+                   'states': [[ID] + list(state) for ID, state in states.items()]}, state_file, separators=(',', ':'))
+
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the scripts, run from the root of the repository with:
+
+	python -m pytest -q
+
+The modules of the scripts are imported from the root of the repository and the command lines are run with the same
+Python interpreter (see run_script).
+"""
+
+import os
+import sys
+import subprocess
+import importlib.util
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, 'tests', 'data')
+
+sys.path.insert(0, ROOT)
+
+#Tests of the optional dependencies, skipped if the dependency is not installed
+NUMPY = pytest.mark.skipif(importlib.util.find_spec('numpy') is None, reason="requires numpy")
+PYARROW = pytest.mark.skipif(importlib.util.find_spec('pyarrow') is None, reason="requires pyarrow")
+
+#Golden data (see README.md): positions of 10 vessels, their trips (thd = 4000, tht = 3600 and epsilon = 300), the trip
+#positions tagged with cells of 5000 meters and their aggregated trips
+@pytest.fixture
+def positions_csv():
+    return os.path.join(DATA, 'positions.csv')
+
+@pytest.fixture
+def trips_csv():
+    return os.path.join(DATA, 'trips.csv')
+
+@pytest.fixture
+def trip_positions_csv():
+    return os.path.join(DATA, 'trip_positions.csv')
+
+@pytest.fixture
+def aggregated_csv():
+    return os.path.join(DATA, 'aggregated.csv')
+
+#Parameters thd, tht and epsilon of the golden trips
+@pytest.fixture
+def parameters():
+    return [4000, 3600, 300]
+
+#Run a script of the repository with its arguments (environment variables and bytes of the standard input), the output
+#of the script is returned, or its error output if the script is expected to fail
+def run_script(script, *args, env=None, fails=False, stdin=None):
+    result = subprocess.run([sys.executable, os.path.join(ROOT, script)] + [str(arg) for arg in args],
+                            capture_output=True, input=stdin, env=None if env is None else dict(os.environ, **env))
+    result.stdout, result.stderr = result.stdout.decode(errors='replace'), result.stderr.decode(errors='replace')
+    if fails:
+        assert result.returncode != 0, result.stdout
+        return result.stderr
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+#Content of a file
+def read(path):
+    with open(path, 'rb') as input_file:
+        return input_file.read()
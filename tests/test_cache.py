@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+from conftest import read, run_script
+
+#Run a script twice with a cache (cold and warm run), the outputs of both runs are compared with the golden output
+def cached_runs(tmp_path, script, wdinput, wdexpected, *args):
+    wdcache = tmp_path / 'cache'
+    summaries = []
+    for run in ('cold', 'warm'):
+        wdoutput = tmp_path / (run + '.csv')
+        stdout = run_script(script, wdinput, wdoutput, *args, '--cache', wdcache)
+        summaries.append([line for line in stdout.splitlines() if line.startswith("Cache: ")][0])
+        assert read(wdoutput) == read(wdexpected)
+    return summaries
+
+def test_extract_trips(tmp_path, positions_csv, trips_csv, parameters):
+    cold, warm = cached_runs(tmp_path, 'ExtractTrips.py', positions_csv, trips_csv, *parameters)
+    assert cold.startswith("Cache: 0 hits, 10 misses")
+    assert warm.startswith("Cache: 10 hits, 0 misses")
+
+def test_spatial_aggregation(tmp_path, trip_positions_csv, aggregated_csv):
+    cold, warm = cached_runs(tmp_path, 'SpatialAggregation.py', trip_positions_csv, aggregated_csv)
+    assert " 0 misses" in warm
+
+def test_pipeline(tmp_path, positions_csv, aggregated_csv, parameters):
+    cold, warm = cached_runs(tmp_path, 'Pipeline.py', positions_csv, aggregated_csv, *parameters, '--cell', 5000)
+    assert warm.startswith("Cache: 10 hits, 0 misses")
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import json
+import random
+
+import pytest
+
+from conftest import NUMPY, read, run_script
+
+import CoastRaster
+
+pytestmark = NUMPY
+
+np = CoastRaster.np
+
+#Distance (in cells) of every cell to the nearest land cell, cell by cell
+def brute_force(land):
+    cells = np.argwhere(land)
+    rows, cols = np.indices(land.shape)
+    distances = np.full(land.shape, np.inf)
+    for r, c in cells:
+        distances = np.minimum(distances, np.sqrt((rows - r) ** 2 + (cols - c) ** 2))
+    return distances
+
+@pytest.mark.parametrize('shape, density', [((1, 1), 1), ((1, 12), 0.2), ((12, 1), 0.2), ((17, 23), 0.02),
+                                            ((30, 30), 0.3), ((25, 40), 0.001)])
+def test_distance_transform(shape, density):
+    generator = np.random.default_rng(shape[0] * shape[1])
+    land = generator.random(shape) < density
+    land[generator.integers(shape[0]), generator.integers(shape[1])] = True
+    assert np.allclose(CoastRaster.distance_transform(land), brute_force(land))
+
+#Island of land: a square of 10 km, raster of 1 km cells with a margin of 5 km
+@pytest.fixture
+def raster(tmp_path):
+    wdland = tmp_path / 'land.csv'
+    wdland.write_text('ID;WKT\nisland;POLYGON ((0 0, 10000 0, 10000 10000, 0 10000, 0 0))\n')
+    wdraster = str(tmp_path / 'coast.raster')
+    CoastRaster.build_raster(str(wdland), wdraster, cell=1000, margin=5000)
+    return wdraster
+
+def test_build_raster(raster):
+    with open(raster + '.json') as grid_file:
+        grid = json.load(grid_file)
+    assert (grid['xmin'], grid['ymin'], grid['cell'], grid['ncols'], grid['nrows']) == (-5000, -5000, 1000, 20, 20)
+    coast = CoastRaster.open_raster(raster)
+    land = np.zeros((20, 20), dtype=bool)
+    land[5:15, 5:15] = True
+    assert np.allclose(coast.raster, np.maximum(brute_force(land) - 0.5, 0) * 1000)
+
+#Distances at the cell centers, interpolated between them and clamped outside of the raster
+def test_sample(raster):
+    coast = CoastRaster.open_raster(raster)
+    X = [4500, -2500, 12500, 5500, -4500, -50000, 4500, 16000]
+    Y = [4500, 4500, 4500, -3500, -4500, 4500, 1000000, -1000000]
+    expected = [0, 2500, 2500, 3500, 5000 * 2 ** 0.5 - 500, 4500, 4500, 5000 * 2 ** 0.5 - 500]
+    assert coast.sample(X, Y) == pytest.approx(expected, rel=1e-6)
+    assert coast.sample([-2000], [4500])[0] == pytest.approx(2000, rel=1e-6)
+    expected = 1000 * np.mean([18 ** 0.5, 13 ** 0.5, 13 ** 0.5, 8 ** 0.5]) - 500
+    assert coast.sample([-2000], [-2000])[0] == pytest.approx(expected, rel=1e-6)
+
+def test_assign_land(raster):
+    coast = CoastRaster.open_raster(raster)
+    generator = random.Random(0)
+    positions = [('V1', t, generator.uniform(-8000, 18000), generator.uniform(-8000, 18000), 1.0) for t in range(50)]
+    lands = coast.sample([p[2] for p in positions], [p[3] for p in positions]).tolist()
+    expected = [p[:4] + (land,) for p, land in zip(positions, lands)]
+    assert list(CoastRaster.assign_land(positions, coast, batch_size=7)) == expected
+    assert list(CoastRaster.assign_land([p[:4] for p in positions], coast)) == expected
+
+def test_open_raster(raster):
+    with open(raster + '.json') as grid_file:
+        grid = json.load(grid_file)
+    with open(raster + '.json', 'w') as grid_file:
+        json.dump(dict(grid, nrows=19), grid_file)
+    with pytest.raises(ValueError):
+        CoastRaster.open_raster(raster)
+    with open(raster + '.json', 'w') as grid_file:
+        json.dump(dict(grid, version=0), grid_file)
+    with pytest.raises(ValueError):
+        CoastRaster.open_raster(raster)
+
+def test_no_land(tmp_path):
+    wdland = tmp_path / 'land.csv'
+    wdland.write_text('ID;WKT\nisland;POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0))\n')
+    with pytest.raises(ValueError):
+        CoastRaster.build_raster(str(wdland), str(tmp_path / 'coast.raster'), cell=1000, 
+                                 extent=[20000, 20000, 30000, 30000])
+
+#The DistLand of the positions sampled from the raster (--coast) gives the trips of the positions with these distances
+def test_extract_trips(tmp_path, positions_csv, parameters):
+    with open(positions_csv, encoding='utf-8') as input_file:
+        header = input_file.readline()
+        lines = [line.rstrip('\n').split(';') for line in input_file]
+    X = [float(attr[2].replace(',', '.')) for attr in lines]
+    Y = [float(attr[3].replace(',', '.')) for attr in lines]
+    x0, y0 = min(X), min(Y)
+    wdland = tmp_path / 'land.csv'
+    wdland.write_text('ID;WKT\nland;POLYGON ((' + ', '.join(str(x) + ' ' + str(y) for x, y in 
+                      [(x0, y0), (x0 + 20000, y0), (x0, y0 + 20000), (x0, y0)]) + '))\n')
+    wdraster = tmp_path / 'coast.raster'
+    run_script('CoastRaster.py', wdland, wdraster, '--cell', 500, '--margin', 200000)
+
+    lands = CoastRaster.open_raster(str(wdraster)).sample(X, Y).tolist()
+    with open(tmp_path / 'positions.csv', 'w', encoding='utf-8') as output_file:
+        output_file.write(header)
+        for attr, land in zip(lines, lands):
+            output_file.write(';'.join(attr[:4] + [str(land)]) + '\n')
+    run_script('ExtractTrips.py', tmp_path / 'positions.csv', tmp_path / 'expected.csv', *parameters)
+    run_script('ExtractTrips.py', positions_csv, tmp_path / 'trips.csv', *parameters, '--coast', wdraster)
+    assert len(read(tmp_path / 'trips.csv').splitlines()) > 1
+    assert read(tmp_path / 'trips.csv') == read(tmp_path / 'expected.csv')
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from conftest import NUMPY, PYARROW, read, run_script
+
+import ColumnarIO
+import ExtractTrips
+import Kinematics
+
+pytestmark = PYARROW
+
+#Rows of the golden trips parsed with the types of the columns (the first Delta_d and Theta of a trip are written 0)
+def golden_trips(trips_csv):
+    types = [str, int, int, float, float, float, int, float, float, int]
+    with open(trips_csv) as trips_file:
+        next(trips_file)
+        return [tuple(cast(value) for cast, value in zip(types, line.rstrip('\n').split(';'))) for line in trips_file]
+
+#Positions of the csv file in a columnar file
+def write_positions(positions_csv, wdpositions):
+    with open(positions_csv) as input_file:
+        names = input_file.readline().rstrip('\n').split(';')
+        rows = [line.rstrip('\n').replace(',', '.').split(';') for line in input_file]
+    writer = ColumnarIO.ColumnarWriter(wdpositions, names, [None, 'int64', 'float64', 'float64', 'float64'])
+    writer.write([row[0] for row in rows], [int(row[1]) for row in rows], 
+                 *[[float(row[k]) for row in rows] for k in range(2, 5)])
+    writer.close()
+
+@pytest.mark.parametrize('engine', ['loop', pytest.param('numpy', marks=NUMPY), pytest.param('chunked', marks=NUMPY)])
+@pytest.mark.parametrize('extension', ['.parquet', '.arrow'])
+def test_input(tmp_path, positions_csv, trips_csv, parameters, extension, engine):
+    wdpositions = str(tmp_path / ('positions' + extension))
+    write_positions(positions_csv, wdpositions)
+    wdoutput = tmp_path / 'trips.csv'
+    run_script('ExtractTrips.py', wdpositions, wdoutput, *parameters, '--engine', engine)
+    assert read(wdoutput) == read(trips_csv)
+
+#The loop engine reads the rows of a columnar input file without numpy
+def test_input_without_numpy(tmp_path, monkeypatch, positions_csv, trips_csv, parameters):
+    wdpositions = str(tmp_path / 'positions.parquet')
+    write_positions(positions_csv, wdpositions)
+    monkeypatch.setattr(ExtractTrips, 'np', None)
+    monkeypatch.setattr(Kinematics, 'np', None)
+    wdoutput = tmp_path / 'trips.csv'
+    ExtractTrips.extract_file(wdpositions, str(wdoutput), *parameters, engine='loop')
+    assert read(wdoutput) == read(trips_csv)
+
+@pytest.mark.parametrize('extension', ['.parquet', '.arrow'])
+def test_output(tmp_path, positions_csv, trips_csv, parameters, extension):
+    wdoutput = tmp_path / ('trips' + extension)
+    run_script('ExtractTrips.py', positions_csv, wdoutput, *parameters)
+    assert list(ColumnarIO.read_rows(str(wdoutput))) == golden_trips(trips_csv)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+from conftest import NUMPY, read, run_script
+
+import ExtractTrips
+import ExternalSort
+import TripSpill
+
+#Smallest memory budget, the chunked engine reads chunks of MINCHUNK positions and carries the open trips over
+@pytest.mark.parametrize('engine', ['loop', pytest.param('numpy', marks=NUMPY), pytest.param('chunked', marks=NUMPY)])
+def test_engine(tmp_path, positions_csv, trips_csv, parameters, engine):
+    wdoutput = tmp_path / 'trips.csv'
+    run_script('ExtractTrips.py', positions_csv, wdoutput, *parameters, '--engine', engine, '--memory', 1)
+    assert read(wdoutput) == read(trips_csv)
+
+#Chunks of a few positions: the trips span several chunks and are spilled on disk
+@NUMPY
+def test_spilled_trips(tmp_path, monkeypatch, positions_csv, trips_csv, parameters):
+
+    spills = []
+    class CountedSpill(TripSpill.TripSpill):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            spills.append(self)
+    monkeypatch.setattr(TripSpill, 'TripSpill', CountedSpill)
+    monkeypatch.setattr(ExtractTrips, 'MINCHUNK', 4)
+    monkeypatch.setattr(ExtractTrips, 'POSITION_BYTES', 2 ** 30)
+
+    wdtmp = tmp_path / 'tmp'
+    wdtmp.mkdir()
+    wdoutput = tmp_path / 'trips.csv'
+    ExtractTrips.extract_file(positions_csv, str(wdoutput), *parameters, engine='chunked', memory=1, tmpdir=str(wdtmp))
+    assert len(spills) > 0
+    assert list(wdtmp.iterdir()) == []
+    assert read(wdoutput) == read(trips_csv)
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_workers(tmp_path, positions_csv, trips_csv, parameters, workers):
+    wdoutput = tmp_path / 'trips.csv'
+    run_script('ExtractTrips.py', positions_csv, wdoutput, *parameters, '--workers', workers)
+    assert read(wdoutput) == read(trips_csv)
+
+#Non-ASCII vessel ID with an ASCII locale: the processes decode their byte ranges as the single process
+@pytest.mark.parametrize('workers', [1, 2])
+def test_workers_encoding(tmp_path, positions_csv, trips_csv, parameters, workers):
+    renamed = read(positions_csv).replace(b'\nV003;', '\nV\u00e903;'.encode('utf-8'))
+    wdinput = tmp_path / 'positions.csv'
+    wdinput.write_bytes(renamed)
+    wdoutput = tmp_path / 'trips.csv'
+    ascii_locale = {'LC_ALL': 'C', 'PYTHONCOERCECLOCALE': '0', 'PYTHONUTF8': '0'}
+    run_script('ExtractTrips.py', wdinput, wdoutput, *parameters, '--workers', workers, env=ascii_locale)
+    assert read(wdoutput) == read(trips_csv).replace(b'\nV003;', '\nV\u00e903;'.encode('utf-8'))
+
+#Positions of the golden data shuffled in a file
+def shuffle_positions(positions_csv, wdinput):
+    with open(positions_csv) as input_file:
+        header = input_file.readline()
+        lines = input_file.readlines()
+    random.Random(0).shuffle(lines)
+    with open(wdinput, 'w') as output_file:
+        output_file.write(header + ''.join(lines))
+
+#Positions shuffled and sorted by the external sort (in memory)
+def test_unsorted(tmp_path, positions_csv, trips_csv, parameters):
+    wdinput = tmp_path / 'unsorted.csv'
+    shuffle_positions(positions_csv, wdinput)
+    wdoutput = tmp_path / 'trips.csv'
+    run_script('ExtractTrips.py', wdinput, wdoutput, *parameters, '--unsorted', '--memory', 1, '--tmpdir', tmp_path)
+    assert read(wdoutput) == read(trips_csv)
+
+#Rows of a csv file in the order of the first column (stable, the rows of a vessel keep their order)
+def by_vessel(path):
+    with open(path) as csv_file:
+        return sorted(csv_file, key=lambda line: line.split(';', 1)[0])
+
+#Lines 100 times larger in memory than on disk: the positions are spilled to hash partitions, and the partitions of 
+#the longest paths, larger than the memory budget, are sorted by runs merged from disk (the vessels are grouped but
+#not ordered across partitions)
+def test_unsorted_partitions(tmp_path, monkeypatch, positions_csv, trips_csv, parameters):
+
+    runs = []
+    write_run = ExternalSort.write_run
+    def counted_run(run, tmpdir):
+        runs.append(len(run))
+        return write_run(run, tmpdir)
+    monkeypatch.setattr(ExternalSort, 'write_run', counted_run)
+    monkeypatch.setattr(ExternalSort, 'OVERHEAD', 100)
+
+    wdinput = tmp_path / 'unsorted.csv'
+    shuffle_positions(positions_csv, wdinput)
+    wdtmp = tmp_path / 'tmp'
+    wdtmp.mkdir()
+    wdoutput = tmp_path / 'trips.csv'
+    ExtractTrips.extract_file(str(wdinput), str(wdoutput), *parameters, unsorted=True, memory=1, tmpdir=str(wdtmp))
+    assert len(runs) > 1
+    assert list(wdtmp.iterdir()) == []
+    assert by_vessel(wdoutput) == by_vessel(trips_csv)
+
+def test_memory_budget(tmp_path, positions_csv):
+    with open(positions_csv) as input_file:
+        with pytest.raises(ValueError):
+            list(ExternalSort.sort_lines(input_file, memory=0, tmpdir=str(tmp_path)))
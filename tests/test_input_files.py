@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import io
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+from conftest import read, run_script
+
+import InputFiles
+
+COMPRESSIONS = {'gzip': gzip.compress, 'bzip2': bz2.compress, 'xz': lzma.compress}
+
+#Compressed copy of a file, named .csv (the compression is detected from the first bytes)
+def compress(path, wdoutput, compression):
+    with open(wdoutput, 'wb') as output_file:
+        output_file.write(COMPRESSIONS[compression](read(path)))
+    return wdoutput
+
+@pytest.mark.parametrize('compression', list(COMPRESSIONS))
+def test_input_file(tmp_path, positions_csv, compression):
+    wdinput = compress(positions_csv, tmp_path / 'positions.csv', compression)
+    input_file = InputFiles.InputFile(str(wdinput))
+    assert input_file.compression == compression
+    assert input_file.lines_size() is None
+    assert ''.join(input_file) == read(positions_csv).decode('utf-8')
+    input_file.close()
+    assert not InputFiles.is_seekable(str(wdinput))
+
+def test_uncompressed(positions_csv):
+    input_file = InputFiles.InputFile(positions_csv)
+    assert input_file.compression is None
+    assert input_file.lines_size() == len(read(positions_csv))
+    assert next(input_file) == 'ID;Time;X;Y;DistLand\n'
+    assert input_file.offset()() > 0
+    input_file.close()
+    assert InputFiles.is_seekable(positions_csv)
+    assert not InputFiles.is_seekable(InputFiles.STDIN)
+
+#The standard input is read but left open
+def test_stdin(monkeypatch):
+    stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(gzip.compress('ID;Time\nVé1;1\n'.encode('utf-8')))))
+    monkeypatch.setattr('sys.stdin', stdin)
+    input_file = InputFiles.InputFile(InputFiles.STDIN)
+    assert (input_file.compression, input_file.lines_size(), input_file.offset()) == ('gzip', None, None)
+    assert list(input_file) == ['ID;Time\n', 'Vé1;1\n']
+    input_file.close()
+    assert not stdin.buffer.closed
+
+@pytest.mark.parametrize('compression', list(COMPRESSIONS) + [None])
+def test_extract_trips(tmp_path, positions_csv, trips_csv, parameters, compression):
+    wdinput = positions_csv if compression is None else compress(positions_csv, tmp_path / 'positions.csv', compression)
+    run_script('ExtractTrips.py', '-', tmp_path / 'trips.csv', *parameters, stdin=read(wdinput))
+    assert read(tmp_path / 'trips.csv') == read(trips_csv)
+    if compression is not None:
+        run_script('ExtractTrips.py', wdinput, tmp_path / 'trips.csv', *parameters)
+        assert read(tmp_path / 'trips.csv') == read(trips_csv)
+        stderr = run_script('ExtractTrips.py', wdinput, tmp_path / 'trips.csv', *parameters, '--workers', 2, fails=True)
+        assert 'uncompressed input file' in stderr
+
+@pytest.mark.parametrize('compression', list(COMPRESSIONS))
+def test_spatial_aggregation(tmp_path, trip_positions_csv, aggregated_csv, compression):
+    wdinput = compress(trip_positions_csv, tmp_path / 'trip_positions.csv', compression)
+    run_script('SpatialAggregation.py', wdinput, tmp_path / 'aggregated.csv')
+    assert read(tmp_path / 'aggregated.csv') == read(aggregated_csv)
+    run_script('SpatialAggregation.py', '-', tmp_path / 'aggregated.csv', stdin=read(wdinput))
+    assert read(tmp_path / 'aggregated.csv') == read(aggregated_csv)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+
+import pytest
+
+from conftest import NUMPY, run_script
+
+import Instrumentation
+
+def test_counters():
+    stats = Instrumentation.Stats()
+    stats.count('trips')
+    stats.count('trips', 3)
+    stats.maximum('depth', 4)
+    stats.maximum('depth', 2)
+    assert stats.counters == {'trips': 4, 'depth': 4}
+
+def test_timers():
+    stats = Instrumentation.Stats()
+    stats.add_time('parsing', 0.5)
+    stats.add_time('parsing', 0.25)
+    with stats.timer('writing'):
+        time.sleep(0.01)
+    assert stats.timers['parsing'] == 0.75
+    assert stats.timers['writing'] >= 0.01
+    assert stats.nested == stats.timers['parsing'] + stats.timers['writing']
+
+#The time of the stages nested in the production of the items is excluded from the timer of the iterable
+def test_exclusive():
+    stats = Instrumentation.Stats()
+    def items():
+        for k in range(3):
+            with stats.timer('nested'):
+                time.sleep(0.02)
+            yield k
+    assert list(stats.exclusive(items(), 'outer')) == [0, 1, 2]
+    assert stats.timers['nested'] >= 0.06
+    assert 0 <= stats.timers['outer'] < 0.02
+
+#Positions and IDs counted once the positions are read (also if the reading is interrupted), progress lines printed
+#every CHECK positions
+def test_positions(monkeypatch, capsys):
+    monkeypatch.setattr(Instrumentation, 'CHECK', 2)
+    stats = Instrumentation.Stats(progress=0)
+    positions = [('V1', 1), ('V1', 2), ('V2', 3), ('V1', 4), ('V3', 5)]
+    assert list(stats.positions(positions)) == positions
+    assert stats.counters == {'positions': 5, 'vessels': 4}
+    assert 'parsing' in stats.timers
+    assert capsys.readouterr().err.count('Progress: ') == 2
+
+    stats = Instrumentation.Stats()
+    read = stats.positions(positions, ids='trips_read')
+    next(read)
+    read.close()
+    assert stats.counters == {'positions': 1, 'trips_read': 1}
+
+#Statistics of the workers added to the statistics of the run
+def test_merge():
+    stats = Instrumentation.Stats()
+    stats.count('positions', 10)
+    stats.maximum('queue_max_depth', 3)
+    worker = {'timers': {'parsing': 1.0}, 'counters': {'positions': 5, 'queue_max_depth': 2}}
+    stats.merge(worker)
+    stats.merge(worker, nested=False)
+    assert stats.counters == {'positions': 20, 'queue_max_depth': 3}
+    assert stats.timers == {'parsing': 2.0}
+    assert stats.nested == 1.0
+
+def test_write(tmp_path):
+    stats = Instrumentation.Stats()
+    stats.count('positions', 10)
+    stats.write(tmp_path / 'stats.json')
+    with open(tmp_path / 'stats.json') as stats_file:
+        result = json.load(stats_file)
+    assert sorted(result) == ['counters', 'elapsed', 'positions_per_second', 'timers']
+    assert result['counters'] == {'positions': 10}
+    assert result['positions_per_second'] > 0
+
+def test_profile(tmp_path):
+    assert Instrumentation.profile(None, sorted, [2, 1]) == [1, 2]
+    assert Instrumentation.profile(str(tmp_path / 'run.prof'), sorted, [2, 1]) == [1, 2]
+    assert (tmp_path / 'run.prof').stat().st_size > 0
+
+#Counters of the command lines (--stats): 2146 positions of 10 vessels, 220 trips
+def read_stats(path):
+    with open(path) as stats_file:
+        return json.load(stats_file)
+
+@pytest.mark.parametrize('options', [[], ['--workers', 2], pytest.param(['--engine', 'numpy'], marks=NUMPY),
+                                     pytest.param(['--engine', 'chunked'], marks=NUMPY)])
+def test_extract_trips(tmp_path, positions_csv, parameters, options):
+    run_script('ExtractTrips.py', positions_csv, tmp_path / 'trips.csv', *parameters, '--stats', tmp_path / 'stats.json',
+               *options)
+    counters = read_stats(tmp_path / 'stats.json')['counters']
+    assert (counters['positions'], counters['vessels'], counters['trips']) == (2146, 10, 220)
+    assert counters['rdp_max_depth'] > 1
+
+@pytest.mark.parametrize('engine', ['loop', pytest.param('numpy', marks=NUMPY)])
+def test_spatial_aggregation(tmp_path, trip_positions_csv, engine):
+    run_script('SpatialAggregation.py', trip_positions_csv, tmp_path / 'aggregated.csv', '--engine', engine, 
+               '--stats', tmp_path / 'stats.json')
+    result = read_stats(tmp_path / 'stats.json')
+    counters = result['counters']
+    assert (counters['positions'], counters['trips_read'], counters['trips_aggregated']) == (894, 220, 220)
+    assert counters['polygon_runs_dropped'] == 6
+    assert 'aggregation' in result['timers']
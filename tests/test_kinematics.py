@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import math
+import random
+
+import pytest
+
+from conftest import NUMPY
+
+import Kinematics
+
+#Random trip with repeated positions, straight lines and U-turns
+def random_trip(n, seed=0):
+    generator = random.Random(seed)
+    T, X, Y = [1500000000], [500000.0], [800000.0]
+    for k in range(1, n):
+        move = generator.random()
+        T.append(T[-1] + generator.randrange(1, 900))
+        if move < 0.1:                                            #Same position
+            X.append(X[-1])
+            Y.append(Y[-1])
+        elif move < 0.2 and k > 1:                                #Straight line
+            X.append(2 * X[-1] - X[-2])
+            Y.append(2 * Y[-1] - Y[-2])
+        elif move < 0.3 and k > 1:                                #U-turn
+            X.append(X[-2])
+            Y.append(Y[-2])
+        else:
+            X.append(X[-1] + generator.uniform(-2000, 2000))
+            Y.append(Y[-1] + generator.uniform(-2000, 2000))
+    return T, X, Y
+
+#Angle of the position i computed with the formulas of the original script
+def angle(X, Y, i):
+    Xa, Ya = X[i] - X[i + 1], Y[i] - Y[i + 1]
+    Xb, Yb = X[i] - X[i - 1], Y[i] - Y[i - 1]
+    Na, Nb = (Xa ** 2 + Ya ** 2) ** 0.5, (Xb ** 2 + Yb ** 2) ** 0.5
+    if Na == 0 or Nb == 0:
+        return 0
+    cos = min(max((Xa * Xb + Ya * Yb) / (Na * Nb), -1), 1)
+    theta = math.degrees(math.acos(cos))
+    return 180 - theta if Xa * Yb - Ya * Xb < 0 else -180 + theta
+
+@pytest.mark.parametrize('n', [1, 2, 3, 50])
+def test_loop_kinematics(n):
+    T, X, Y = random_trip(n)
+    Dt, Dd, Theta = Kinematics.loop_kinematics(T, X, Y)
+    assert Dt == [0] + [T[i] - T[i - 1] for i in range(1, n)]
+    assert Dd == [0] + [Kinematics.disteucl(X[i], Y[i], X[i - 1], Y[i - 1]) for i in range(1, n)]
+    assert Theta[0] == 0 and Theta[-1] == 0
+    assert Theta[1:-1] == pytest.approx([angle(X, Y, i) for i in range(1, n - 1)])
+    assert all(-180 <= theta <= 180 for theta in Theta)
+
+#Same values and types with the vectorized kinematics
+@NUMPY
+@pytest.mark.parametrize('n', [1, 2, 3, 63, 64, 500])
+def test_trip_kinematics(monkeypatch, n):
+    T, X, Y = random_trip(n, n)
+    expected = Kinematics.loop_kinematics(T, X, Y)
+    result = Kinematics.kinematics_lists(*Kinematics.kinematics(T, X, Y), 0, n)
+    assert result == expected
+    assert [list(map(type, column)) for column in result] == [list(map(type, column)) for column in expected]
+    assert Kinematics.trip_kinematics(T, X, Y) == expected
+    monkeypatch.setattr(Kinematics, 'np', None)
+    assert Kinematics.trip_kinematics(T, X, Y) == expected
+    with pytest.raises(ImportError):
+        Kinematics.kinematics(T, X, Y)
+
+#Trips computed by blocks (starts and ends), the positions between the trips are ignored
+@NUMPY
+def test_blocks():
+    T, X, Y = random_trip(400, 1)
+    bounds = [(0, 1), (1, 60), (75, 77), (77, 200), (210, 400)]
+    Dt, Dd, Theta, flat = Kinematics.kinematics(T, X, Y, [start for start, end in bounds], [end for start, end in bounds])
+    for start, end in bounds:
+        assert (Kinematics.kinematics_lists(Dt, Dd, Theta, flat, start, end) == 
+                Kinematics.loop_kinematics(T[start:end], X[start:end], Y[start:end]))
+
+#Angles computed with the next position given by XA, YA (a piece of trip for example)
+@NUMPY
+def test_next_positions():
+    T, X, Y = random_trip(100, 2)
+    XA, YA = [x + 100 for x in X], [y - 50 for y in Y]
+    expected = Kinematics.loop_kinematics(T, X, Y, XA, YA)
+    assert Kinematics.kinematics_lists(*Kinematics.kinematics(T, X, Y, XA=XA, YA=YA), 0, 100) == expected
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from conftest import read, run_script
+
+import OutputIndex
+
+#Rows of a csv output file (lines without the column names)
+def rows(path):
+    with open(path, encoding='utf-8') as output_file:
+        return output_file.readlines()[1:]
+
+#Rows matching the options of a query, filtered one by one
+def filter_rows(lines, vessel=None, trip=None, polygon=None, start=None, end=None, aggregated=False):
+    selected = []
+    for line in lines:
+        attr = line.rstrip('\n').split(';')
+        ID, IDtrip = attr[0].rpartition('_')[::2] if aggregated else attr[:2]
+        t = float(attr[2])
+        if ((vessel is None or ID == vessel) and (trip is None or IDtrip == trip) and 
+            (polygon is None or attr[1] == polygon) and (start is None or t >= start) and (end is None or t <= end)):
+            selected.append(line)
+    return selected
+
+#Trips of the positions with a non-ASCII vessel ID, indexed
+@pytest.fixture
+def indexed_trips(tmp_path, positions_csv, parameters):
+    wdpositions = tmp_path / 'positions.csv'
+    wdpositions.write_bytes(read(positions_csv).replace(b'V003', 'Vé03'.encode('utf-8')))
+    wdoutput = tmp_path / 'trips.csv'
+    run_script('ExtractTrips.py', wdpositions, wdoutput, *parameters, '--index')
+    return wdoutput
+
+#Aggregated trips, indexed
+@pytest.fixture
+def indexed_aggregated(tmp_path, trip_positions_csv):
+    wdoutput = tmp_path / 'aggregated.csv'
+    run_script('SpatialAggregation.py', trip_positions_csv, wdoutput, '--index')
+    return wdoutput
+
+#Byte ranges and periods of the trips of the index
+def test_trip_index(indexed_trips, trips_csv):
+    content = read(indexed_trips)
+    assert content == read(trips_csv).replace(b'V003', 'Vé03'.encode('utf-8'))
+    trips = list(OutputIndex.read_trips(str(indexed_trips)))
+    assert len(trips) == 220
+    assert trips[0][1] == len(content.splitlines(keepends=True)[0])
+    assert trips[-1][2] == len(content)
+    for (key, first, last, tmin, tmax), following in zip(trips, trips[1:] + [None]):
+        lines = content[first:last].decode('utf-8').splitlines()
+        assert all(tuple(line.split(';')[:2]) == key for line in lines)
+        times = [int(line.split(';')[2]) for line in lines]
+        assert (tmin, tmax) == (min(times), max(times))
+        assert following is None or following[1] == last
+    assert ('Vé03', '1') in [trip[0] for trip in trips]
+
+#Same index written by the processes of a multi-process run
+def test_workers(tmp_path, indexed_trips, parameters):
+    wdoutput = tmp_path / 'workers.csv'
+    run_script('ExtractTrips.py', tmp_path / 'positions.csv', wdoutput, *parameters, '--index', '--workers', 3)
+    assert read(wdoutput) == read(indexed_trips)
+    assert read(str(wdoutput) + '.idx') == read(str(indexed_trips) + '.idx')
+
+#Polygon postings of the aggregated trips, sorted by polygon
+def test_postings(indexed_aggregated, aggregated_csv):
+    assert read(indexed_aggregated) == read(aggregated_csv)
+    expected = {}
+    for line in rows(aggregated_csv):
+        attr = line.split(';')
+        tmin, tmax = expected.get((attr[1], attr[0]), (float('inf'), float('-inf')))
+        expected[(attr[1], attr[0])] = (min(tmin, float(attr[2])), max(tmax, float(attr[2])))
+    postings = list(OutputIndex.read_postings(str(indexed_aggregated)))
+    assert {(polygon, key[0]): (tmin, tmax) for polygon, key, tmin, tmax in postings} == expected
+    assert [posting[0] for posting in postings] == sorted(posting[0] for posting in postings)
+    assert len(postings) == len(expected)
+
+@pytest.mark.parametrize('options', [{'vessel': 'Vé03'}, {'vessel': 'V000', 'trip': '2'}, {'trip': '1'},
+                                     {'start': 1500100000, 'end': 1500200000}, {'vessel': 'V005', 'end': 1500050000},
+                                     {'vessel': 'V999'}])
+def test_query_trips(tmp_path, indexed_trips, options):
+    expected = filter_rows(rows(indexed_trips), **options)
+    assert list(OutputIndex.query(str(indexed_trips), **options)) == expected
+    args = [argument for name, value in options.items() for argument in ('--' + name, value)]
+    run_script('OutputIndex.py', indexed_trips, *args, '--output', tmp_path / 'query.csv')
+    assert rows(tmp_path / 'query.csv') == expected
+    if options == {'vessel': 'Vé03'}:
+        assert len(expected) > 0
+
+@pytest.mark.parametrize('options', [{'polygon': '133_68'}, {'vessel': 'V003', 'trip': '15', 'polygon': '133_68'}, 
+                                     {'polygon': '133_68', 'start': 1500300000, 'end': 1501000000},
+                                     {'polygon': '0_126', 'start': 1503037000}, {'vessel': 'V002', 'trip': '1'},
+                                     {'start': 1500100000, 'end': 1500200000}, {'polygon': 'none'}])
+def test_query_aggregated(tmp_path, indexed_aggregated, options):
+    expected = filter_rows(rows(indexed_aggregated), aggregated=True, **options)
+    assert list(OutputIndex.query(str(indexed_aggregated), **options)) == expected
+    args = [argument for name, value in options.items() for argument in ('--' + name, value)]
+    stdout = run_script('OutputIndex.py', indexed_aggregated, *args)
+    assert stdout.splitlines(keepends=True)[1:] == expected
+
+def test_missing_index(tmp_path, indexed_trips, trips_csv):
+    assert 'No index' in run_script('OutputIndex.py', trips_csv, '--vessel', 'V000', fails=True)
+    assert 'No polygon postings' in run_script('OutputIndex.py', indexed_trips, '--polygon', 'P', fails=True)
+    OutputIndex.remove_index(str(indexed_trips))
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith('trips.csv.')] == []
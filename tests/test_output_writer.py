@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import OutputWriter
+
+COLUMNS = ['Vessel ID', 'Unix Time', 'X', 'Simplified']
+
+#Text file object kept open after close (content read by the test)
+class MemoryFile(io.StringIO):
+    def close(self):
+        pass
+
+#Rows written one by one with str(), as the original scripts
+def row_lines(values, header=True):
+    lines = [';'.join(COLUMNS) + '\n'] if header else []
+    return ''.join(lines + [';'.join(str(v) for v in row) + '\n' for row in zip(*values)])
+
+VALUES = [['V1', 'V1', 'V2'], [1500000000, 1500000300, 1500000600], [0.1 + 0.2, 12.0, -3.25], [1, 0, 1]]
+
+def test_str():
+    output_file = MemoryFile()
+    writer = OutputWriter.BatchWriter(output_file, COLUMNS)
+    writer.write(*VALUES)
+    writer.close()
+    assert output_file.getvalue() == row_lines(VALUES)
+
+#Fixed precision of the float columns only
+def test_precision():
+    output_file = MemoryFile()
+    writer = OutputWriter.BatchWriter(output_file, COLUMNS, header=False, precision=2, floats=['X'])
+    writer.write(*VALUES)
+    writer.close()
+    assert output_file.getvalue() == "V1;1500000000;0.30;1\nV1;1500000300;12.00;0\nV2;1500000600;-3.25;1\n"
+
+#Batches written in the output file once the buffer holds chunksize characters
+def test_chunks():
+    output_file = MemoryFile()
+    writer = OutputWriter.BatchWriter(output_file, COLUMNS, chunksize=80)
+    writer.write(*[column[:1] for column in VALUES])
+    assert output_file.getvalue() == ''
+    writer.write(*[column[1:] for column in VALUES])
+    assert output_file.getvalue() == row_lines(VALUES)
+    writer.close()
+    assert output_file.getvalue() == row_lines(VALUES)
+
+#Parts written without header by other writers and appended in order
+def test_parts(tmp_path):
+    wdoutput = str(tmp_path / 'output.csv')
+    for k in range(2):
+        part = OutputWriter.open_writer(OutputWriter.part_path(wdoutput, k), COLUMNS, None, header=False)
+        part.write(*[column[k:k+2] for column in VALUES])
+        part.close()
+    writer = OutputWriter.open_writer(wdoutput, COLUMNS, None)
+    for k in range(2):
+        writer.append_part(OutputWriter.part_path(wdoutput, k))
+        OutputWriter.remove_part(OutputWriter.part_path(wdoutput, k))
+    writer.close()
+    with open(wdoutput) as output_file:
+        assert output_file.read() == row_lines([column[0:2] + column[1:3] for column in VALUES])
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['output.csv']
+
+def test_multiple_files(tmp_path):
+    wdoutputs = [str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv')]
+    writer = OutputWriter.open_writer(wdoutputs, COLUMNS, None)
+    writer.write(*VALUES)
+    writer.close()
+    for wdoutput in wdoutputs:
+        with open(wdoutput) as output_file:
+            assert output_file.read() == row_lines(VALUES)
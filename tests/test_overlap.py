@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from conftest import read, run_script
+
+import Overlap
+
+#Consume the items read ahead in another thread, the test fails instead of hanging
+def consume(consumer, seconds=10):
+    outcome = {}
+    def run():
+        try:
+            outcome['items'] = consumer()
+        except BaseException as error:
+            outcome['error'] = error
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "read_ahead did not stop"
+    return outcome
+
+def test_items_in_order():
+    outcome = consume(lambda: list(Overlap.read_ahead(range(25), depth=1, batch_size=10)))
+    assert outcome['items'] == list(range(25))
+
+@pytest.mark.parametrize('n', [10, 15, 25, 1000])
+def test_consumer_error_stops_the_reader(n):
+    def consumer():
+        for item in Overlap.read_ahead(range(n), depth=1, batch_size=10):
+            raise RuntimeError("consumer")
+    for k in range(20):
+        outcome = consume(consumer)
+        assert isinstance(outcome['error'], RuntimeError)
+    assert [thread for thread in threading.enumerate() if thread.name == "reader"] == []
+
+def test_reader_error_is_raised():
+    def items():
+        yield from range(15)
+        raise ValueError("reader")
+    outcome = consume(lambda: list(Overlap.read_ahead(items(), depth=1, batch_size=10)))
+    assert isinstance(outcome['error'], ValueError)
+
+@pytest.mark.parametrize('depth', [1, 8])
+def test_extract_trips(tmp_path, positions_csv, trips_csv, parameters, depth):
+    wdoutput = tmp_path / 'trips.csv'
+    run_script('ExtractTrips.py', positions_csv, wdoutput, *parameters, '--overlap', depth)
+    assert read(wdoutput) == read(trips_csv)
+
+@pytest.mark.parametrize('depth', [1, 8])
+def test_spatial_aggregation(tmp_path, trip_positions_csv, aggregated_csv, depth):
+    wdoutput = tmp_path / 'aggregated.csv'
+    run_script('SpatialAggregation.py', trip_positions_csv, wdoutput, '--overlap', depth)
+    assert read(wdoutput) == read(aggregated_csv)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import os
+import math
+
+import pytest
+
+from conftest import NUMPY, read, run_script
+
+import Pipeline
+
+#Positions of a few vessels sailing a zigzag path with a stop and port calls, sorted by vessel and time
+def synthetic_positions():
+    for vessel in range(3):
+        t = 1500000000
+        for k in range(200):
+            t += 600 if k != 100 else 7200
+            x = 10000 * vessel + 300 * k
+            y = 2000 * math.sin(k / 7) + 50 * (k % 3)
+            yield 'V' + str(vessel), t, x, y, (5000.0 + 10 * k if k % 50 else 100.0)
+
+#Aggregated trips as lists of values
+def aggregate(**options):
+    trips = Pipeline.stream_trips(synthetic_positions(), 4000, 3600, 300, **options)
+    return [[list(column) for column in trip] for trip in trips]
+
+@pytest.mark.parametrize('engine', ['loop', 'numpy'])
+def test_stream_trips_significance(engine):
+    expected = aggregate(cell=5000, engine=engine)
+    assert len(expected) > 3
+    assert aggregate(cell=5000, engine=engine, simplifier='significance') == expected
+
+#Trips and aggregated trips of the fused run over the binary trip records (kept with --records)
+@NUMPY
+@pytest.mark.parametrize('engine', ['loop', 'numpy'])
+def test_records(tmp_path, positions_csv, trips_csv, aggregated_csv, parameters, engine):
+    wdrecords = tmp_path / 'records.bin'
+    run_script('Pipeline.py', positions_csv, tmp_path / 'aggregated.csv', *parameters, '--cell', 5000, '--engine', engine,
+               '--trips', tmp_path / 'trips.csv', '--records', wdrecords)
+    assert os.path.getsize(wdrecords) > 0
+    assert read(tmp_path / 'aggregated.csv') == read(aggregated_csv)
+    assert read(tmp_path / 'trips.csv') == read(trips_csv)
+
+#The temporary binary trip records are removed when the run fails (missing polygon layer after the extraction)
+@NUMPY
+def test_temporary_records(tmp_path, positions_csv, parameters):
+    stderr = run_script('Pipeline.py', positions_csv, tmp_path / 'aggregated.csv', *parameters, 
+                        '--polygons', tmp_path / 'missing.geojson', '--tmpdir', tmp_path, fails=True)
+    assert 'FileNotFoundError' in stderr
+    assert [path.name for path in tmp_path.iterdir() if path.name.endswith(('.bin', '.bin.json'))] == []
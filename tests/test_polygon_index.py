@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import json
+import random
+
+import pytest
+
+from conftest import NUMPY
+
+import PolygonIndex
+
+pytestmark = NUMPY
+
+#Polygons of the layer: a square, an L-shaped polygon, a square with a hole, a multipolygon of two triangles and a 
+#square overlapping the first one
+POLYGONS = {
+    'square': [[(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]],
+    'L': [[(20, 0), (40, 0), (40, 10), (30, 10), (30, 30), (20, 30), (20, 0)]],
+    'hole': [[(0, 20), (15, 20), (15, 35), (0, 35), (0, 20)], [(5, 25), (10, 25), (10, 30), (5, 30), (5, 25)]],
+    'triangles': [[(50, 0), (60, 0), (50, 10), (50, 0)], [(60, 20), (60, 30), (50, 30), (60, 20)]],
+    'overlap': [[(5, 5), (18, 5), (18, 15), (5, 15), (5, 5)]],
+}
+
+#Even-odd ray casting of a position, position by position
+def contains(rings, x, y):
+    inside = False
+    for ring in rings:
+        for (x1, y1), (x2, y2) in zip(ring[:-1], ring[1:]):
+            if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+                inside = not inside
+    return inside
+
+#First polygon containing a position, -1 if none
+def reference(x, y):
+    for k, rings in enumerate(POLYGONS.values()):
+        if contains(rings, x, y):
+            return k
+    return -1
+
+#Random positions around the layer (off the edges, with coordinates at a quarter of a meter)
+def positions(n, seed=0):
+    generator = random.Random(seed)
+    X = [generator.randrange(-40, 280) / 4 + 0.125 for k in range(n)]
+    Y = [generator.randrange(-40, 160) / 4 + 0.125 for k in range(n)]
+    return X, Y
+
+def build():
+    return PolygonIndex.PolygonIndex.build(list(POLYGONS), list(POLYGONS.values()))
+
+def test_assign():
+    X, Y = positions(5000)
+    assigned = build().assign(X, Y).tolist()
+    assert assigned == [reference(x, y) for x, y in zip(X, Y)]
+    assert set(assigned) == {-1, 0, 1, 2, 3, 4}
+
+#Holes, overlaps (first polygon) and positions outside of the grid
+@pytest.mark.parametrize('x, y, expected', [(7.5, 27.5, -1), (2.5, 27.5, 2), (7.5, 7.5, 0), (16.5, 7.5, 4), 
+                                            (25.5, 25.5, 1), (35.5, 25.5, -1), (-100.5, 5.5, -1), (5.5, -100.5, -1),
+                                            (1000.5, 5.5, -1), (5.5, 1000.5, -1), (59.5, 29.5, 3)])
+def test_edge_cases(x, y, expected):
+    assert build().assign([x], [y]).tolist() == [expected]
+
+#Positions tested by small batches of (position, edge) pairs
+def test_batches(monkeypatch):
+    X, Y = positions(2000, 1)
+    expected = build().assign(X, Y).tolist()
+    monkeypatch.setattr(PolygonIndex, 'MAXPAIRS', 7)
+    assert build().assign(X, Y).tolist() == expected
+
+def test_single_polygon():
+    index = PolygonIndex.PolygonIndex.build(['square'], [POLYGONS['square']])
+    assert index.assign([0.5, 9.5, 10.5, -0.5], [9.5, 0.5, 5, 5]).tolist() == [0, 0, -1, -1]
+
+def test_empty_layer():
+    with pytest.raises(ValueError):
+        PolygonIndex.PolygonIndex.build([], [])
+
+#GeoJSON and WKT csv layers of the same polygons
+def write_layers(tmp_path):
+    features = []
+    for name, rings in POLYGONS.items():
+        if name == 'triangles':
+            geometry = {'type': 'MultiPolygon', 'coordinates': [[ring] for ring in rings]}
+        else:
+            geometry = {'type': 'Polygon', 'coordinates': rings}
+        features.append({'type': 'Feature', 'properties': {'name': name}, 'geometry': geometry})
+    wdgeojson = str(tmp_path / 'layer.geojson')
+    with open(wdgeojson, 'w') as layer_file:
+        json.dump({'type': 'FeatureCollection', 'features': features}, layer_file)
+
+    wdcsv = str(tmp_path / 'layer.csv')
+    with open(wdcsv, 'w') as layer_file:
+        layer_file.write('Polygon ID;WKT\n')
+        for name, rings in POLYGONS.items():
+            text = ['(' + ', '.join(str(x) + ' ' + str(y) for x, y in ring) + ')' for ring in rings]
+            if name == 'triangles':
+                layer_file.write(name + ';MULTIPOLYGON (' + ', '.join('(' + ring + ')' for ring in text) + ')\n')
+            else:
+                layer_file.write(name + ';POLYGON (' + ', '.join(text) + ')\n')
+    return wdgeojson, wdcsv
+
+def test_layers(tmp_path):
+    X, Y = positions(2000, 2)
+    expected = [reference(x, y) for x, y in zip(X, Y)]
+    for wdlayer in write_layers(tmp_path):
+        index = PolygonIndex.open_index(wdlayer, 'name')
+        assert index.names == list(POLYGONS)
+        assert index.assign(X, Y).tolist() == expected
+
+#The cached index is reused while the layer is unchanged and rebuilt once it changes
+def test_cache(tmp_path, monkeypatch):
+    wdgeojson, wdcsv = write_layers(tmp_path)
+    PolygonIndex.open_index(wdcsv)
+    assert (tmp_path / 'layer.csv.index.npz').exists()
+
+    builds = []
+    build = PolygonIndex.PolygonIndex.build
+    def counted_build(*args):
+        builds.append(args)
+        return build(*args)
+    monkeypatch.setattr(PolygonIndex.PolygonIndex, 'build', counted_build)
+    assert PolygonIndex.open_index(wdcsv).names == list(POLYGONS)
+    assert builds == []
+
+    with open(wdcsv, 'a') as layer_file:
+        layer_file.write('extra;POLYGON ((100 100, 110 100, 110 110, 100 100))\n')
+    assert PolygonIndex.open_index(wdcsv).names == list(POLYGONS) + ['extra']
+    assert len(builds) == 1
+
+#Names taken from the id field, else from the feature id, else from the rank of the feature
+def test_names(tmp_path):
+    geometry = {'type': 'Polygon', 'coordinates': POLYGONS['square']}
+    features = [{'type': 'Feature', 'properties': {'name': 'a'}, 'geometry': geometry},
+                {'type': 'Feature', 'id': 'b', 'properties': {}, 'geometry': geometry},
+                {'type': 'Feature', 'properties': None, 'geometry': geometry}]
+    wdgeojson = str(tmp_path / 'names.geojson')
+    with open(wdgeojson, 'w') as layer_file:
+        json.dump({'type': 'FeatureCollection', 'features': features}, layer_file)
+    names, polygons = PolygonIndex.load_polygons(wdgeojson, 'name')
+    assert names == ['a', 'b', '2']
+    assert len(polygons) == 3
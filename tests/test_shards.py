@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+
+import pytest
+
+from conftest import NUMPY, read, run_script
+
+pytestmark = NUMPY
+
+#Polygon layer of the cells of the golden aggregated trips (squares of 5000 meters named after the cell)
+def write_cells(trip_positions_csv, path):
+    with open(trip_positions_csv) as input_file:
+        next(input_file)
+        cells = sorted(set(line.rstrip('\n').split(';')[7] for line in input_file))
+    features = []
+    for cell in cells:
+        x, y = [5000 * int(k) for k in cell.split('_')]
+        ring = [[x, y], [x + 5000, y], [x + 5000, y + 5000], [x, y + 5000], [x, y]]
+        features.append({'type': 'Feature', 'properties': {'id': cell}, 
+                         'geometry': {'type': 'Polygon', 'coordinates': [ring]}})
+    with open(path, 'w') as output_file:
+        json.dump({'type': 'FeatureCollection', 'features': features}, output_file)
+
+#Shards split with relative paths, run and merged from another working directory
+def test_relative_paths(tmp_path, monkeypatch, positions_csv, trip_positions_csv, trips_csv, aggregated_csv, parameters):
+    wdsplit = tmp_path / 'split'
+    wdsplit.mkdir()
+    shutil.copy(positions_csv, wdsplit / 'positions.csv')
+    write_cells(trip_positions_csv, wdsplit / 'cells.geojson')
+    monkeypatch.chdir(wdsplit)
+    run_script('Shards.py', 'split', 'positions.csv', 'shards', 3, *parameters, '--polygons', 'cells.geojson', 
+               '--index-cache', 'cells.index.npz', '--tmpdir', '.', '--trips')
+
+    monkeypatch.chdir(tmp_path)
+    run_script('Shards.py', 'run', wdsplit / 'shards', 0, 2)
+    run_script('Shards.py', 'merge', wdsplit / 'shards', 'aggregated.csv', '--trips', 'trips.csv', '--clean')
+    assert read(tmp_path / 'aggregated.csv') == read(aggregated_csv)
+    assert read(tmp_path / 'trips.csv') == read(trips_csv)
+
+def test_trips(tmp_path, positions_csv, trips_csv, parameters):
+    wdshards = tmp_path / 'shards'
+    run_script('Shards.py', 'split', positions_csv, wdshards, 3, *parameters)
+    run_script('Shards.py', 'merge', wdshards, tmp_path / 'trips.csv')
+    assert read(tmp_path / 'trips.csv') == read(trips_csv)
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_aggregated(tmp_path, positions_csv, trips_csv, aggregated_csv, parameters, workers):
+    wdshards = tmp_path / 'shards'
+    run_script('Shards.py', 'split', positions_csv, wdshards, 4, *parameters, '--cell', 5000, '--trips')
+    run_script('Shards.py', 'merge', wdshards, tmp_path / 'aggregated.csv', '--trips', tmp_path / 'trips.csv', 
+               '--workers', workers)
+    assert read(tmp_path / 'aggregated.csv') == read(aggregated_csv)
+    assert read(tmp_path / 'trips.csv') == read(trips_csv)
+
+#The shards are not run or merged once the input file is modified (byte ranges of the shards no longer valid)
+@pytest.mark.parametrize('command', ['run', 'merge'])
+def test_modified_input(tmp_path, positions_csv, parameters, command):
+    wdinput = tmp_path / 'positions.csv'
+    shutil.copy(positions_csv, wdinput)
+    wdshards = tmp_path / 'shards'
+    run_script('Shards.py', 'split', wdinput, wdshards, 3, *parameters)
+    with open(wdinput, 'a') as input_file:
+        input_file.write('V009;1600000000;500000.0;800000.0;5000\n')
+    args = [tmp_path / 'trips.csv'] if command == 'merge' else []
+    stderr = run_script('Shards.py', command, wdshards, *args, fails=True)
+    assert 'was modified since the split' in stderr
+    assert [path.name for path in wdshards.iterdir() if path.name.startswith('shard')] == []
+    assert not (tmp_path / 'trips.csv').exists()
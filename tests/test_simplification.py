@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+import math
+import random
+
+import pytest
+
+from conftest import NUMPY, read
+
+import ExtractTrips
+import Instrumentation
+import Simplification
+import TripSpill
+
+#Recursive Ramer–Douglas–Peucker algorithm of the original script
+def recursive_rdp(X, Y, epsilon):
+    n = len(X)
+    if epsilon <= 0:
+        return [1] * n
+    dmax = 0.0
+    index = 0
+    for i in range(1, n - 1):
+        d = ExtractTrips.distpointline(X[i], Y[i], X[0], Y[0], X[-1], Y[-1])
+        if d > dmax:
+            index = i
+            dmax = d
+    if dmax >= epsilon:
+        return recursive_rdp(X[:index+1], Y[:index+1], epsilon)[:-1] + recursive_rdp(X[index:], Y[index:], epsilon)
+    results = [0] * n
+    results[0] = 1
+    results[-1] = 1
+    return results
+
+#Random walk of n positions (coordinates in meters)
+def random_walk(n, seed):
+    generator = random.Random(seed)
+    X, Y = [0.0], [0.0]
+    for k in range(n - 1):
+        angle = generator.uniform(0, 2 * math.pi)
+        step = generator.expovariate(1 / 500)
+        X.append(X[-1] + step * math.cos(angle))
+        Y.append(Y[-1] + step * math.sin(angle))
+    return X, Y
+
+#The iterative algorithm keeps the same positions as the recursive one, with and without numpy
+@pytest.mark.parametrize('numpy', [pytest.param(True, marks=NUMPY), False])
+@pytest.mark.parametrize('epsilon', [0, 50, 300, 2000])
+def test_rdp(monkeypatch, numpy, epsilon):
+    if not numpy:
+        monkeypatch.setattr(ExtractTrips, 'np', None)
+    for seed in range(5):
+        X, Y = random_walk(300, seed)
+        assert list(ExtractTrips.RDP(X, Y, epsilon)) == recursive_rdp(X, Y, epsilon)
+
+#Distances computed by slices of a few positions
+@NUMPY
+def test_rdp_slices(monkeypatch):
+    X, Y = random_walk(500, 0)
+    expected = ExtractTrips.RDP(X, Y, 300)
+    monkeypatch.setattr(ExtractTrips, 'MAXSEGMENT', 7)
+    assert ExtractTrips.RDP(X, Y, 300) == expected
+
+#Time and maximum depth of the stack of segments added to the statistics
+def test_rdp_stats():
+    X, Y = random_walk(300, 2)
+    stats = Instrumentation.Stats()
+    ExtractTrips.RDP(X, Y, 300, stats)
+    assert 'rdp' in stats.as_dict()['timers']
+    assert stats.as_dict()['counters']['rdp_max_depth'] > 1
+
+#Flags written in a given buffer (memory-mapped flags of a spilled trip)
+@NUMPY
+def test_rdp_results():
+    X, Y = random_walk(200, 1)
+    results = ExtractTrips.np.zeros(200, dtype=ExtractTrips.np.int8)
+    assert ExtractTrips.RDP(X, Y, 300, results=results) is results
+    assert results.tolist() == recursive_rdp(X, Y, 300)
+
+#Distance between a position and the line through two positions
+def line_distance(x, y, x0, y0, x1, y1):
+    norm = math.sqrt((x1 - x0) ** 2 + (y1 - y0) ** 2)
+    if norm == 0:
+        return math.sqrt((x - x0) ** 2 + (y - y0) ** 2)
+    return abs((x1 - x0) * (y0 - y) - (x0 - x) * (y1 - y0)) / norm
+
+#Positions on a straight line (a few repeated) and a zigzag
+STRAIGHT = ([100.0 * k for k in range(20)] + [1900.0] * 3, [50.0 * k for k in range(20)] + [950.0] * 3)
+ZIGZAG = ([100.0 * k for k in range(21)], [0.0 if k % 2 else 1000.0 for k in range(21)])
+
+#Endpoints kept, the positions between two kept positions are within epsilon of the line between them and windows of
+#at most window positions
+@pytest.mark.parametrize('window', [3, 10, Simplification.MAXWINDOW])
+@pytest.mark.parametrize('epsilon', [50, 300, 2000])
+def test_opening_window(epsilon, window):
+    for seed in range(5):
+        X, Y = random_walk(300, seed)
+        flags = Simplification.opening_window(X, Y, epsilon, window)
+        kept = [i for i, flag in enumerate(flags) if flag]
+        assert len(flags) == 300 and set(flags) == {0, 1}
+        assert kept[0] == 0 and kept[-1] == 299
+        for start, end in zip(kept[:-1], kept[1:]):
+            assert end - start <= window
+            assert all(line_distance(X[i], Y[i], X[start], Y[start], X[end], Y[end]) < epsilon 
+                       for i in range(start + 1, end))
+
+def test_opening_window_lines():
+    assert Simplification.opening_window(*STRAIGHT, 10) == [1] + [0] * 21 + [1]
+    assert Simplification.opening_window(*ZIGZAG, 10) == [1] * 21
+    assert Simplification.opening_window(*ZIGZAG, 0) == [1] * 21
+    assert Simplification.opening_window([5.0], [5.0], 10) == [1]
+    assert Simplification.opening_window([], [], 10) == []
+
+#Flags of a trip pushed position by position (known before the end of the trip) and of successive trips
+def test_opening_window_online():
+    window = Simplification.OpeningWindow(300)
+    for seed in range(3):
+        X, Y = random_walk(200, seed)
+        flags = []
+        for k, (x, y) in enumerate(zip(X, Y)):
+            flags.extend(window.push(x, y))
+            assert len(flags) <= k + 1
+        assert len(flags) > 100
+        flags.extend(window.close())
+        assert flags == Simplification.opening_window(X, Y, 300)
+
+@NUMPY
+def test_opening_window_arrays():
+    X, Y = random_walk(200, 3)
+    np = ExtractTrips.np
+    assert Simplification.opening_window(np.array(X), np.array(Y), 300) == Simplification.opening_window(X, Y, 300)
+    assert Simplification.visvalingam(np.array(X), np.array(Y), 300) == Simplification.visvalingam(X, Y, 300)
+
+#Visvalingam–Whyatt algorithm removing the position of the smallest effective area one by one
+def naive_visvalingam(X, Y, epsilon):
+    remaining = list(range(len(X)))
+    flags = [1] * len(X)
+    floor = 0.0
+    while len(remaining) > 2:
+        areas = [abs((X[p] - X[i]) * (Y[q] - Y[i]) - (X[q] - X[i]) * (Y[p] - Y[i])) / 2 
+                 for p, i, q in zip(remaining[:-2], remaining[1:-1], remaining[2:])]
+        k = min(range(len(areas)), key=lambda k: (max(areas[k], floor), remaining[k + 1]))
+        floor = max(areas[k], floor)
+        if floor >= epsilon ** 2:
+            break
+        flags[remaining.pop(k + 1)] = 0
+    return flags
+
+@pytest.mark.parametrize('epsilon', [0, 50, 300, 2000])
+def test_visvalingam(epsilon):
+    for seed in range(5):
+        X, Y = random_walk(150, seed)
+        flags = Simplification.visvalingam(X, Y, epsilon)
+        assert flags[0] == 1 and flags[-1] == 1
+        assert flags == naive_visvalingam(X, Y, epsilon)
+
+#Positions kept if the area of their triangle is epsilon² or larger
+def test_visvalingam_area():
+    assert Simplification.visvalingam(*STRAIGHT, 1) == [1] + [0] * 21 + [1]
+    assert Simplification.visvalingam([0, 10, 20], [0, 10, 0], 10) == [1, 1, 1]
+    assert Simplification.visvalingam([0, 10, 20], [0, 9.99, 0], 10) == [1, 0, 1]
+    assert Simplification.visvalingam(*ZIGZAG, math.sqrt(100000) - 1) == [1] * 21
+    assert Simplification.visvalingam([5.0, 6.0], [5.0, 6.0], 10) == [1, 1]
+
+#Trips of the simplifiers with every engine, the chunked engine simplifies the spilled trips piece by piece
+@NUMPY
+@pytest.mark.parametrize('simplifier', ['window', 'visvalingam'])
+def test_engines(tmp_path, monkeypatch, positions_csv, parameters, simplifier):
+    wdloop = tmp_path / 'loop.csv'
+    ExtractTrips.extract_file(positions_csv, str(wdloop), *parameters, simplifier=simplifier)
+    with open(wdloop) as output_file:
+        flags = [line.rstrip('\n').split(';')[-1] for line in output_file][1:]
+    assert 0 < flags.count('0') < len(flags)
+
+    wdnumpy = tmp_path / 'numpy.csv'
+    ExtractTrips.extract_file(positions_csv, str(wdnumpy), *parameters, engine='numpy', simplifier=simplifier)
+    assert read(wdnumpy) == read(wdloop)
+
+    spills = []
+    class CountedSpill(TripSpill.TripSpill):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            spills.append(self)
+    monkeypatch.setattr(TripSpill, 'TripSpill', CountedSpill)
+    monkeypatch.setattr(ExtractTrips, 'MINCHUNK', 4)
+    monkeypatch.setattr(ExtractTrips, 'POSITION_BYTES', 2 ** 30)
+    wdchunked = tmp_path / 'chunked.csv'
+    ExtractTrips.extract_file(positions_csv, str(wdchunked), *parameters, engine='chunked', memory=1, 
+                              tmpdir=str(tmp_path), simplifier=simplifier)
+    assert len(spills) > 0
+    assert read(wdchunked) == read(wdloop)
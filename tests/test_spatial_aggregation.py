@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from conftest import NUMPY, read, run_script
+
+@pytest.mark.parametrize('engine', ['loop', pytest.param('numpy', marks=NUMPY)])
+def test_engine(tmp_path, trip_positions_csv, aggregated_csv, engine):
+    wdoutput = tmp_path / 'aggregated.csv'
+    run_script('SpatialAggregation.py', trip_positions_csv, wdoutput, '--engine', engine)
+    assert read(wdoutput) == read(aggregated_csv)
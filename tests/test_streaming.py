@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from conftest import NUMPY
+
+import ExtractTrips
+import SpatialAggregation
+import Pipeline
+
+#Lines of a csv file without its header
+def data_lines(path):
+    with open(path, encoding='utf-8') as input_file:
+        return input_file.readlines()[1:]
+
+#Lines of trip columns, values written with str() as the original scripts
+def trip_lines(trips):
+    return [';'.join(str(v) for v in row) + '\n' for trip in trips for row in zip(*trip)]
+
+#Positions of an iterable, the number of positions consumed is counted in consumed
+def counted(positions, consumed):
+    for position in positions:
+        consumed[0] += 1
+        yield position
+
+@pytest.mark.parametrize('engine', ['loop', pytest.param('numpy', marks=NUMPY), pytest.param('chunked', marks=NUMPY)])
+def test_extract_trips(positions_csv, trips_csv, parameters, engine):
+    positions = list(ExtractTrips.parse_positions(data_lines(positions_csv)))
+    trips = ExtractTrips.extract_trips(iter(positions), *parameters, engine=engine, block_size=100)
+    assert trip_lines(trips) == data_lines(trips_csv)
+
+@pytest.mark.parametrize('engine', ['loop', pytest.param('numpy', marks=NUMPY)])
+def test_aggregate_trips(trip_positions_csv, aggregated_csv, engine):
+    positions = SpatialAggregation.parse_positions(data_lines(trip_positions_csv))
+    trips = SpatialAggregation.aggregate_trips(positions, engine=engine, block_size=100)
+    assert trip_lines(trips) == data_lines(aggregated_csv)
+
+@pytest.mark.parametrize('engine', ['loop', pytest.param('numpy', marks=NUMPY)])
+def test_stream_trips(positions_csv, aggregated_csv, parameters, engine):
+    positions = ExtractTrips.parse_positions(data_lines(positions_csv))
+    trips = Pipeline.stream_trips(positions, *parameters, cell=5000, engine=engine, block_size=100)
+    assert trip_lines(trips) == data_lines(aggregated_csv)
+
+#The loop engines yield the first trip before the end of the positions
+def test_first_trip(positions_csv, trip_positions_csv, parameters):
+    consumed = [0]
+    positions = list(ExtractTrips.parse_positions(data_lines(positions_csv)))
+    trips = ExtractTrips.extract_trips(counted(positions, consumed), *parameters)
+    next(trips)
+    assert 0 < consumed[0] < len(positions)
+
+    consumed = [0]
+    positions = list(SpatialAggregation.parse_positions(data_lines(trip_positions_csv)))
+    trips = SpatialAggregation.aggregate_trips(counted(positions, consumed))
+    next(trips)
+    assert 0 < consumed[0] < len(positions)
+
+    consumed = [0]
+    positions = list(ExtractTrips.parse_positions(data_lines(positions_csv)))
+    trips = Pipeline.stream_trips(counted(positions, consumed), *parameters, cell=5000)
+    next(trips)
+    assert 0 < consumed[0] < len(positions)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import json
+import itertools
+
+import pytest
+
+from conftest import NUMPY, read, run_script
+
+pytestmark = NUMPY
+
+#Rows of a csv file as lists of values (without the column names)
+def rows(path):
+    with open(path, encoding='utf-8') as csv_file:
+        return [line.rstrip('\n').split(';') for line in csv_file][1:]
+
+#Summary row of the trips of an ExtractTrips.py run
+def summary(wdtrips, dropped):
+    trips = {}
+    for attr in rows(wdtrips):
+        trips.setdefault((attr[0], attr[1]), []).append(attr)
+    n = len(trips)
+    positions = sum(len(trip) for trip in trips.values())
+    simplified = sum(int(attr[9]) for trip in trips.values() for attr in trip)
+    duration = sum(int(trip[-1][2]) - int(trip[0][2]) for trip in trips.values())
+    distance = sum(float(attr[7]) for trip in trips.values() for attr in trip)
+    return [n, dropped, positions, simplified, simplified / positions, positions / n, duration / n, distance / n]
+
+#Trips and summary of every combination of the cartesian product are those of ExtractTrips.py
+@pytest.mark.parametrize('options, sweep_options', [([], []), (['--simplifier', 'significance'], []), 
+                                                    (['--simplifier', 'window', '--precision', 2], []), 
+                                                    ([], ['--block-size', 100])])
+def test_product(tmp_path, positions_csv, options, sweep_options):
+    thds, thts, epsilons = [2000, 4000], [1800, 3600], [0, 300]
+    run_script('Sweep.py', positions_csv, tmp_path / 'summary.csv', '--thd', *thds, '--tht', *thts, 
+               '--epsilon', *epsilons, '--trips', tmp_path / 'trips_{thd}_{tht}_{epsilon}.csv', *options, *sweep_options)
+    combinations = list(itertools.product(thds, thts, epsilons))
+    summaries = rows(tmp_path / 'summary.csv')
+    assert len(summaries) == len(combinations)
+    for (thd, tht, epsilon), row in zip(combinations, summaries):
+        wdtrips = tmp_path / ('trips_' + str(thd) + '_' + str(tht) + '_' + str(epsilon) + '.csv')
+        run_script('ExtractTrips.py', positions_csv, tmp_path / 'expected.csv', thd, tht, epsilon, 
+                   '--stats', tmp_path / 'stats.json', *options)
+        assert read(wdtrips) == read(tmp_path / 'expected.csv')
+        with open(tmp_path / 'stats.json') as stats_file:
+            dropped = json.load(stats_file)['counters'].get('trips_dropped', 0)
+        assert [float(value) for value in row[:3]] == [thd, tht, epsilon]
+        assert [int(value) for value in row[3:7]] == summary(wdtrips, dropped)[:4]
+        assert [float(value) for value in row[7:]] == pytest.approx(summary(wdtrips, dropped)[4:], rel=1e-6)
+
+#Combinations of a grid file (decimal commas), summary only (316 trips dropped with the parameters of the golden trips)
+def test_grid(tmp_path, positions_csv, trips_csv, parameters):
+    wdgrid = tmp_path / 'grid.csv'
+    wdgrid.write_text('thd;tht;epsilon\n4000;3600;300\n4000,5;3600;300\n\n')
+    run_script('Sweep.py', positions_csv, tmp_path / 'summary.csv', '--grid', wdgrid)
+    summaries = rows(tmp_path / 'summary.csv')
+    assert [row[:3] for row in summaries] == [['4000.0', '3600.0', '300.0'], ['4000.5', '3600.0', '300.0']]
+    assert [int(value) for value in summaries[0][3:7]] == summary(trips_csv, 316)[:4]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['grid.csv', 'summary.csv']
+
+def test_options(tmp_path, positions_csv):
+    wdsummary = tmp_path / 'summary.csv'
+    assert 'Either a grid file' in run_script('Sweep.py', positions_csv, wdsummary, '--thd', 4000, fails=True)
+    assert 'Either a grid file' in run_script('Sweep.py', positions_csv, wdsummary, '--grid', 'grid.csv', 
+                                              '--thd', 4000, '--tht', 3600, '--epsilon', 300, fails=True)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from conftest import read, run_script
+
+import TripState
+
+#Lines of a csv file without its header
+def data_lines(path):
+    with open(path, encoding='utf-8') as input_file:
+        return input_file.readlines()[1:]
+
+#Input files of successive periods: the positions are split at the given times (each file sorted by vessel and time)
+def split_positions(positions_csv, tmp_path, cuts):
+    with open(positions_csv, encoding='utf-8') as input_file:
+        header = input_file.readline()
+        lines = input_file.readlines()
+    bounds = [None] + cuts + [None]
+    paths = []
+    for k in range(len(bounds) - 1):
+        path = tmp_path / ('positions' + str(k) + '.csv')
+        with open(path, 'w', encoding='utf-8') as output_file:
+            output_file.write(header)
+            for line in lines:
+                t = int(line.split(';')[1])
+                if (bounds[k] is None or t >= bounds[k]) and (bounds[k + 1] is None or t < bounds[k + 1]):
+                    output_file.write(line)
+        paths.append(path)
+    return paths
+
+#Trip lines sorted by vessel and trip (the trips of the successive runs are written run by run)
+def by_trip(lines):
+    return sorted(lines, key=lambda line: (line.split(';')[0], int(line.split(';')[1])))
+
+#Times splitting the positions in n periods of the same number of positions
+def quantiles(positions_csv, n):
+    times = sorted(int(line.split(';')[1]) for line in data_lines(positions_csv))
+    return [times[len(times) * k // n] for k in range(1, n)]
+
+@pytest.mark.parametrize('n', [1, 2, 3, 5])
+def test_incremental_runs(tmp_path, positions_csv, trips_csv, parameters, n):
+    wdstate = tmp_path / 'state.json'
+    lines = []
+    inputs = split_positions(positions_csv, tmp_path, quantiles(positions_csv, n))
+    for k, wdinput in enumerate(inputs):
+        wdoutput = tmp_path / ('trips' + str(k) + '.csv')
+        final = ['--final'] if k == n - 1 else []
+        run_script('ExtractTrips.py', wdinput, wdoutput, *parameters, '--state', wdstate, *final)
+        assert wdstate.exists() == (k < n - 1)
+        lines += data_lines(wdoutput)
+    assert by_trip(lines) == by_trip(data_lines(trips_csv))
+
+#The trips still open at the end of a run are only written by the final run
+def test_open_trips(tmp_path, positions_csv, trips_csv, parameters):
+    wdstate = tmp_path / 'state.json'
+    run_script('ExtractTrips.py', positions_csv, tmp_path / 'trips.csv', *parameters, '--state', wdstate)
+    states = TripState.read_states(str(wdstate), parameters)
+    assert len(states) == 10
+    assert len(data_lines(tmp_path / 'trips.csv')) < len(data_lines(trips_csv))
+
+    empty = tmp_path / 'empty.csv'
+    empty.write_text('ID;Time;X;Y;DistLand\n')
+    run_script('ExtractTrips.py', empty, tmp_path / 'closed.csv', *parameters, '--state', wdstate, '--final')
+    assert not wdstate.exists()
+    lines = data_lines(tmp_path / 'trips.csv') + data_lines(tmp_path / 'closed.csv')
+    assert by_trip(lines) == by_trip(data_lines(trips_csv))
+
+#The checkpoint is saved with the parameters of the runs
+def test_parameters(tmp_path, positions_csv, parameters):
+    wdstate = tmp_path / 'state.json'
+    run_script('ExtractTrips.py', positions_csv, tmp_path / 'trips.csv', *parameters, '--state', wdstate)
+    checkpoint = read(wdstate)
+    with pytest.raises(ValueError):
+        TripState.read_states(str(wdstate), [4000, 3600, 100])
+    run_script('ExtractTrips.py', positions_csv, tmp_path / 'trips.csv', 4000, 3600, 100, '--state', wdstate, fails=True)
+    assert read(wdstate) == checkpoint
+
+def test_states(tmp_path):
+    wdstate = str(tmp_path / 'state.json')
+    assert TripState.read_states(wdstate, [1, 2, 3]) == {}
+    states = {'V1': [2, 1500000000, 1.5, 2.5, 5000.0, True, True, [1500000000], [1.5], [2.5], [5000.0]],
+              'Vé2': [0, 1500000300, 0.0, 0.0, 10.0, False, True, [], [], [], []]}
+    TripState.write_states(wdstate, [1, 2, 3], states)
+    assert TripState.read_states(wdstate, [1, 2, 3]) == states
+    assert not (tmp_path / 'state.json.tmp').exists()